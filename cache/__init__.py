@@ -2,6 +2,7 @@
 
 Provides:
   lockdir -- directory locking used by whole
+  lru -- size-bounded retention of recently used objects
   mapping -- a lazily-populated dictionary, LazyDict
   property -- cached attributes, computed on depand
   weak -- weakly remembering things you can compute at will
@@ -32,10 +32,29 @@ class LockableDir (object):
     directory itself, with .path(leafname) being the name of a file in the
     directory to be locked.  This last name must be amenable to having a suffix
     like .42 added (for various values of 42) and still name a file in the same
-    directory.\n"""
+    directory.
+
+    Alternatively, setting .flocking true (on a derived class or an instance)
+    selects a simpler protocol, relying solely on flock (3) applied to a single
+    lock file, .flock, that is never renamed or removed: read locks are shared
+    and write locks exclusive, just as described above, and the kernel releases
+    them when the holder closes the file or dies, so a crashed process can
+    never leave a stale lock.  This mode can also wait for a contended lock:
+    .lock_wait is the number of seconds to wait before giving up (default 0,
+    don't wait) or None to wait indefinitely.  Note that each instance has its
+    own open file, so two instances for the same directory contend with one
+    another even within one process; that changing between read and write lock
+    is not atomic (another process may get a lock in between; a failed attempt
+    to upgrade a read lock waits, again for up to .lock_wait seconds, to get
+    the read lock back, raising IOError if even that fails, leaving no lock
+    held); and that all processes sharing a directory must use the same
+    protocol, as the two use different lock files.\n"""
+
+    # Am *I* holding read/write locks ?  Not yet.
+    __read = __write = __mode = 0
+    flocking, lock_wait = False, 0
 
     def __init__(self):
-        # Am *I* holding read/write locks ?  Not yet.
         self.__read = self.__write = self.__mode = 0
 
     def __del__(self):
@@ -103,8 +122,10 @@ class LockableDir (object):
 
         r =  read and self.__read  == 0
         w = write and self.__write == 0
+        # Ask for whatever is already held, too, lest it be given up:
         if r or w:
-            if not self.__lock(r, w): return False
+            if not self.__lock(read or self.__read > 0,
+                               write or self.__write > 0): return False
 
         if read: self.__read += 1
         if write: self.__write += 1
@@ -143,6 +164,7 @@ class LockableDir (object):
         else: flag = UNLOCK
 
         if self.__mode == flag: return True # Nothing to do
+        if self.flocking: return self.__flock(flag)
 
         try: return self.__lockf(flag)
         except IOError, what:
@@ -151,7 +173,73 @@ class LockableDir (object):
                 return False
             raise
 
-    import os
+    import os, time
+    def __flock(self, flag,
+                open=os.open, fdopen=os.fdopen, flock=fcntl.flock,
+                CREATE=os.O_RDWR | os.O_CREAT, UNLOCK=fcntl.LOCK_UN,
+                LOST=errno.EWOULDBLOCK):
+        """Lock management for the flock-only protocol.
+
+        Single argument, flag, is as computed by __lock.  Returns False if the
+        lock could not be obtained within .lock_wait seconds.  A failed change
+        from one lock to the other may have released the lock held before (Linux
+        does); if that can't be got back within .lock_wait seconds either, no
+        lock is held and IOError is raised.\n"""
+
+        if flag == UNLOCK:
+            fo = self.__fd
+            del self.__fd
+            try: flock(fo.fileno(), UNLOCK)
+            finally: fo.close()
+            self.__mode = flag
+            return True
+
+        try: fo = self.__fd
+        except AttributeError:
+            fo = self.__fd = fdopen(open(self.path('.flock'), CREATE, 0666), 'r+')
+
+        what = self.__take(fo, flag)
+        if what is None:
+            self.__mode = flag
+            return True
+
+        if not (self.__mode & ~UNLOCK): # we held nothing
+            del self.__fd
+            fo.close()
+        elif self.__take(fo, self.__mode) is not None:
+            del self.__fd
+            fo.close()
+            self.__mode = UNLOCK
+            raise IOError(LOST, 'Lost lock while trying to change it',
+                          self.path('.flock'))
+
+        print 'Failed lock: ', self.path('.flock'), what.args
+        return False
+
+    def __take(self, fo, flag, flock=fcntl.flock,
+               sleep=time.sleep, clock=time.time,
+               NOW=fcntl.LOCK_NB, BLOCKS=(errno.EWOULDBLOCK, errno.EAGAIN)):
+        """Try to flock an open file, for up to .lock_wait seconds.
+
+        Required arguments are the open file and the flock (3) operation to
+        apply to it.  Returns None on success, else the IOError of the last
+        failed attempt.\n"""
+        wait = self.lock_wait
+        if wait is None:
+            flock(fo.fileno(), flag) # blocks until we get it
+            return None
+
+        end, pause = clock() + wait, .001
+        while True:
+            try: flock(fo.fileno(), flag | NOW)
+            except IOError, what:
+                if what.errno not in BLOCKS: raise
+                left = end - clock()
+                if left <= 0: return what
+                sleep(min(pause, left))
+                pause = min(2 * pause, .1)
+            else: return None
+
     __pid = os.getpid()
     def __lockf(self, flag,
                 touch=lambda n: open(n, 'w').close(),
@@ -297,4 +385,4 @@ class LockableDir (object):
                           ids[0][1])
         return got
 
-    del rival, re, fcntl, errno, os
+    del rival, re, fcntl, errno, os, time
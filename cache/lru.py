@@ -0,0 +1,160 @@
+"""Size-bounded retention of recently used objects.
+
+The weak references of study.cache.weak let the interpreter forget things we
+can compute (or load) again at will; but whether they are forgotten depends
+on the timing of garbage-collection, so that we may end up re-loading the same
+data over and over, or holding on to it for no good reason.  An LRU object
+complements those weak references: it holds strong references to the objects
+most recently used, up to a budget on their (crudely estimated) total size in
+bytes, so that the weak references to these stay valid; objects are dropped,
+least recently used first, when the budget is exceeded.  It keeps count of its
+hits, misses and evictions, so that the budget can be tuned.  It is safe to
+share one between threads.
+
+Provides:
+  LRU -- retains recently used values within a budget on total size
+  footprint -- crude estimate of the memory occupied by a value
+
+See study.LICENSE for copyright and license information.
+"""
+
+def footprint(value, word=8):
+    """Crude estimate of the number of bytes occupied by a value.
+
+    Single argument, value, is the object whose size is to be estimated.
+    Strings and buffers count their length; dictionaries, lists and tuples
+    count a few words per entry plus (recursively) the sizes of their entries;
+    other objects with a length count one word per item; anything else counts
+    as a few words.\n"""
+    if isinstance(value, (basestring, buffer)): return len(value) + 4 * word
+    if isinstance(value, dict):
+        return sum([footprint(k) + footprint(v)
+                    for k, v in value.items()]) + 3 * word * (1 + len(value))
+    if isinstance(value, (list, tuple)):
+        return sum(map(footprint, value)) + word * (4 + len(value))
+    try: return word * (4 + len(value))
+    except TypeError: return 4 * word
+
+class LRU (object):
+    """Least-recently-used cache with a budget on total size.
+
+    Maps keys to values, like a dictionary, but only retains as many of the
+    most recently used values as fit within its .budget, a number of bytes.
+    Attributes .hits, .misses and .evictions count look-ups that succeeded,
+    look-ups that failed and values dropped to make room; .used is the total
+    estimated size of the values currently retained.  Its methods hold a
+    lock while they update it, so threads may share it.\n"""
+
+    from threading import Lock
+    def __init__(self, budget, size=footprint, Lock=Lock):
+        """Set up an empty cache.
+
+        Required argument, budget, is the number of bytes the values retained
+        may (by estimate) occupy.  Optional argument, size, is a function taking
+        a value and returning an estimate of the number of bytes it occupies;
+        the default is footprint (q.v.).\n"""
+        self.__limit, self.__size = budget, size
+        self.__map, self.__ring, self.__lock = {}, [], Lock()
+        # Each link in the ring is [prev, next, key, value, size]; the ring
+        # itself is a sentinel link, whose next is the most recently used.
+        self.__ring[:] = [self.__ring, self.__ring, None, None, 0]
+        self.hits = self.misses = self.evictions = self.used = 0
+    del Lock
+
+    def __len__(self): return len(self.__map)
+    def __contains__(self, key): return key in self.__map
+
+    def __unlink(self, link):
+        prev, next = link[0], link[1]
+        prev[1], next[0] = next, prev
+        self.used -= link[4]
+
+    def __push(self, link):
+        ring = self.__ring
+        link[0], link[1] = ring, ring[1]
+        ring[1][0] = ring[1] = link
+        self.used += link[4]
+
+    def __shrink(self):
+        ring = self.__ring
+        while self.used > self.__limit and ring[0] is not ring:
+            link = ring[0]
+            self.__unlink(link)
+            del self.__map[link[2]]
+            self.evictions += 1
+
+    def get(self, key):
+        """Look up a value; raises KeyError if not retained.
+
+        A successful look-up marks the value as most recently used.\n"""
+        self.__lock.acquire()
+        try:
+            try: link = self.__map[key]
+            except KeyError:
+                self.misses += 1
+                raise
+
+            self.hits += 1
+            self.__unlink(link)
+            self.__push(link)
+            return link[3]
+        finally: self.__lock.release()
+
+    def pin(self, key, value, size=None):
+        """Retain a value, as most recently used.
+
+        Required arguments are the key and value to be remembered.  Optional
+        argument, size, is the number of bytes the value is deemed to occupy;
+        if None (the default), it is estimated.  Less recently used values are
+        dropped as needed to bring the total within budget; a value bigger
+        than the whole budget is not retained.  Returns value.\n"""
+        if size is None: size = self.__size(value)
+        self.__lock.acquire()
+        try:
+            self.__drop(key)
+            if size <= self.__limit:
+                link = [None, None, key, value, size]
+                self.__map[key] = link
+                self.__push(link)
+                self.__shrink()
+        finally: self.__lock.release()
+        return value
+
+    def __drop(self, key):
+        try: link = self.__map.pop(key)
+        except KeyError: pass
+        else: self.__unlink(link)
+
+    def drop(self, key):
+        """Forget any value retained for key."""
+        self.__lock.acquire()
+        try: self.__drop(key)
+        finally: self.__lock.release()
+
+    def clear(self):
+        """Forget all retained values (but not the counters)."""
+        self.__lock.acquire()
+        try:
+            ring = self.__ring
+            ring[:] = [ring, ring, None, None, 0]
+            self.__map.clear()
+            self.used = 0
+        finally: self.__lock.release()
+
+    def __get_budget(self): return self.__limit
+    def __set_budget(self, budget):
+        self.__lock.acquire()
+        try:
+            self.__limit = budget
+            self.__shrink()
+        finally: self.__lock.release()
+    budget = property(__get_budget, __set_budget,
+                      doc="Bytes retained values may occupy; setting it evicts "
+                          "values as needed to fit within the new budget.")
+    del __get_budget, __set_budget
+
+    def stats(self):
+        """Returns a dictionary of the counters, with the budget and size."""
+        return { 'hits': self.hits, 'misses': self.misses,
+                 'evictions': self.evictions, 'used': self.used,
+                 'budget': self.__limit, 'count': len(self.__map) }
@@ -34,12 +34,23 @@ class WeakTuple (Tuple):
         earlier returns with that input have been garbage-collected.\n"""
         self.__seq, self.__get = [], getter
 
+    def __new__(cls, *args, **what):
+        # tuple.__new__ would try to make a tuple of our arguments:
+        return tuple.__new__(cls)
+
+    def __iter__(self): # else we'd get tuple's, iterating the empty tuple
+        i = 0
+        while True:
+            try: yield self[i]
+            except IndexError: return
+            i += 1
+
     import weakref
     __upget = Tuple.__getitem__
     def __getitem__(self, key, ref=weakref.ref, lost = lambda : None):
         try: f = self.__seq[key]
         except IndexError: ans = None
-        else: ans = val()
+        else: ans = f()
 
         if ans is None:
             ans = self.__get(key) # may raise IndexError
@@ -76,7 +87,7 @@ class weakprop (propstore, recurseprop):
     import weakref
     __upget = recurseprop.__get__
     @decorate.overriding(__upget)
-    def __get__(self, obj, ref=weakref.ref):
+    def __get__(self, obj, cls=None, ref=weakref.ref):
         bok = self.cache(obj)
         try: f = bok[self]
         except KeyError: ans = None
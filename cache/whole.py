@@ -310,8 +310,20 @@ class Node (Cached):
     all integers; otherwise, it should be an Interval or the result of negating
     an Interval (a Span with stride -1).\n"""
 
+    lru = None # see CacheRoot
     @weakprop
-    def content(self): return self._load_()
+    def __content(self): return self._load_()
+    @property
+    def content(self):
+        """The data loaded from self's file.
+
+        Weakly remembered; but, if self.root.lru is an LRU (see
+        study.cache.lru), also retained by it while among the most recently
+        used.\n"""
+        lru = self.root.lru
+        if lru is None: return self.__content
+        try: return lru.get(self._cache_file)
+        except KeyError: return lru.pin(self._cache_file, self.__content)
 
     class Bok (dict): pass # for weakref's sake
     def _load_(self, bok=None, glo={}, Dict=Bok, BLOCKED=EWOULDBLOCK):
@@ -333,7 +345,7 @@ class Node (Cached):
         if not self.lock(True):
             raise IOError(BLOCKED, 'File temporarily unreadable',
                           self._cache_file)
-        try: execfile(self._cache_file, glo, bok) # may raise IOError, ParseError
+        try: self._read_(bok, glo) # may raise IOError, ParseError
         finally: self.unlock(True)
 
         try: self.depth = bok.pop('depth')
@@ -342,6 +354,18 @@ class Node (Cached):
         return bok
     del Bok
 
+    def _read_(self, bok, glo):
+        """Reads self._cache_file into a namespace.
+
+        Required arguments:
+          bok -- mapping into which to import the file's namespace
+          glo -- mapping to use as globals while reading it
+
+        Called by _load_ (q.v.) while self is read-locked.  This base
+        implementation simply execfile()s the file as a python module; derived
+        classes using some other file format should over-ride it.\n"""
+        execfile(self._cache_file, glo, bok)
+
 class WriteNode (Node):
     """Extends Node with write-functionality.
 
@@ -391,29 +415,61 @@ class WriteNode (Node):
         if not self.lock(write=True):
             raise IOError(self.__BLOCKED, 'File temporarily unwritable',
                           self._cache_file)
-        try:
-            fd = open(self._cache_file, 'w')
-            try:
-                doc = what.pop('__doc__', None)
-                if self.__doc__ is not self.__class__.__doc__:
-                    doc = self.__doc__
-                if doc: fd.write('"""%s"""\n\n', self.__doc__)
-
-                if not isinstance(self, CacheFile):
-                    fd.write('depth = %d\n' % self.depth)
-                what.pop('depth', None) # don't let what over-ride that.
-
-                for k, v in what.items():
-                    fd.write(formatter(k, v))
-
-            finally: fd.close()
+        try: self.__atomic(formatter, what)
         finally: self.unlock(write=True)
 
+        if self.root.lru is not None: self.root.lru.drop(self._cache_file)
+
         self.parent._onchange_()
         # potentially: return size of file
 
     __BLOCKED = EWOULDBLOCK
 
+    def __atomic(self, formatter, what, pid=os.getpid(),
+                 rename=os.rename, remove=os.remove, exist=os.path.exists):
+        """Write via a temporary file, renamed into place once complete.
+
+        Thus anyone reading self._cache_file, even if we die part-way through
+        writing, sees either its old content or its new, never a mixture.  The
+        temporary file's name doesn't match the forms of cache file names, so
+        is ignored by listings; if we die, it is left behind, to be cleaned up
+        by (for example) study.maths.prime.cache.compact.\n"""
+        tmp = self._cache_file + '.%d.tmp' % pid
+        try:
+            self._write_(formatter, what, tmp)
+            rename(tmp, self._cache_file)
+        except:
+            if exist(tmp): remove(tmp)
+            raise
+
+    def _write_(self, formatter, what, path, sync=os.fsync):
+        """Writes a namespace to a file.
+
+        Required arguments are the formatter and the mapping of keywords
+        passed to _save_ (q.v.), which calls this while self is write-locked,
+        and the name of the file to write; this is a temporary file, which
+        _save_ renames to self._cache_file once it's complete, so it should be
+        flushed to disk before returning.  This base implementation writes a
+        python module; derived classes using some other file format should
+        over-ride it.\n"""
+        fd = open(path, 'w')
+        try:
+            doc = what.pop('__doc__', None)
+            if self.__doc__ is not self.__class__.__doc__:
+                doc = self.__doc__
+            if doc: fd.write('"""%s"""\n\n', self.__doc__)
+
+            if not isinstance(self, CacheFile):
+                fd.write('depth = %d\n' % self.depth)
+            what.pop('depth', None) # don't let what over-ride that.
+
+            for k, v in what.items():
+                fd.write(formatter(k, v))
+
+            fd.flush()
+            sync(fd.fileno())
+        finally: fd.close()
+
 del EWOULDBLOCK, Cached, weakprop
 
 class SubNode (Node):
@@ -436,7 +492,7 @@ class SubNode (Node):
         if sign:
             assert sign in (+1, -1)
             self.__sign = sign
-        self.__span = Range(start, reach), 
+        self.__span = Range(start, reach)
         self.__type, self.__up = types, parent
 
     # read-only access to data members
@@ -525,7 +581,7 @@ class CacheSubNode (SubNode):
             s = cmp(self.__name, other.name)
             if s: return s
 
-            if isinstance(self, CacheFile): s = '.py'
+            if isinstance(self, CacheFile): s = self.suffix
             else: s = ''
             return cmp(s, other.isfile)
 
@@ -555,7 +611,8 @@ class WriteSubNode (CacheSubNode, WriteNode):
         replacement for self.\n"""
 
         isfile = isinstance(self, CacheFile)
-        name = parent._child_name_(self.span, isfile, self.types)
+        name = parent._child_name_(self.span, isfile and self.suffix,
+                                   self.types)
         move(self.path(), parent.path(name))
         cls = parent._child_class(isfile, self.types)
         sign = self.sign * parent.sign
@@ -596,6 +653,10 @@ class WriteSubNode (CacheSubNode, WriteNode):
 class CacheFile (CacheSubNode):
     @lazyprop
     def _cache_file(self): return self.path()
+    @lazyprop
+    def suffix(self, split=os.path.splitext):
+        """File-name extension, indicating file format: '.py' or '.bin'."""
+        return split(self.name)[1]
     @property
     def depth(self): return 0
 
@@ -649,7 +710,7 @@ class WriteFile (CacheFile, WriteSubNode):
         assert self.sign * self.span.start >= 0
         span = self.span.meet(span)
         if span.step * self.sign < 0: span = span.reversed()
-        name = self.parent.child_name(span, True, self.types)
+        name = self.parent.child_name(span, self.suffix, self.types)
         cls = self.parent._child_class_(True, types)
         move(self.path(), self.parent.path(name))
         self.parent._onchange_()
@@ -716,16 +777,19 @@ class CacheDir (Node, LockDir):
             return self.start / (self.sign * sign)
 
     import re
+    from lru import footprint
     @lazyprop
     def __listing(self, get=os.listdir, seq=Ordered, row=NameFragments,
-                  pat=re.compile(r'^(N|P|)([0-9a-z]+)([A-Z]+)([0-9a-z]+)(\.py|)$'),
-                  signmap={ 'N': -1, 'P': +1, '': None }):
+                  pat=re.compile(r'^(N|P|)([0-9a-z]+)([A-Z]+)([0-9a-z]+)(\.py|\.bin|)$'),
+                  signmap={ 'N': -1, 'P': +1, '': None }, weigh=footprint):
         """The (suitably sorted) list of contents of this directory.
 
         Sort order puts entries near self.span.start at low index and entries
         near self.span.stop at high index.
 
-        Ignores entries not matching the forms of cache file names.\n"""
+        Ignores entries not matching the forms of cache file names.  If
+        self.root.lru is an LRU, self is retained by it (keyed by self.path())
+        so as to keep this listing while among the most recently used.\n"""
         ans = seq()
         for name in get(self.path()):
             got = pat.match(name)
@@ -738,9 +802,11 @@ class CacheDir (Node, LockDir):
                 # Be sure to match WeakSeq, and NameFragments' indexing, above:
                 ans.append(row((start, size, mode, sign, name, isfile)))
 
+        if self.root.lru is not None:
+            self.root.lru.pin(self.path(), self, weigh(ans))
         return ans
 
-    del re, NameFragments
+    del re, NameFragments, footprint
 
     @lazyattr
     def depth(self): # but usually we'll read this from __init__.py
@@ -910,6 +976,7 @@ class CacheDir (Node, LockDir):
 
         self.clear_propstore_cache()
         del self.depth
+        if self.root.lru is not None: self.root.lru.drop(self.path())
 
     @staticmethod
     def _child_class_(isfile, mode):
@@ -940,7 +1007,7 @@ class CacheDir (Node, LockDir):
                 it = g(s)[ind]
                 cls = s._child_class_(it.isfile, it.types)
                 assert issubclass(cls, CacheDir._child_class_(it.isfile, it.types))
-                return cls(it.name, s, it.types, it.sign, it.begin(cdir.sign), it.reach)
+                return cls(it.name, s, it.types, it.begin(cdir.sign), it.reach, it.sign)
             self.__upinit(get)
             self.__who, self.__att = cdir, getseq
 
@@ -1276,6 +1343,8 @@ nameber = intbase(36) # its .decode is equivalent to int(,36) used above.
 del intbase
 
 class WriteDir (WriteNode, CacheDir):
+    _file_suffix_ = '.py' # format of new files; see child_name
+
     # Tool functions for newfile:
     def span_hi(span, row, chop, getargs):
         """Find index in row at which span's end falls.
@@ -1897,7 +1966,8 @@ class WriteDir (WriteNode, CacheDir):
 
         Required arguments:
           span -- range of integers to be described by the new node
-          isfile -- true for a file, false for a directory
+          isfile -- false for a directory; for a file, either the file's suffix
+                    (e.g. '.py') or True to use self._file_suffix_
           types -- [A-Z]+ string indicating application-specific types of data
                    to be stored in the new node.
 
@@ -1923,7 +1993,8 @@ class WriteDir (WriteNode, CacheDir):
         assert len(types) > 0
         name += types
         name += fmt(len(span))
-        if isfile: name += '.py'
+        if isinstance(isfile, basestring): name += isfile
+        elif isfile: name += self._file_suffix_
         return name
 
 del nameber, Interval, Ordered
@@ -20,6 +20,10 @@ from study.value.units import Object, Sample, Quantity, kilo, nano, harpo, \
      cc, year
 from particle import AMU, Particle, Boson, Fermion, \
      proton, neutron, electron
+
+# Only compute the data that get used:
+from study.value.snapshot import begin, end
+begin(__name__)
 
 class Nucleus (Particle): _namespace = 'Nucleus.item'
 class bNucleus (Boson, Nucleus): 'Bosonic nucleus'
@@ -777,6 +781,8 @@ alpha = Helium[4].atom.nucleus
 #  C-rich core; and "hot bottom burning" (stars with mass > Sun.mass * 4, T > 50
 #  MK in H-shell) does more.
 
-del Object, Sample, Float, About, kilo, nano, harpo, \
+end(__name__)
+
+del Object, Sample, Float, About, begin, end, kilo, nano, harpo, \
     Joule, Tesla, Ohm, Kelvin, Centigrade, gram, kg, tonne, metre, mol, torr, \
     cc, year, Particle, Boson, Fermion, AMU, NASelement
@@ -26,6 +26,10 @@ from study.value.units import pi, arc, bykind, \
 from physics import Quantum, Vacuum, Thermal
 from decay import Decay
 
+# Only compute the data that get used:
+from study.value.snapshot import begin, end
+begin(__name__)
+
 eV = Quantity(Quantum.Millikan, Volt,
               doc='The electron-Volt: a standard unit of energy in particle physics.')
 
@@ -844,6 +848,9 @@ to get the Hartree energy.
 """))
 Rydberg.energy.observe(13.605698 * Quantum.Millikan * Volt)
 
+end(__name__)
+
 del Quantum, Vacuum, Thermal, pi, arc, Quantity, between, Decay, \
+    begin, end, \
     harpo, femto, pico, nano, micro, milli, kilo, mega, giga, tera, peta, exa, \
     gram, metre, mol, second, year, Volt, Angstrom, Hertz, Joule, Tesla
@@ -6,6 +6,9 @@ See also:
 See study.LICENSE for copyright and license information.
 """
 from study.value.units import *
+# Derived constants are many, but few get used; only compute those that are:
+from study.value.snapshot import begin, end
+begin(__name__)
 
 Quantum = Object(
     Planck = Quantity.within(662.606876, .000052,
@@ -364,3 +367,6 @@ molecules present is used as N, R is replaced by Boltzmann's constant; see
 Thermal.k in study.chemy.physics.
 """)
 # 8.31434 * Joule / Kelvin / mol
+
+end(__name__)
+del begin, end
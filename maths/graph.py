@@ -9,6 +9,28 @@ ccomps and gvcolorize) for visualisation of graphs.  Things to play at:
 
 See study.LICENSE for copyright and license information.
 """
+from array import array
+try: import numpy
+except ImportError: numpy = None
+
+def _larray(values, Array=array):
+    """Copies a numpy array of integers into an array('l')."""
+    ans = Array('l')
+    ans.fromstring(values.astype(ans.typecode).tostring())
+    return ans
+
+def _chunks(edges, chunk=0x10000):
+    """Iterates chunks of the pairs of nodes in edges.
+
+    Single argument, edges, is an iterable of pairs or a numpy array with a
+    row per pair.  The former is yielded as it stands, as a single chunk; the
+    latter is converted to lists of python numbers a chunk of rows at a time,
+    rather than all at once, to save memory. """
+    try: edges.tolist, edges.shape
+    except AttributeError: yield edges
+    else:
+        for i in xrange(0, len(edges), chunk):
+            yield edges[i:i + chunk].tolist()
 
 class Partition:
     """Base-class for partitions.   Home for docs.
@@ -46,7 +68,11 @@ class Partition:
     other will be consulted for the information it lacks.  Thus Unite presumes
     that you won't ask it to join two nodes unless you know they are in
     different parts: it thereby saves itself the expensive (for it) job of
-    checking this. """
+    checking this.
+
+    The per-node data are held in array('l')s, rather than lists, so as to keep
+    memory use down for large partitions; and edges can be joined in bulk, via
+    join_many(). """
 
     def peers(self, node):
         """Returns a list of the nodes in the same connected component as the given node. """
@@ -59,6 +85,14 @@ class Partition:
     def joined(self, node, *nodes):
         """Returns true iff all the given nodes are in one connected component. """
         raise NotImplementedError
+
+    def join_many(self, edges):
+        """Joins the two nodes of each pair in edges; returns how many joined.
+
+        Single argument, edges, is an iterable of pairs of nodes or a numpy
+        array with a row per pair.  Returns the number of pairs whose nodes
+        were not, until then, in the same connected component. """
+        raise NotImplementedError
 
 class Unite (Partition):
     """Keeps track of the parts of a partition.
@@ -66,12 +100,13 @@ class Unite (Partition):
     Methods:
       peers(node) -- returns a list of peers of the given node.
       join(this, that) -- combines two *disjoint* parts.
+      regroup(labels) -- re-forms the parts from a numpy array of labels.
     """
 
-    def __init__(self, size=0):
+    def __init__(self, size=0, Array=array):
         """Initialise internal datastructures."""
-        self.__forward = range(size)
-        self.__backward = range(size)
+        self.__forward = Array('l', xrange(size))
+        self.__backward = Array('l', xrange(size))
 
         # Chasing i->forward[i] leads round a loop;
         # likewise  backward, traversing the same loop in reverse.
@@ -94,7 +129,7 @@ class Unite (Partition):
             row.append(n)
             n = f[n]
             assert self.__backward[n] == row[-1]
-            if n is node: return row
+            if n == node: return row
 
     def append(self, ind):
         assert len(self.__forward) == ind == len(self.__backward), \
@@ -114,10 +149,37 @@ class Unite (Partition):
 
         f, b = self.__forward, self.__backward
         pod, wer = f[nod], f[ver]
-        assert b[pod] is nod and b[wer] is ver
+        assert b[pod] == nod and b[wer] == ver
         # Do the swaps:
         b[pod], b[wer] = ver, nod
         f[nod], f[ver] = wer, pod
+
+    def regroup(self, labels, np=numpy):
+        """Re-forms the parts from scratch.
+
+        Single argument, labels, is a numpy array of integers, with an entry
+        per node; two nodes shall be peers precisely if their labels are
+        equal.  Requires numpy. """
+
+        size = len(labels)
+        if size != len(self.__forward):
+            raise ValueError('Need one label per node', size, len(self))
+        if not size: return
+
+        # Sorting by label brings peers together; link each to the next and the
+        # last of each part back to its first:
+        order = labels.argsort(kind='mergesort')
+        first = np.ones(size, dtype=bool)
+        first[1:] = labels[order[1:]] != labels[order[:-1]]
+        last = np.ones(size, dtype=bool)
+        last[:-1] = first[1:]
+        step = np.roll(order, -1)
+        step[last] = order[first]
+
+        forward, backward = np.empty(size, dtype=int), np.empty(size, dtype=int)
+        forward[order] = step
+        backward[step] = order
+        self.__forward, self.__backward = _larray(forward), _larray(backward)
 
 class Find (Partition):
     """Keeps track of `in same part' truths for a partition.
@@ -128,20 +190,28 @@ class Find (Partition):
     Methods:
       joined(node, ...) -- true if all given nodes are in one part
       join(this, that) -- ensures two nodes are joined
+      join_many(edges) -- join() for each pair in edges
+      merges(edges) -- join_many(), yielding the pairs that joined two parts
+      bulk(edges) -- join_many(), using numpy, when worthwhile
       disjoint() -- returns a list of nodes, one from each part
+      partcount() -- the number of parts
       peercount(node) -- size of given node's connected component
     """
 
-    def __init__(self, size=0):
-        self.__up = range(size)
-        self.__count = [ 1 ] * size
+    def __init__(self, size=0, Array=array):
+        self.__up = Array('l', xrange(size))
+        self.__count = Array('l', [ 1 ]) * size
+        self.__roots = Array('l', xrange(size))
+        self.__where = Array('l', xrange(size))
 
         # self.__up[i] is a member of the same connected component as i; i is
-        # the representative member of the component iff i is self.__up[i], in
-        # which case self.__count[i] is the size of the connected component.
+        # the representative member of the component iff i == self.__up[i], in
+        # which case self.__count[i] is the size of the connected component and
+        # self.__roots[self.__where[i]] is i.  Thus self.__roots lists the
+        # representative members, one per component, in no particular order.
 
     def __len__(self): return len(self.__up)
-    # assert: always equal to len(self.__count)
+    # assert: always equal to len(self.__count) and len(self.__where)
 
     def __chase(self, node):
         """Returns the representative member of node's connected component.
@@ -151,20 +221,21 @@ class Find (Partition):
         __up[] of all nodes it visits on the way to point at the answer
         returned, so as to speed this chase next time around. """
 
-        trail = []
+        up, trail = self.__up, []
         while True:
-            n = self.__up[node]
-            if n is node: break
+            n = up[node]
+            if n == node: break
             trail.append(node)
             node = n
 
-        # self.__up[node] is node, as is self.__up[trail[-1]] if len(trail) > 0.
+        # up[node] is node, as is up[trail[-1]] if len(trail) > 0.
 
         # All but the last item in trail need to point __up at node:
-        for n in trail[:-1]: self.__up[n] = node
+        for n in trail[:-1]: up[n] = node
         return node
 
     def peercount(self, node): return self.__count[self.__chase(node)]
+    def partcount(self): return len(self.__roots)
 
     def joined(self, node, *nodes):
         """Do the edges seen thus far connect (all) the given nodes ?
@@ -184,10 +255,13 @@ class Find (Partition):
         assert len(self.__count) == ind == len(self.__up), \
                "Find's append requires the right value"
 
-        # Lazily grow the lists: node is initially alone.
+        # Lazily grow the arrays: node is initially alone.
         self.__up.append(ind) # so self.__up[ind] is ind.
         # New node's sub-tree contains only one node: itself.
         self.__count.append(1) # and self.__count[ind] is 1.
+        # It represents its own part:
+        self.__where.append(len(self.__roots))
+        self.__roots.append(ind)
 
     def join(self, node, vertex):
         """Joins two nodes.
@@ -197,8 +271,12 @@ class Find (Partition):
         previously. """
 
         nod, ver = self.__chase(node), self.__chase(vertex)
-        if nod is ver: return # nothing to do
+        if nod == ver: return # nothing to do
+        self.__unite(nod, ver)
+        return 1>0      # did something
 
+    def __unite(self, nod, ver):
+        """Unites two parts, given their representative members."""
         # Who has the bigger sub-tree ?
         count = self.__count
         n, v = count[nod], count[ver]
@@ -207,13 +285,84 @@ class Find (Partition):
         # Hang smaller tree below bigger:
         self.__up[ver], count[nod] = nod, n + v
 
-        return 1>0      # did something
+        # ver no longer represents a part; move the last root into its slot:
+        roots, where = self.__roots, self.__where
+        last, at = roots.pop(), where[ver]
+        if last != ver: roots[at], where[last] = last, at
+
+    def merges(self, edges):
+        """Joins each pair of nodes in edges; yields those that joined two parts.
+
+        Single argument, edges, is as for join_many(), q.v.; this does its work,
+        but yields each pair whose nodes were not, until then, in the same
+        connected component (so that a sub-class can do more with these). """
+
+        up, chase, unite = self.__up, self.__chase, self.__unite
+        for pairs in _chunks(edges):
+            for node, vertex in pairs:
+                # Inline the common cases of __chase():
+                nod = up[node]
+                if up[nod] != nod: nod = chase(node)
+                ver = up[vertex]
+                if up[ver] != ver: ver = chase(vertex)
+                if nod != ver:
+                    unite(nod, ver)
+                    yield node, vertex
+
+    def join_many(self, edges):
+        """Joins each pair of nodes in edges; see Partition.join_many(). """
+        n = len(self.__roots)
+        if self.bulk(edges) is not None: return n - len(self.__roots)
+
+        n = 0
+        for pair in self.merges(edges): n += 1
+        return n
+
+    def bulk(self, edges, np=numpy):
+        """Joins many edges at once, using numpy, where worthwhile.
+
+        Single argument, edges, is as for join_many().  If numpy is available
+        and edges is a numpy array with at least a sixteenth as many rows as
+        self has nodes, joins the two nodes of each row and returns a numpy
+        array whose entry for each node is the representative member of its
+        part.  Otherwise, does nothing and returns None.
+
+        Each round hangs the larger of the representatives at the ends of each
+        edge below the smaller, then chases pointers until every node points
+        directly at its representative, then discards the edges whose ends now
+        have the same representative. """
+
+        if np is None or not isinstance(edges, np.ndarray): return None
+        if not len(self) or len(edges) * 16 < len(self): return None
+
+        def chase(up):
+            while True:
+                top = up[up]
+                if (top == up).all(): return up
+                up = top
+
+        up = chase(np.frombuffer(self.__up, dtype=self.__up.typecode).copy())
+        nod, ver = up[edges[:, 0]], up[edges[:, 1]]
+        while True:
+            keep = nod != ver
+            if not keep.any(): break
+            nod, ver = nod[keep], ver[keep]
+            up[np.maximum(nod, ver)] = np.minimum(nod, ver)
+            up = chase(up)
+            nod, ver = up[nod], up[ver]
+
+        roots = (up == np.arange(len(up))).nonzero()[0]
+        where = np.zeros(len(up), dtype=int)
+        where[roots] = np.arange(len(roots))
+        self.__up, self.__roots, self.__where = _larray(up), _larray(roots), _larray(where)
+        self.__count = _larray(np.bincount(up, minlength=len(up)))
+        return up
 
     def disjoint(self):
         """Returns a list containing one sample member from each connected component. """
-        # the sample members being the fixed-points of __up
+        # the sample members being the representatives, the fixed-points of __up
 
-        return filter(lambda x, _u=self.__up: x is _u[x], range(len(self.__up)))
+        return self.__roots.tolist()
 
 class FindUnite (Find, Unite):
     """An implementation of the find-unite algorithm.
@@ -234,6 +383,9 @@ class FindUnite (Find, Unite):
         Find.__init__(self, size)
         Unite.__init__(self, size)
 
+    # Partition's stub would otherwise hide Unite's, as Find precedes Unite:
+    peers = Unite.peers
+
     def append(self, ind):
         Find.append(self, ind)
         Unite.append(self, ind)
@@ -252,6 +404,26 @@ class FindUnite (Find, Unite):
             # Find did something: get Unite in on the act.
             Unite.join(self, node, vertex)
 
+    def join_many(self, edges):
+        """Joins each pair of nodes in edges.
+
+        Single argument, edges, is an iterable of pairs of nodes, each as for
+        join(), or a numpy array with a row per pair.  Returns the number of
+        pairs whose nodes were not, until then, in the same connected
+        component. """
+
+        n = self.partcount()
+        labels = Find.bulk(self, edges)
+        if labels is not None:
+            Unite.regroup(self, labels)
+            return n - self.partcount()
+
+        n, join = 0, Unite.join
+        for node, vertex in self.merges(edges):
+            join(self, node, vertex)
+            n += 1
+        return n
+
     def partition(self):
         """Returns a list of disjoint lists describing the partition.
 
@@ -273,6 +445,10 @@ class Graph:
       join(this, that) -- adds an edge from this to that, optionally adding each
                           as a node in the process.
 
+      join_many(edges) -- join()s each pair in edges, an iterable of pairs of
+                          nodes; returns the number of pairs not previously
+                          joined.
+
     None of the following modifies the graph: whereas join() will add any
     unfamiliar arguments as nodes of the graph, the queries (below) will
     interprete any unrecognised node as being outside the graph and connected to
@@ -314,21 +490,40 @@ class Graph:
 
     Note that .span() provides a sub-graph `grown outwards from' its given
     nodes, while .chop() provides a sub-graph `stripped down to only' the given
-    nodes. """
+    nodes.
+
+    Internally, each node is known by its index in .nodes; edges are recorded
+    as pairs of these indices, in an array('l'), and nodes are looked up in a
+    dictionary (where hashable). """
 
     # Creation:
     def __init__(self, *nodes):
-        self.__edges, self.__nodes, self.__connect = [], list(nodes), FindUnite(len(nodes))
+        self.__ends, self.__nodes, self.__connect = array('l'), list(nodes), FindUnite(len(nodes))
+        self.__index = {}
+        for i, node in enumerate(nodes):
+            try: self.__index.setdefault(node, i)
+            except TypeError: pass # unhashable: __find() shall scan for it
 
     # Attributes:
     def __getattr__(self, key):
         # Read-only copies:
         if key == 'nodes': return tuple(self.__nodes)
-        if key == 'edges': return tuple(self.__edges)
+        if key == 'edges': return tuple(self.__edges())
         if key == 'partition': return map(self.__peers, self.__connect.disjoint())
 
         raise AttributeError, key
 
+    def __edges(self):
+        ends, nodes = self.__ends, self.__nodes
+        for i in xrange(0, len(ends), 2):
+            yield nodes[ends[i]], nodes[ends[i + 1]]
+
+    def __find(self, node):
+        """Returns internal index of node; raises ValueError if unknown."""
+        try: return self.__index[node]
+        except KeyError: raise ValueError('Unknown node', node)
+        except TypeError: return self.__nodes.index(node)
+
     # Command: .join() with support from .__node()
 
     def __node(self, node):
@@ -338,12 +533,13 @@ class Graph:
         returned.  Otherwise, the node is added to internal datastructures with
         a previously-unused index, which is returned.  For internal use only. """
 
-        # Could be more efficient using an inverse-lookup here.
-        try: return self.__nodes.index(node)
+        try: return self.__find(node)
         except ValueError: pass
 
         ind = len(self.__nodes)
         self.__nodes.append(node)
+        try: self.__index[node] = ind
+        except TypeError: pass
 
         self.__connect.append(ind)
         return ind
@@ -351,8 +547,51 @@ class Graph:
     def join(self, start, stop):
         """Connects two nodes in the present graph, adding the nodes if necessary. """
 
-        self.__edges.append((start, stop))
-        self.__connect.join(self.__node(start), self.__node(stop))
+        ind, dex = self.__node(start), self.__node(stop)
+        self.__ends.extend((ind, dex))
+        self.__connect.join(ind, dex)
+
+    def join_many(self, edges):
+        """Connects the two nodes of each pair in edges, adding nodes as needed.
+
+        Single argument, edges, is an iterable of pairs of nodes or a numpy
+        array with a row per pair.  Returns the number of pairs whose nodes
+        were not, until then, in the same connected component.  When edges is
+        a numpy array of integers, each distinct node is looked up (or added)
+        once and the array is mapped to indices in bulk, so that FindUnite
+        can join the edges in bulk, too (see Find.bulk). """
+
+        return self.__connect.join_many(self.__indices(edges))
+
+    def __indices(self, edges, np=numpy):
+        try: kind, shape = edges.dtype.kind, edges.shape
+        except AttributeError: return self.__each(edges)
+        if np is None or kind not in 'iu' or shape[1:] != (2,):
+            return self.__each(edges)
+
+        nodes, first, back = np.unique(edges, True, True)
+        index, node = self.__index, self.__node
+        look = np.zeros(len(nodes), dtype=int)
+        for i in first.argsort(): # add new nodes in order of appearance
+            it = nodes[i].item()
+            try: look[i] = index[it]
+            except KeyError: look[i] = node(it)
+        pairs = look[back].reshape(shape)
+        self.__ends.extend(_larray(pairs.ravel()))
+        return pairs
+
+    def __each(self, edges):
+        index, node, ends = self.__index, self.__node, self.__ends
+        for pairs in _chunks(edges):
+            for start, stop in pairs:
+                # Inline the common case of __node():
+                try: ind = index[start]
+                except (KeyError, TypeError): ind = node(start)
+                try: dex = index[stop]
+                except (KeyError, TypeError): dex = node(stop)
+                ends.append(ind)
+                ends.append(dex)
+                yield ind, dex
 
     # Queries: joined(), peers() and sub-Graph()s.
 
@@ -361,13 +600,13 @@ class Graph:
             raise ValueError('no nodes provided: how can I check whether they are joined ?')
         if len(nodes) < 2: return 1 # every node is implicitly connected to itself
 
-        try: indices = map(self.__nodes.index, nodes)
+        try: indices = map(self.__find, nodes)
         except ValueError: return None
 
         return self.__connect.joined(*indices)
 
     def peercount(self, node):
-        try: nod = self.__nodes.index(node)
+        try: nod = self.__find(node)
         except ValueError: return 1
 
         return self.__connect.peercount(nod)
@@ -376,7 +615,7 @@ class Graph:
         return map(lambda i, _r=self.__nodes: _r[i], self.__connect.peers(nod))
 
     def peers(self, node):
-        try: nod = self.__nodes.index(node)
+        try: nod = self.__find(node)
         except ValueError: return [ node ]
 
         return self.__peers(nod)
@@ -394,7 +633,7 @@ class Graph:
 
         # build a graph out of them:
         ans = Graph(*all)
-        for a, b in self.__edges:
+        for a, b in self.__edges():
             assert (a in all) == (b in all), 'I thought we had a partition here !'
             if a in all: ans.join(a, b)
 
@@ -410,8 +649,10 @@ class Graph:
 
         # build a graph using only the given nodes:
         ans = Graph(*nodes)
-        for a, b in self.__edges:
+        for a, b in self.__edges():
             if a in nodes and b in nodes: ans.join(a, b)
 
         # return that graph:
         return ans
+
+del numpy
@@ -5,6 +5,7 @@ See study.LICENSE for copyright and license information.
 from study.cache.property import Cached, lazyprop
 from study.snake.decorate import postcompose
 from study.snake.sequence import iterable, Tuple
+from bisect import bisect_left, bisect_right
 import math
 
 class Interpolator (Cached):
@@ -68,6 +69,20 @@ class Interpolator (Cached):
     def span(self): return self.cuts[-1] - self.cuts[0]
     @lazyprop
     @postcompose(tuple)
+    def running(self):
+        """Returns a tuple of running totals of self.mass.
+
+        Has one more entry than self.mass; running[i] is the sum of mass[:i],
+        so running[0] is zero and running[-1] is self.total.  Lets derived
+        classes find, by bisection, where a given weight is reached, or how
+        much weight lies between two cuts, without walking all of mass.\n"""
+        tot = 0
+        yield tot
+        for w in self.mass:
+            tot += w
+            yield tot
+    @lazyprop
+    @postcompose(tuple)
     def spikes(self):
         """Returns a tuple of self's degenerate values.
 
@@ -177,7 +192,7 @@ class Interpolator (Cached):
         return self._interpolator_(self.cuts,
                                      map(lambda x, b=by: x * b, self.mass))
 
-    def clip(self, lo=None, hi=None):
+    def clip(self, lo=None, hi=None, after=bisect_right, before=bisect_left):
         """Returns self with its weight outside a range discarded.
 
         Both arguments, lo and hi, are optional, defaulting to None.  If
@@ -195,34 +210,25 @@ class Interpolator (Cached):
         if lo >= hi or lo >= self.cuts[-1] or hi <= self.cuts[0]:
             raise ValueError('Excessive clipping', (lo, hi), (self.cuts[-1], self.cuts[0]))
 
-        cuts, mass = list(self.cuts), list(self.mass)
+        # First, discard any whole bands (keep from the last cut <= lo to the
+        # first >= hi):
+        if self.cuts[0] < lo: i = after(self.cuts, lo) - 1
+        else: i = 0
+        if self.cuts[-1] > hi: j = before(self.cuts, hi, i)
+        else: j = len(self.cuts) - 1
+        assert i < j, 'We should have ValueError()ed earlier'
+        cuts, mass = list(self.cuts[i:j+1]), list(self.mass[i:j])
+
+        # Now any partial bands:
         if cuts[0] < lo:
-            # First, discard any whole bands:
-            i = 1
-            while i < len(cuts) and cuts[i] <= lo: i += 1
-            i -= 1
-            assert i < len(mass), 'We should have ValueError()ed earlier'
-            if i: cuts, mass = cuts[i:], mass[i:]
-
-            # Now any partial band:
-            assert cuts[0] <= lo < cuts[1]
-            if cuts[0] < lo:
-                mass[0] *= (cuts[1] - lo) / (cuts[1] - cuts[0])
-                cuts[0] = lo
+            assert cuts[0] < lo < cuts[1]
+            mass[0] *= (cuts[1] - lo) / (cuts[1] - cuts[0])
+            cuts[0] = lo
 
         if cuts[-1] > hi:
-            # First, discard any whole bands:
-            i = len(cuts) - 2
-            while i >= 0 and cuts[i] <= hi: i -= 1
-            i += 1
-            assert i > 0, 'We should have ValueError()ed earlier'
-            if i + 1 < len(cuts): cuts, mass = cuts[:i], mass[:i-1]
-
-            # Now any partial band:
-            assert cuts[-1] >= hi > cuts[-2]
-            if cuts[-1] > hi:
-                mass[-1] *= (hi - cuts[-2]) / (cuts[-1] - cuts[-1])
-                cuts[-1] = hi
+            assert cuts[-1] > hi > cuts[-2]
+            mass[-1] *= (hi - cuts[-2]) / (cuts[-1] - cuts[-2])
+            cuts[-1] = hi
 
         if sum(mass, 0) <= 0:
             raise ValueError('No weight in interval', (lo, hi, self))
@@ -595,56 +601,24 @@ class PiecewiseConstant (Interpolator):
     straightforward.  For method documentation, check matching methods of
     Interpolator.\n"""
 
-    def __bands(self):
-        for l, h, m in self: yield l, h, m, h - l, False
-        yield h, h, 0, self.span, True
-
-    def __split(self, weights):
-        load, need = self.__bands(), weights[0]
-        left, right, avail, wide, done = load.next()
-        i = j = 1 # indexing into .mass and weights, respectively
-        while j < len(weights):
-            # We've eaten i-1 bands of self part of band i, which stretches
-            # from left to right, leaving avail spread across wide as the rest
-            # of this band.  That eating enabled us to yield j-1 cut-points;
-            # need remains of weights[j-1], before we can yield the next;
-            # eating reduces need via scaling to make sum(weights) match
-            # sum(.mass); but avoid pre-scaling either .mass or weights, as
-            # rounding errors muck up the scaled values; compute a revised
-            # scaling each time round the loop.
-            if done: # We've run out of .mass; hopefully also of need !
-                assert 1e-6 * sum(weights) > need
-                assert right is self.cuts[-1]
-                yield right
-                need = weights[j]
-                j += 1
-            else:
-                want = sum(weights[j:], need)
-                have = sum(self.mass[i:], avail)
-                # Modulo rounding: have may be zero, but only when want is.
-                if want and have:
-                    scale = want / have
-                    bite = need / scale
-                else:
-                    assert have < 1e-6 * self.total and want < 1e-6 * sum(weights)
-                    bite = scale = 0
-
-                if bite >= avail:
-                    # Eat the rest of avail
-                    need -= avail * scale
-                    left, right, avail, wide, done = load.next()
-                    i += 1
-                else: # we can complete this interval
-                    step = wide * bite / avail
-                    avail -= bite
-                    # Rest of avail is spread across remaining wide:
-                    wide -= step
-                    yield right - wide
-                    need = weights[j]
-                    j += 1
-
-        assert abs(sum(self.mass[i:], avail) / self.total - need / sum(weights)) < 1e-6, (
-            done, need, weights, left, wide, right, avail, i, self)
+    def __split(self, weights, seek=bisect_right, reach=bisect_left):
+        # Each cut-point is where the running total of .mass reaches the
+        # matching running total of weights, scaled to make sum(weights) match
+        # .total; compute each target afresh, rather than by eating bands
+        # and weights, so that rounding errors don't accumulate.
+        cut, load, run = self.cuts, self.mass, self.running
+        last, full, i, need = len(load), sum(weights), 0, 0
+        for w in weights[:-1]:
+            need += w
+            if need < full: goal = need * run[-1] * 1. / full
+            else: goal = run[-1]
+            # First band after i whose end is beyond goal, skipping any empty
+            # bands; so run[i] <= goal < run[i+1]:
+            i = seek(run, goal, i) - 1
+            if i < last:
+                yield cut[i] + (cut[i+1] - cut[i]) * (goal - run[i]) / load[i]
+            else: # end of the last band with any weight
+                yield cut[reach(run, goal)]
 
     def split(self, weights):
         assert all(x >= 0 for x in weights), \
@@ -687,6 +661,33 @@ class PiecewiseConstant (Interpolator):
                 s += 1
         return s
 
+    def __weigh(self, seq, seek=bisect_right):
+        # Fast path for weigh() when self has no spikes: locate each entry in
+        # seq by bisection, compute any partial bands directly and use running
+        # totals for the whole bands between.
+        cut, load, run = self.cuts, self.mass, self.running
+        last = len(load)
+        i, x = 0, cut[0] # band and position reached so far
+        for stop in tuple(seq) + (cut[-1],):
+            if stop <= cut[0]: j, stop = 0, cut[0]
+            elif stop >= cut[-1]: j, stop = last, cut[-1]
+            else: j = seek(cut, stop) - 1
+
+            if j == i: # both in one band (or both past the end):
+                if j < last and stop > x:
+                    yield load[i] * (stop - x) / (cut[1+i] - cut[i])
+                else: yield 0.
+            elif j < i: yield 0. # seq is mis-sorted
+            else:
+                if x > cut[i]:
+                    w = load[i] * (cut[1+i] - x) / (cut[1+i] - cut[i])
+                else: w = load[i]
+                w += run[j] - run[1+i]
+                if j < last and stop > cut[j]:
+                    w += load[j] * (stop - cut[j]) / (cut[1+j] - cut[j])
+                yield w
+            i, x = j, stop
+
     def weigh(self, seq, total=None):
         result, load, cut = [ 0. ] * (1 + len(seq)), self.mass, self.cuts
         if not self.total: return tuple(result)
@@ -698,6 +699,7 @@ class PiecewiseConstant (Interpolator):
             if s < len(seq) and cut[0] == seq[s]: # even split
                 self.__share(load[0], result, seq, s)
             else: result[s] = load[0]
+        elif not self.spikes: result = list(self.__weigh(seq))
         else:
             # sensible case where we have at least two weights.
             i = s = 0 # we're processing size[i] for result[s]
@@ -1275,4 +1277,4 @@ class PiecewiseConstant (Interpolator):
         return self._interpolator_(kink, wait)
     # </tools>
 
-del lazyprop, math, iterable, Tuple
+del lazyprop, math, iterable, Tuple, bisect_left, bisect_right
@@ -12,6 +12,7 @@ Exports:
   desquare(n) -- integer square root with remainder
   unsquare(n) integer square root of perfect square; else ValueError
   sqrt(n) -- integer square root, discarding remainder
+  Jacobi(a, n) -- the Jacobi symbol (a/n), for odd positive n
   isprime(n) -- test whether a natural is prime
   eachprime() -- iterate over the primes
   depower(n, p) -- as desquare, but for p-th power
@@ -298,14 +299,83 @@ def sqrt(val):
     "max({natural n: n*n <= val})"
     return desquare(val)[0]
 
-def isprime(n):
-    "Tests whether a natural is prime"
-    s, r = desquare(n)
-    if not r: return False # n = s * s
-    while s > 1:
-        if n % s: s -= 1
+def Jacobi(a, n):
+    """The Jacobi symbol (a/n), for odd positive n.
+
+    This is +1 or -1 if a is coprime to n, according as a is or isn't a
+    square modulo each prime factor of n (counted with its multiplicity),
+    else 0; computed by quadratic reciprocity, without factorising n.\n"""
+    assert n > 0 and n & 1
+    a, ans = a % n, 1
+    while a:
+        while not a & 1:
+            a >>= 1
+            if n & 7 in (3, 5): ans = -ans
+        a, n = n, a
+        if a & 3 == 3 == n & 3: ans = -ans
+        a %= n
+    if n == 1: return ans
+    return 0
+
+def isprime(n,
+            small=(2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41),
+            sure=3317044064679887385961981L):
+    """Tests whether a natural is prime.
+
+    Required argument, n, is the natural to test.  Uses the strong probable
+    prime (Miller-Rabin) test to the first thirteen primes as bases, which is
+    known to be exact for n < 3317044064679887385961981 (about 3.3e24).  For
+    larger n, uses the Baillie-PSW test (strong probable prime to base 2 and
+    strong Lucas probable prime), for which no counter-example is known (and
+    none exists below 2**64, at least); so a false return is always right, but
+    a true return for such a large n is merely a very strong indication.  See
+    also .sure, the bound below which the answer is certain.\n"""
+
+    if n < 2: return False
+    for p in small:
+        if n % p == 0: return n == p
+    if n < small[-1] ** 2: return True
+
+    # Strong probable prime test: n - 1 = d * 2**s with d odd.
+    d, s = n - 1, 0
+    while not d & 1: d, s = d >> 1, s + 1
+    for a in small if n < sure else small[:1]: # BPSW only needs base 2
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1: continue
+        for r in xrange(s - 1):
+            x = x * x % n
+            if x == n - 1: break
         else: return False
-    return True
+    if n < sure: return True
+
+    # Strong Lucas test, with Selfridge's parameters: first D in 5, -7, 9,
+    # -11, ... with Jacobi(D, n) == -1; P = 1, Q = (1 - D) / 4.
+    if desquare(n)[1] == 0: return False # else the search for D never ends
+    D = 5
+    while Jacobi(D, n) != -1:
+        if D > 0: D = -D - 2
+        else: D = -D + 2
+    P, Q = 1, (1 - D) // 4
+
+    # n + 1 = d * 2**s with d odd; compute U(d), V(d) and Q**d, modulo n.
+    d, s = n + 1, 0
+    while not d & 1: d, s = d >> 1, s + 1
+    U, V, Qk = 1, P, Q % n
+    for bit in bin(d)[3:]:
+        U, V, Qk = U * V % n, (V * V - 2 * Qk) % n, Qk * Qk % n
+        if bit == '1':
+            U, V = P * U + V, D * U + P * V
+            if U & 1: U += n
+            if V & 1: V += n
+            U, V, Qk = (U >> 1) % n, (V >> 1) % n, Qk * Q % n
+
+    if U == 0 or V == 0: return True
+    for r in xrange(s - 1):
+        V, Qk = (V * V - 2 * Qk) % n, Qk * Qk % n
+        if V == 0: return True
+    return False
+
+isprime.sure = isprime.func_defaults[-1]
 
 def eachprime():
     """A trivial iterator over all primes.
@@ -13,6 +13,86 @@ class unNaturalPower (TypeError):
     whole n and d, and the result of raising to power n happens to be p**d for
     some p, then p is used and there's no error).\n"""
 
+# Dense arithmetic, for large polynomials with plain numeric coefficients.
+
+# NumPy is optional; without it, inexact products also use _karatsuba().
+try: import numpy
+except ImportError: numpy = None
+
+def _school(a, b):
+    """Product of two coefficient lists, the way we learnt it at school."""
+    n, out = len(b), [ 0 ] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x: out[i:i + n] = [ o + x * y for o, y in zip(out[i:i + n], b) ]
+    return out
+
+def _karatsuba(a, b, least=32):
+    """Product of two coefficient lists, by Karatsuba's method.
+
+    Splits each list in half, so that the product needs three (rather than
+    four) products of half the size, recursively; lists shorter than least are
+    multiplied by _school() instead.  Exact, for exact coefficients.\n"""
+    if len(a) < len(b): a, b = b, a
+    n, m = len(a), len(b)
+    if m < least: return _school(a, b)
+
+    out = [ 0 ] * (n + m - 1)
+    if 2 * m <= n: # lop-sided: take a in slices, each as long as b
+        for i in range(0, n, m):
+            for j, v in enumerate(_karatsuba(a[i:i + m], b, least), i):
+                out[j] += v
+        return out
+
+    h = n // 2 # < m, so both lists have a non-empty top half
+    lo, hi = _karatsuba(a[:h], b[:h], least), _karatsuba(a[h:], b[h:], least)
+    mid = _karatsuba(_plus(a[:h], a[h:]), _plus(b[:h], b[h:]), least)
+    for i, v in enumerate(lo): out[i] += v; mid[i] -= v
+    for i, v in enumerate(hi): out[i + 2 * h] += v; mid[i] -= v
+    for i, v in enumerate(mid, h): out[i] += v
+    return out
+
+def _plus(a, b):
+    if len(a) < len(b): a, b = b, a
+    return [ x + y for x, y in zip(a, b) ] + a[len(b):]
+
+def _convolve(a, b, np=numpy, fast=1024, kinds=(int, long)):
+    """Product of two coefficient lists, as a list.
+
+    Uses _karatsuba() when all coefficients are whole, or when numpy isn't
+    available; otherwise, numpy's convolve() or, when both lists have at least
+    fast entries, a convolution via numpy's fast fourier transform; this is
+    less precise, so only used where the quadratic cost would be worse.\n"""
+    if np is None or all(isinstance(x, kinds) for x in a + b):
+        return _karatsuba(a, b)
+
+    try: a, b = np.asarray(a), np.asarray(b)
+    except OverflowError: return _karatsuba(a, b)
+    if min(len(a), len(b)) < fast: return np.convolve(a, b).tolist()
+
+    n, f = len(a) + len(b) - 1, np.fft
+    size = 1 << (n - 1).bit_length()
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        return f.ifft(f.fft(a, size) * f.fft(b, size))[:n].tolist()
+    return f.irfft(f.rfft(a, size) * f.rfft(b, size), size)[:n].tolist()
+
+def _reciprocal(b, n, mul=_convolve):
+    """First n coefficients of the power series 1/b.
+
+    Required arguments are a coefficient list, b, whose first entry is
+    non-zero, and the number, n, of coefficients wanted.  Uses Newton's
+    iteration, g = g * (2 - b * g), doubling the number of correct entries in
+    g at each step.  If b's first entry is 1 or -1 and all its entries are
+    whole, so are those of the result, which is exact; otherwise, the
+    coefficients are computed as floats (or complex).\n"""
+    g, k = [ b[0] if b[0] in (1, -1) else 1. / b[0] ], 1
+    while k < n:
+        k = min(2 * k, n)
+        t = [ -x for x in mul(b[:k], g)[:k] ]
+        t[0] += 2
+        g = mul(g, t)[:k]
+    return g
+
+
 class Polynomial (Lazy):
     """Model of the mathematical ring of polynomials (in one free variable).
 
@@ -33,6 +113,7 @@ class Polynomial (Lazy):
       isreal -- are all coefficients real ?
       factors -- tuple of normalised irreducible factors and an optional scalar
       roots -- inputs at which the polynomial is zero (or very nearly so)
+      rootbounds -- approximate roots, each paired with a bound on its error
 
     The value of p.assquares is of form (bok, rem) with rem either zero or of
     odd degree and p-rem equal to sum(x*x*v for (x, v) in bok.items()).
@@ -63,10 +144,12 @@ class Polynomial (Lazy):
     ========
 
       coefficient(n) -- coefficient of (: x**n &larr;x :) in polynomial
+      evaluate(xs [, derivative]) -- values (and slopes) at many inputs at once
       hcf([poly, ...]) -- yields highest common factor of arbitrarily many
       integral([start=0, base=0]) -- integration
       unafter(poly) -- input to poly yielding self as output
       Weierstrass([tol=1e-6]) -- finds roots
+      Aberth([tol=1e-12]) -- finds roots, faster
       resultant(other) -- determinant of Sylvester(other)
       Sylvester(other) -- Sylvester matrix of self and another polynomial
       Bezout(other) -- B&eacute;zout matrix of self and another polynomial
@@ -206,6 +289,23 @@ class Polynomial (Lazy):
     @staticmethod
     def __iswhole(k, i=(int, long)): return isinstance(k, i)
 
+    def __dense(self, sparse=False, least=32, kinds=(int, long, float, complex)):
+        """Self's raw coefficients as a list, if worth working with that way.
+
+        Entry i of the list is the coefficient of power(i), ignoring
+        self.__denom.  Returns None if any coefficient isn't a plain number or
+        self has fewer than least non-zero coefficients; unless sparse is true,
+        also if fewer than half of self's coefficients are non-zero.\n"""
+        bok = self.__coefs
+        if len(bok) < least or not (sparse or 2 * len(bok) > self.rank):
+            return None
+        for v in bok.values():
+            if not isinstance(v, kinds): return None
+
+        row = [ 0 ] * (self.rank + 1)
+        for k, v in bok.items(): row[k] = v
+        return row
+
     def _lazy_get_rank_(self, ignored):
         """The highest power present in self.
 
@@ -389,7 +489,7 @@ class Polynomial (Lazy):
     def __sub__(self, other): return self + (- other)
     def __rsub__(self, other): return other + (- self)
 
-    def __mul__(self, other):
+    def __mul__(self, other, conv=_convolve):
         term = {}
         try: bok, den = other.__coefs, other.__denom
         except AttributeError:
@@ -397,11 +497,14 @@ class Polynomial (Lazy):
             for key, val in self.__coefs.items():
                 term[key] = val * other
         else:
-            zero = self._zero * other._zero
-            for key, val in self.__coefs.items():
-                for cle, lue in bok.items():
-                    sum = key + cle
-                    term[sum] = term.get(sum, zero) + val * lue
+            a, b = self.__dense(), other.__dense()
+            if a is None or b is None:
+                zero = self._zero * other._zero
+                for key, val in self.__coefs.items():
+                    for cle, lue in bok.items():
+                        sum = key + cle
+                        term[sum] = term.get(sum, zero) + val * lue
+            else: term = conv(a, b)
 
             om = self.__denom
             if den is None: denom = om
@@ -426,7 +529,10 @@ class Polynomial (Lazy):
     def __divmod__(self, other, hcf=gcd):
         """Solves self = q.other + r for r of rank < other.rank: returns (q, r)
 
-        This depends on our coefficients forming a field.
+        This depends on our coefficients forming a field.  When q has many
+        terms and all coefficients are plain numbers, the division is done by
+        __newton(), q.v.; this is exact if other's leading coefficient is 1 or
+        -1 (ignoring its denominator) and all coefficients are whole.
         """
         try: top, den = other.rank, other.__denom
         except AttributeError:
@@ -442,8 +548,17 @@ class Polynomial (Lazy):
             for k, v in self.__coefs.items(): bok[k] = den * v
             return Polynomial(bok, o * (self.__denom or 1)), Polynomial((0,))
 
-        q, r = Polynomial((self._zero,)), self
         got = self.rank
+        if got - top >= 32:
+            a, b = self.__dense(True, 0), other.__dense(True, 0)
+            if a is not None and b is not None and (
+                o in (1, -1) or
+                not all(isinstance(x, (int, long)) for x in a + b)):
+                q, r = self.__newton(a, b)
+                om = self.__denom
+                return Polynomial([ c * den for c in q ], om), Polynomial(r, om)
+
+        q, r = Polynomial((self._zero,)), self
 
         # We now reduce the rank of r (by at least 1) at each iteration, by
         # shifting other*x**(got-top) times a scalar from r to q*other; thus, as
@@ -466,6 +581,20 @@ class Polynomial (Lazy):
         # assert r == self - q * other # tends to fail on small errors
         return q, r
 
+    @staticmethod
+    def __newton(a, b, mul=_convolve, inv=_reciprocal):
+        """Divide one coefficient list by another, by Newton's method.
+
+        Reversing the order of a list of coefficients turns division of
+        polynomials into division of power series, which _reciprocal() does
+        efficiently; the first len(a) - len(b) + 1 coefficients of the reversed
+        a / b, reversed, are the quotient.  Returns this and the remainder, each
+        as a list of coefficients.\n"""
+        k, n = len(a) - len(b) + 1, len(b) - 1
+        q = mul(a[::-1][:k], inv(b[::-1], k))[:k]
+        q.reverse()
+        return q, [ x - y for x, y in zip(a[:n], mul(q, b)[:n]) ]
+
     from continued import rationalize
     def ratcom(num, rat=rationalize, hcf=gcd):
         """Expresses a (possibly complex) number in rational form.
@@ -505,7 +634,8 @@ class Polynomial (Lazy):
         return n, d
 
     from cardan import cubic
-    def _lazy_get_roots_(self, ignored, cub=cubic, rat=ratcom):
+    from fractions import Fraction
+    def _lazy_get_roots_(self, ignored, cub=cubic, rat=ratcom, frac=Fraction):
         if self.rank < 1: return ()
         if self.rank < 3:
             # for quadratics, we know how to be exact ...
@@ -514,7 +644,7 @@ class Polynomial (Lazy):
             # and, for cubics, pretty accurate:
             rough, tol = cub(*map(self.__numerator, (3, 2, 1, 0))), 1e-9
         else:
-            rough, tol = self.Weierstrass(1e-9), 1e-7
+            rough, tol = [ z for z, e in self.rootbounds ], 1e-7
 
         # Now try to refine our rough calculation; if any of them is almost an
         # exact rational, check to see if that rational yields a factor; if so,
@@ -525,7 +655,11 @@ class Polynomial (Lazy):
             # Try to approximate v as n / d, with n and d whole:
             try: n, d = rat(v)
             except ValueError: continue # give up on this one
-            q, r = divmod(self, Polynomial((-n, d)))
+            if isinstance(n, complex): # can't check this cheaply; just try it
+                try: q, r = divmod(self, Polynomial((-n, d)))
+                except OverflowError: continue
+            elif self(frac(n, d)): continue # not an exact root
+            else: q, r = divmod(self, Polynomial((-n, d)))
             if r.rank < 0:
                 if d == 1: ans.append(n)
                 else: ans.append(n * 1. / d)
@@ -541,7 +675,7 @@ class Polynomial (Lazy):
             ans.sort(key = lambda x: (x + 0j).real)
             return tuple(ans)
         return tuple(rough)
-    del cubic
+    del cubic, Fraction
 
     def scalarroot(val, exp, odd):
         assert val
@@ -609,14 +743,16 @@ class Polynomial (Lazy):
         Includes partial support for fractional powers"""
         if mod is None:
             wer, result = self, 1
-            def step(b, x, r):
+            def step(b, x, r, more):
                 if b: r *= x
-                return x * x, r
+                if more: x = x * x
+                return x, r
         else:
             wer, result = self % mod, 1 % mod
-            def step(b, x, r, m=mod):
+            def step(b, x, r, more, m=mod):
                 if b: r = (r * x) % mod
-                return (x * x) % mod, r
+                if more: x = (x * x) % mod
+                return x, r
 
         # Undo .__coerce__()'s wrapping (and allow other to be a Polynomial, as
         # long as it's constant):
@@ -638,7 +774,8 @@ class Polynomial (Lazy):
 
         while other >= 1:
             other, b = divmod(other, 2)
-            wer, result = step(b, wer, result)
+            # Skip squaring when done, as that's the biggest multiplication:
+            wer, result = step(b, wer, result, other >= 1)
         if d > 1: result = result.__root(d, mod) # ValueError if not possible
 
         return result
@@ -751,14 +888,18 @@ class Polynomial (Lazy):
     # ({(T: :T)}: * :T), ({(V::T)}: * :{coefficients}) and ({(V: :V)}: + :V)
     # evaluation is ({(V: :T)}: :{polynomials})
     # but the following should also suffice ...
-    def __call__(self, arg):
+    if numpy is None: vector = (list, tuple)
+    else: vector = (list, tuple, numpy.ndarray)
+    def __call__(self, arg, vector=vector):
         """Evaluate a polynomial as a function
 
         For a polynomial, p, with coefficients in some domain V, and a value t
         in some domain T supporting *: T-> V-> V and +: V-> V-> V, we can
         evaluate p(t) by substituting t in as the value of p's formal
-        parameter.\n"""
+        parameter.  If arg is a list, tuple or numpy array, p is instead
+        evaluated at each of its entries, as by .evaluate(arg), q.v.\n"""
 
+        if isinstance(arg, vector): return self.evaluate(arg)
         keys = iter(self._powers) # highest first
         try: top = keys.next()
         except StopIteration: return self._zero
@@ -774,12 +915,77 @@ class Polynomial (Lazy):
         while top > 0:
             result, top = result * arg, top - 1
 
-        if om is not None:
-            r = result / om
-            if r * om == result: return r
-            result *= 1. / om
-
+        if om is not None: return self.__divide(result, om)
         return result
+    del vector
+
+    def _lazy_get__horner_(self, ignored):
+        """Self's coefficients, highest power first, for evaluate()."""
+        return tuple(self.coefficient(k) for k in range(self.rank, -1, -1))
+
+    def _lazy_get__exact_(self, ignored):
+        """Self's raw coefficients, highest first, and denominator.
+
+        Used by evaluate() for whole inputs, so that it can compute exact
+        results, as self(x) does, where ._horner's coefficients would have
+        obliged it to use floats.\n"""
+        return (tuple(self.__numerator(k) for k in range(self.rank, -1, -1)),
+                self.__denom)
+
+    @staticmethod
+    def __divide(n, om):
+        """Divides n by om, exactly when possible, as self(x) does."""
+        r = n / om
+        if r * om == n: return r
+        return n * (1. / om)
+
+    def evaluate(self, xs, derivative=False, np=numpy,
+                 kinds=(int, long, float, complex), whole=(int, long)):
+        """Evaluate self at each of several inputs.
+
+        Required argument, xs, is a sequence (or numpy array) of inputs.
+        Optional argument, derivative, says whether to also compute the values
+        of self.derivative at the same inputs; if true, a pair (values, slopes)
+        is returned, else just values.  For numeric inputs, Horner's scheme is
+        applied (using a tuple of self's coefficients, computed once and
+        remembered), with slopes computed in the same pass; when numpy is
+        available, this is done for all float or complex inputs at once, as an
+        array.  When all inputs are whole, the scheme is applied to self's raw
+        coefficients and the results divided by its denominator, so that they
+        are exact, matching self(x).  Other inputs are evaluated one at a time.
+        Results are arrays if xs is an array, else lists.\n"""
+        ar = False
+        if np is not None:
+            ar = isinstance(xs, np.ndarray)
+            x = np.asarray(xs)
+            if x.dtype.kind in 'fc':
+                p = d = x * 0
+                for c in self._horner:
+                    if derivative: d = d * x + p
+                    p = p * x + c
+                if not ar: p, d = p.tolist(), d.tolist()
+                if derivative: return p, d
+                return p
+            elif ar: xs = x.tolist()
+
+        xs = list(xs)
+        if all(isinstance(x, whole) for x in xs): cs, om = self._exact
+        elif all(isinstance(x, kinds) for x in xs): cs, om = self._horner, None
+        elif derivative: return map(self, xs), map(self.derivative, xs)
+        else: return map(self, xs)
+
+        vs, ds = [], []
+        for x in xs:
+            p = d = 0
+            for c in cs:
+                if derivative: d = d * x + p
+                p = p * x + c
+            if om is not None: p, d = self.__divide(p, om), self.__divide(d, om)
+            vs.append(p)
+            ds.append(d)
+        if ar: vs, ds = np.array(vs), np.array(ds)
+        if derivative: return vs, ds
+        return vs
 
     # Calling one polynomial with another as input yields the composite of the two;
     # the following explores undoing that:
@@ -900,17 +1106,21 @@ class Polynomial (Lazy):
 
     def _lazy_get_sign_(self, ignored):
         if self.rank < 0: return 0 # definitely everywhere zero
-        if self.rank % 1 or not self.isreal: return None
+        if self.rank % 2 or not self.isreal: return None
         if self.rank == 0: return cmp(self.coefficient(0), 0)
-        b, r = self.assquares
-        if r.rank > 0: return None
-        row = b.values()
-        if r.rank == 0: row.append(r.coefficient(0))
-        lo, hi = min(row), max(row)
-        if lo > 0: return +1 # definitely everywhere positive
-        if hi < 0: return -1 # definitely everywhere negative
-
-        return None # this is over-cautious
+        if self.rank <= 8: # else .assquares is slow and seldom conclusive
+            b, r = self.assquares
+            if r.rank <= 0:
+                row = b.values()
+                if r.rank == 0: row.append(r.coefficient(0))
+                lo, hi = min(row), max(row)
+                if lo > 0: return +1 # definitely everywhere positive
+                if hi < 0: return -1 # definitely everywhere negative
+
+        # If no root is real, the sign is that of the leading coefficient:
+        for z, e in self.rootbounds:
+            if abs(z.imag) <= e: return None # this is over-cautious
+        return cmp(self.coefficient(self.rank), 0)
 
     def Weierstrass(self, tol=1e-6):
         """Seeks roots by the method of Weierstrass, a.k.a. Durand-Kerner method.
@@ -934,7 +1144,7 @@ class Polynomial (Lazy):
 
         # Initialize r arbitrarily but reasonably diversely:
         k = (2j -.1) ** (2./self.rank)
-        r = [ k**(2 * i + 1) for k in range(self.rank) ]
+        r = [ k**(2 * i + 1) for i in range(self.rank) ]
         lead = 1. / self.__coefs[self.rank] # Scales self so leading coefficient is 1
 
         # Ensure ensible tol, initialize k so first iteration goes ahead
@@ -967,6 +1177,135 @@ class Polynomial (Lazy):
 
         return tuple(r)
 
+    from operator import truediv
+    def __slopes(self, zs, truediv=truediv, kinds=(int, long)):
+        """Values and derivatives of self at each of zs.
+
+        Returns a pair of lists, as for self.evaluate(zs, True).  When all
+        self's coefficients are whole, each value and derivative is computed
+        exactly, using python's long integers, before rounding to complex;
+        otherwise, this just delegates to evaluate().  Exact values matter at
+        high rank, where rounding in the float arithmetic of Horner's scheme
+        can swamp the value near a root.\n"""
+        cs = [ self.__numerator(k) for k in range(self.rank, -1, -1) ]
+        for c in cs:
+            if not isinstance(c, kinds): return self.evaluate(zs, True)
+
+        om, vs, ds = self.__denom or 1, [], []
+        for z in zs:
+            # z = (ar + 1j * ai) / s; scale Horner's scheme by powers of s:
+            (a, p), (b, q) = z.real.as_integer_ratio(), z.imag.as_integer_ratio()
+            s = max(p, q)
+            ar, ai, vr, vi, dr, di, sj = a * (s // p), b * (s // q), 0, 0, 0, 0, 1
+            for c in cs:
+                dr, di = dr * ar - di * ai + vr, dr * ai + di * ar + vi
+                vr, vi = vr * ar - vi * ai + c * sj, vr * ai + vi * ar
+                sj *= s
+            sj //= s # s**rank, by which the value is scaled
+            vs.append(complex(truediv(vr, sj * om), truediv(vi, sj * om)))
+            sj //= s # and the derivative by s**(rank-1)
+            ds.append(complex(truediv(dr, sj * om), truediv(di, sj * om)))
+        return vs, ds
+    del truediv
+
+    from cmath import exp, pi
+    def Aberth(self, tol=1e-12, start=None, exp=exp, turn=2j * pi):
+        """Seeks roots by the method of Aberth, a.k.a. Ehrlich's method.
+
+        Optional arguments:
+          tol -- tolerance for determining convergence (default: 1e-12); each
+                 root estimate, z, is deemed good enough once an iteration
+                 changes it by less than tol * max(1, abs(z)).
+          start -- None (default) or a sequence of self.rank initial estimates
+                   of the roots; should not be symmetric under conjugation, as
+                   the iteration would then preserve that symmetry.
+        Returns a tuple of length self.rank, each entry in which is a root.
+
+        Like Weierstrass(), this improves estimates of all roots at once; but
+        its step is Newton's, with the other estimates deflated out: each
+        estimate z is moved by w / (1 - w * sum(: 1/(z - y) &larr;y :)) with w =
+        self(z) / self.derivative(z) and y ranging over the other estimates.
+        This converges cubically for simple roots; by default, the start
+        estimates are spread round a circle that encloses all of self's roots.
+        Values and derivatives of self are computed exactly, where possible;
+        see __slopes().\n"""
+
+        n = self.rank
+        if n < 1: return ()
+        if start is None:
+            cs = self._horner
+            size = 2 * max(abs(c * 1. / cs[0]) ** (1. / k)
+                           for k, c in enumerate(cs[1:], 1))
+            r = [ size * exp(turn * (k + .1) / n) for k in range(n) ]
+        else:
+            r = map(complex, start)
+            assert len(r) == n, ('Need one start estimate per root', start)
+        todo, tol, count = range(n), abs(tol), 50 + 10 * n
+
+        while todo and count > 0:
+            vs, ds = self.__slopes([ r[i] for i in todo ])
+            for i, v, d in zip(todo, vs, ds):
+                z = r[i]
+                if not v: todo.remove(i)
+                elif d:
+                    w = v / d
+                    s = sum(1 / (z - y) for y in r if y != z)
+                    r[i] = z - w / (1 - w * s)
+                    if abs(r[i] - z) < tol * max(1, abs(z)): todo.remove(i)
+                else: r[i] = z + tol * max(1, abs(z)) # nudge off stationary point
+            count -= 1
+
+        return tuple(r)
+    del exp, pi
+
+    def __bounds(self, zs, inf=float('inf')):
+        """Weierstrass's error bounds on estimates, zs, of self's roots."""
+        n, lead = self.rank, abs(self.coefficient(self.rank))
+        vs, ds = self.__slopes(zs)
+        if not all(isinstance(c, (int, long)) for c in self.__coefs.values()):
+            # Allow for rounding in evaluate():
+            big = Polynomial([ abs(c) for c in reversed(self._horner) ])
+            vs = [ abs(v) + 4 * n * u * 2.2e-16
+                   for v, u in zip(vs, big.evaluate(map(abs, zs))) ]
+        ans = []
+        for i, z, v in zip(range(n), zs, vs):
+            e = n * abs(v) / lead
+            for j, y in enumerate(zs):
+                if j == i: continue
+                if y == z: e = inf
+                else: e /= abs(z - y)
+            ans.append(e)
+        return ans
+
+    def _lazy_get_rootbounds_(self, ignored, np=numpy):
+        """Approximate roots, each with a bound on its error.
+
+        Tuple of twoples (z, e) with z an approximate root of self and e the
+        radius of a disc about z; the union of these discs contains all of
+        self's roots and each connected part of it contains as many roots as
+        discs.  In particular, if a disc meets no other, it contains exactly
+        one root.  This is Weierstrass's error bound, e = n * abs(self(z) /
+        lead / product(: z - y &larr;y :)), for n = self.rank, lead the leading
+        coefficient and y ranging over the other estimates (enlarged, if self's
+        coefficients aren't all whole, to allow for rounding in computing
+        self(z)).
+
+        The estimates are the eigenvalues of self's companion matrix, when numpy
+        is available, polished by .Aberth(), whose step is Newton's with the
+        other roots deflated out; without numpy, .Aberth() does all the work.
+        When self is real, estimates within their error bound of the real line
+        are replaced by their real parts, as floats; the rest are complex.\n"""
+        if self.rank < 1: return ()
+        if np is None: zs = self.Aberth()
+        else: # nudge the eigenvalues off conjugate symmetry:
+            zs = self.Aberth(start=[ z * (1 + 1e-6j)
+                                     for z in np.roots(self._horner).tolist() ])
+
+        if self.isreal:
+            es = self.__bounds(zs)
+            zs = [ z.real if abs(z.imag) <= e else z for z, e in zip(zs, es) ]
+        return tuple(zip(zs, self.__bounds(zs)))
+
     def _lazy_get__bigcoef_(self, ignored):
         if self.__denom is None: scale = 1
         else: scale = 1. / abs(self.__denom)
@@ -1154,4 +1493,4 @@ class Polynomial (Lazy):
         return Polynomial(cache[k][0].__coefs, cache[k][1])
     __power_sum = []
 
-del Lazy
+del Lazy, numpy
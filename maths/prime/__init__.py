@@ -64,9 +64,13 @@ divisor. These depend on raising randomly chosen values to carefully chosen
 powers modulo the alleged prime (or possibly some related numbers, I'm not
 familiar with the details) and checking the results against the value that
 should result if the number were a prime; for example, for any prime p and
-natural n which is not a multiple of p, n**(p-1) is 1 modulo p.  However,
-these techniques are not (yet) used here, since my interest is principally in
-factorising values, rather than determining whether they are primes.
+natural n which is not a multiple of p, n**(p-1) is 1 modulo p.  Since my
+interest is principally in factorising values, rather than determining whether
+they are primes, these techniques are only used (see
+study.maths.natural.isprime) to decide whether a number beyond the range we've
+sieved is prime, without extending the sieve up to its square root; the bases
+used make the answer exact up to about 3.3e24 and the Baillie-PSW test used
+beyond that has no known counter-example.
 
 Note (see Eureka 45, The Riemann Hypothesis, Mark Coleman) that the number of
 primes <= x grows with x as x/ln(x) or, for better precision, integral(:
@@ -44,6 +44,27 @@ Caches:
    search of data, should check the object it gets back and be ready to continue
    its search if the first match it finds is of this type.
 
+ * Data files may be in python format, with names ending '.py', or in the
+   binary format of study.maths.prime.mapped, with names ending '.bin'; the
+   latter is mapped into memory rather than parsed, so is much quicker to load.
+   New files are written in binary format; see convert() for converting a cache
+   from python format.  Directories' __init__.py files are always python.
+
+ * To find primes[n] or count the primes below some x, without loading every
+   file up to the one needed, each binary file's header records its range of
+   prime indices, and its body the number of primes before each of its blocks,
+   so that only one block's bytes need be looked at within the file.  The file
+   holding x is found from the names of the cache's files; the one holding
+   primes[n] by bisecting on their headers.  Each directory's __init__.py also
+   records, as counts, the range of prime indices of each of its children
+   (relative to its own).  See CacheRoot.count() and .prime().
+
+ * To run through the primes in a range, stream() (or CacheRoot.stream())
+   walks the cache's files in order, rather than looking up each prime, and
+   decodes each block's primes in one pass; a background thread loads and
+   decodes the next block while the consumer works through the present one.
+   Gaps in the cache are sieved as they are reached.
+
  * The cache root __init__.py may eventually record a cache format version, for
    future-prooofing purposes !  However, until the need for that is realised, we
    can leave it out and have it default to 0 if not found :-)
@@ -54,18 +75,40 @@ See study.LICENSE for copyright and license information.
 from study.cache import whole
 from study.snake.regular import Interval
 from study.cache.property import lazyattr, lazyprop
+from study.cache.weak import weakprop
 from base64 import standard_b64encode, standard_b64decode
 from bz2 import decompress
+from errno import EWOULDBLOCK, ENOENT, ESRCH
+import os
+
+def _decode(bok, dec=standard_b64decode, unz=decompress):
+    """Undo the encodings indicated by 'b64' and 'bz2' suffixes on keys.
+
+    Single argument, bok, is a mapping loaded from a cache file; it is modified
+    in place.  See the module doc-string.\n"""
+    for (k, v) in bok.items():
+        if k[-3:] == 'b64' and isinstance(v, basestring):
+            del bok[k]
+            # Helpfully, standard_b64decode knows to ignore '\n'
+            k, v = k[:-3], dec(v)
+            bok[k] = v
+
+        if k[-3:] == 'bz2' and isinstance(v, basestring):
+            del bok[k]
+            bok[k[:-3]] = unz(v)
 
 class Node (whole.Node):
     @lazyattr
-    def indices(self):
+    def indices(self, Range=Interval):
         """Range of prime indices"""
         try: ind = self.__indices
         except AttributeError:
             if not self.prime: raise
-            self.content # evaluate to force self.load()ing
-            ind = self.__indices # raises AttributeError if really not available
+            # Prefer parent's record, to avoid loading self:
+            try: ind = Range(*self.parent.counts[self.name])
+            except (AttributeError, KeyError):
+                self.content # evaluate to force self.load()ing
+                ind = self.__indices # raises AttributeError if really not available
 
         if self.parent is not None:
             ind += self.parent.indices.start
@@ -91,32 +134,22 @@ class Node (whole.Node):
         return Range(lo, sz)
 
     __upload = whole.Node._load_
-    def _load_(self, bok=None,
-               Range=Interval, dec=standard_b64decode, unz=decompress):
+    def _load_(self, bok=None, Range=Interval, decode=_decode):
         bok = self.__upload(bok)
         try: gap = bok.pop('indices') # twople format in file
         except KeyError: pass
-        else: self.__indices = Range(gap[0], ga[1])
-
-        for (k, v) in bok.items():
-            if k[-3:] == 'b64' and isinstance(v, basestring):
-                del bok[k]
-                # Helpfully, standard_b64decode knows to ignore '\n'
-                k, v = k[:-3], dec(v)
-                bok[k] = v
-
-            if k[-3:] == 'bz2' and isinstance(v, basestring):
-                del bok[k]
-                bok[k[:-3]] = unz(v)
+        else: self.__indices = Range(gap[0], gap[1])
 
+        decode(bok)
         return bok
 
-del lazyattr, lazyprop, decompress
+del lazyattr, lazyprop
 
 class CacheSubNode (Node, whole.CacheSubNode):
     __upinit = whole.CacheSubNode.__init__
-    def __init__(self, parent, types, start, reach, sign=None, replaces=None):
-        self.__upinit(parent, types, start, reach, sign, replaces)
+    def __init__(self, name, parent, types, start, reach,
+                 sign=None, replaces=None):
+        self.__upinit(name, parent, types, start, reach, sign, replaces)
         if replaces is not None:
             pass # TODO: sort out other attributes from replaces
 
@@ -197,6 +230,28 @@ class WriteNode (Node, whole.WriteNode):
 del standard_b64encode, standard_b64decode, re
 
 class CacheFile (CacheSubNode, whole.CacheFile):
+    __upread = whole.CacheFile._read_
+    def _read_(self, bok, glo):
+        """Reads self's file; in binary format if its name ends in '.bin'.
+
+        See study.maths.prime.mapped for the binary format; its data are
+        presented, as bok['primes'] or bok['factors'], in the same form as the
+        python format's, but as views reading directly from the memory-mapped
+        file.\n"""
+        if self.suffix != '.bin': return self.__upread(bok, glo)
+
+        from mapped import read
+        kind, factors, data, indices, ranks = read(self._cache_file)
+        root = self.root
+        root.content # evaluate to force root.load()ing, to set .octet
+        if kind.primes != root.octet.primes: # cheaper than comparing kinds
+            raise ValueError('Binary cache file has wrong octet type',
+                             self._cache_file, kind.primes)
+        if indices is not None: bok['indices'] = indices
+        if ranks is not None: bok['ranks'] = ranks
+        if factors: bok['factors'] = data
+        else: bok['primes'] = data
+
     __load = Node._load_
     def _load_(self, bok=None):
         bok = self.__load(bok)
@@ -204,6 +259,15 @@ class CacheFile (CacheSubNode, whole.CacheFile):
         assert not self.factor or any(k.startswith('factor') for k in bok.keys())
         return bok
 
+    from octet import FlagOctet
+    @weakprop
+    def flags(self, Flags=FlagOctet):
+        """FlagOctet describing self's primes."""
+        bok = self.content
+        return Flags(self.root.octet, self.interval.start, bok['primes'],
+                     len(self.span), bok.get('ranks'))
+    del FlagOctet
+
 class WriteFile (WriteNode, CacheFile, whole.WriteFile):
     __save = WriteNode._save_
     def _save_(self, formatter, **what):
@@ -211,9 +275,29 @@ class WriteFile (WriteNode, CacheFile, whole.WriteFile):
         assert not self.factor or any(k.startswith('factor') for k in what.keys())
         return self.__save(formatter, **what)
 
+    __upwrite = whole.WriteFile._write_
+    def _write_(self, formatter, what, path, Range=Interval):
+        """Writes self's file; in binary format if its name ends in '.bin'.
+
+        The binary format (see study.maths.prime.mapped) can only hold indices
+        and one of primes or factors, which must not be compressed.\n"""
+        if self.suffix != '.bin': return self.__upwrite(formatter, what, path)
+
+        from mapped import save
+        ind = what.pop('indices', None)
+        if ind is not None: ind = Range(*ind)
+        (key, data), = what.items()
+        if key not in ('primes', 'factors'):
+            raise ValueError('Binary cache files only hold primes or factors',
+                             key)
+        save(path, self.root.octet, data, key == 'factors', ind)
+
 
 weaklisting = whole.CacheDir.weaklisting
 class CacheDir (Node, whole.CacheDir):
+    # Let sieving writers and many readers share a cache (see LockableDir):
+    flocking, lock_wait = True, 10
+
     @staticmethod
     def _child_class_(isfile, mode):
         # possibly complicate further for mode
@@ -250,16 +334,32 @@ class CacheDir (Node, whole.CacheDir):
         return gap
 
     @weaklisting
-    def primes(self, mode): return 'P' in mode or 'Q' in mode
+    def primes(mode): return 'P' in mode or 'Q' in mode
     @weaklisting
-    def factors(self, mode): return 'F' in mode or 'G' in mode
+    def factors(mode): return 'F' in mode or 'G' in mode
+
+    __load = Node._load_
+    def _load_(self, bok=None):
+        bok = self.__load(bok)
+        self.__counts = bok.pop('counts', {})
+        return bok
 
-    # optionally extend _load_ some more
+    @property
+    def counts(self):
+        """Mapping from child names to ranges of prime indices.
+
+        Each child whose range of prime indices was known when self was last
+        saved is recorded, by name, as a (start, span) twople, with start
+        relative to self.indices.start.\n"""
+        try: return self.__counts
+        except AttributeError: pass
+        self.content # evaluate to force self.load()ing
+        return self.__counts
 
 del weaklisting
 
 class WriteDir (WriteNode, CacheDir, whole.WriteDir):
-    # optionally extend _save_ some more
+    _file_suffix_ = '.bin' # new files use study.maths.prime.mapped's format
 
     @staticmethod
     def _child_class_(isfile, mode):
@@ -273,6 +373,19 @@ class WriteSubDir (WriteDir, CacheSubDir, whole.WriteSubDir): pass
 class CacheRoot (CacheDir, whole.CacheRoot):
     span = Interval(0, None)
 
+    __upinit = whole.CacheRoot.__init__
+    from study.cache.lru import LRU
+    def __init__(self, path, keep=0x1000000, Cache=LRU):
+        """Set up access to a cache.
+
+        Required argument, path, is the cache's root directory.  Optional
+        argument, keep, is the budget, in bytes, of the LRU (see
+        study.cache.lru) in which self retains data it has loaded, as its
+        .lru; a Master replaces this with one shared by all its caches.\n"""
+        self.__upinit(path)
+        self.lru = Cache(keep)
+    del LRU
+
     def get_factors(self, value, gap=None):
         """Find a chunk or gap enclosing a designated integer.
 
@@ -317,7 +430,92 @@ class CacheRoot (CacheDir, whole.CacheRoot):
         if value is None: return self.locate(index, 'indices', gap, 'primes')
         else: return self.locate(value / self.octet.modulus, 'span', gap, 'primes')
 
-    __load = Node._load_
+    def __kind(self):
+        """self.octet, loading self's __init__.py first if need be."""
+        try: return self.octet
+        except AttributeError: pass
+        self.content # evaluate to force self.load()ing, to set .octet
+        return self.octet
+
+    def __hold(self, BLOCKED=EWOULDBLOCK):
+        """Read-lock self, so that no writer changes its files meanwhile.
+
+        Raises IOError on failure; else, the caller must .unlock(read=True)
+        when done.\n"""
+        if not self.lock(read=True):
+            raise IOError(BLOCKED, 'Cache temporarily unreadable', self.path())
+
+    def __lookup(self, find, key, tries=3, GONE=ENOENT):
+        """Load the data file find() picks out, holding self's read lock.
+
+        Required arguments are find, called with self's directory, key and
+        self.lru, as for _find() and _select(), and key.  Returns (block, ind)
+        as for _block(), or None if find() finds nothing.  If the file find()
+        named is gone by the time it is loaded, as when some process without
+        the write lock, or that doesn't honour it, compact()s the cache, find()
+        is tried again, up to tries (default: 3) times in all.\n"""
+        kind = self.__kind()
+        while True:
+            self.__hold()
+            try:
+                got = find(self.path(), key, self.lru)
+                if got is None: return None
+                start, span, name, ind = got
+                try: return _block(name, start, span, kind, self.lru)[0], ind
+                except EnvironmentError, what:
+                    tries -= 1
+                    if what.errno != GONE or tries < 1: raise
+            finally: self.unlock(read=True)
+
+    def count(self, value):
+        """Number of primes less than value.
+
+        Single argument, value, is a natural.  Raises LookupError if this cache
+        lacks the data needed to answer.  The file containing the naturals just
+        below value is found by descending through the cache's directories,
+        guided by their names (see _find); only it is loaded, to count the
+        primes in it below value, adding the number before it, recorded in its
+        directory's counts.  Directories' entries are remembered, in self.lru,
+        until their __init__.py changes, as is the loaded file until it
+        changes, so a repeat look-up only needs to stat() one file per level.
+        The cache is read-locked while this is done; raises IOError if that
+        isn't possible.  If a file vanishes (see compact) between being found
+        and being loaded, it is looked for again.\n"""
+        if value <= 2: return 0 # no primes below 2
+        got = self.__lookup(lambda p, q, c: _find(p, q, 'P', c),
+                            (value - 1) // self.__kind().modulus)
+        if got is not None and got[1] is not None:
+            return got[1][0] + got[0].rank(value)
+        raise LookupError('No prime data cached for', value)
+
+    def prime(self, index):
+        """The prime with a given index, i.e. primes[index].
+
+        Single argument, index, is a natural.  Raises LookupError if this cache
+        lacks the data needed to answer.  The file containing the prime is
+        found by descending through the cache's directories, guided by the
+        ranges of prime indices their counts record (see _select), as for
+        .count(); only it is loaded, to select the prime.  Locking, and files
+        vanishing, are handled as for .count().\n"""
+        got = self.__lookup(_select, index)
+        if got is not None: return got[0].select(index - got[1][0])
+        raise LookupError('No prime data cached for index', index)
+
+    def stream(self, lo=0, hi=None, ahead=1, chunk=16):
+        """Iterate the primes p with lo <= p < hi, in increasing order.
+
+        All arguments are optional; see study.maths.prime.cache.stream, which
+        this calls with self's directory and octet type.  Walks this cache's
+        files in order, prefetching the next while the present one's primes
+        are consumed, and sieves any gaps between them.  The cache is
+        read-locked while each file is found and loaded, via a separate
+        CacheRoot, as the prefetch thread does the locking; it shares
+        self.lru.\n"""
+        guard = CacheRoot(self.path())
+        guard.lru = self.lru
+        return stream(self.path(), self.__kind(), lo, hi, ahead, chunk, guard)
+
+    __load = CacheDir._load_
     from octet import OctetType
     def _load_(self, bok=None, mode=OctetType, Range=Interval):
         bok = self.__load(bok)
@@ -326,7 +524,30 @@ class CacheRoot (CacheDir, whole.CacheRoot):
         return bok
     del OctetType
 
-class WriteRoot (WriteDir, whole.WriteRoot):
+class WriteRoot (WriteDir, CacheRoot, whole.WriteRoot):
+    __upinit = CacheRoot.__init__
+    from octet import OctetType
+    def __init__(self, path, primes=None,
+                 exists=os.path.exists, kind=OctetType, Range=Interval):
+        """Set up a writable cache root.
+
+        Required argument, path, is the cache's root directory.  If it has an
+        __init__.py, the cache's octet type and extent are loaded from it (see
+        CacheRoot._load_); otherwise, the cache is new and optional argument
+        primes, the primes defining the octet type to use, must be supplied
+        (default: None, which raises ValueError for a new cache).  The new
+        cache's __init__.py is written by its first .store().\n"""
+        self.__upinit(path)
+        if exists(self._cache_file):
+            self.content # evaluate to force self.load()ing, to set .octet
+            self.__depth = self.depth
+        elif primes is None:
+            raise ValueError('New cache needs an octet type', path)
+        else:
+            self.octet, self.span = kind(primes), Range(0, None)
+            self.__depth = 1
+    del OctetType
+
     __save = WriteDir._save_
     def _save_(self, formatter, **what):
         if self.span.stop is None:
@@ -336,10 +557,789 @@ class WriteRoot (WriteDir, whole.WriteRoot):
         what['octet'] = self.octet.primes
         return self.__save(formatter, **what)
 
+    from octet import FlagOctet
+    from study.crypt.base import intbase
+    def store(self, base, data, factors=False,
+              Range=Interval, Flags=FlagOctet, enc=intbase(36).encode,
+              remove=os.remove, exists=os.path.exists, pid=os.getpid(),
+              BLOCKED=EWOULDBLOCK, FAN=20, KEEP=12):
+        """Save one block of sieve output in a new cache file.
+
+        Required arguments:
+          base -- the natural at which the data start; a multiple of
+                  self.octet.modulus
+          data -- primeness or factor data, in the form used by FlagOctet or
+                  FactorOctet, respectively, for self.octet; each yield of
+                  study.maths.prime.sieve.segments() provides base and data.
+
+        Optional argument, factors, should be true if data is factor data;
+        it defaults to false, for primeness data.  The data is written, in the
+        binary format of study.maths.prime.mapped, to a new file, under a
+        temporary name, renamed into place once complete.  It goes in the
+        directory, at depth one below self, whose span starts last before the
+        new file's (see _add); directories are split when they get more than
+        twenty entries and, when self does, it moves its entries, in groups of
+        twelve, into new sub-directories, so as to keep each directory's
+        number of entries close to twelve (see study.cache.whole).  The
+        __init__.py of each directory changed, and of self, is then re-written
+        to record its entries' ranges of prime indices, as counts, and (for
+        self) the cache's extent.  When storing primeness data, if the range
+        of prime indices of the data before base is known (or base is 0), the
+        new file records its range of prime indices.  Raises ValueError if the
+        new file would overlap an existing one of its type, IOError if self
+        can't be write-locked.\n"""
+
+        from mapped import save
+        kind = self.octet
+        q, r = divmod(base, kind.modulus)
+        assert r == 0
+        if factors: size, types = len(kind), 'F'
+        else: size, types = kind.size, 'P'
+        count, r = divmod(len(data), size)
+        assert r == 0 and count > 0
+
+        if not self.lock(write=True):
+            raise IOError(BLOCKED, 'Cache temporarily unwritable', self.path())
+        try:
+            # Record prime indices, if those of the preceding data are known:
+            start = None
+            if factors: pass
+            elif not q: start = 0
+            else:
+                got = _find(self.path(), q - 1, types)
+                if got is not None and got[0] + got[1] == q and got[3]:
+                    start = sum(got[3])
+
+            if start is None: ind = None
+            else:
+                block = Flags(kind, base, data, count)
+                ind = (start, block.rank(block.span.stop))
+
+            name = (enc(q) or '0') + types + enc(count) + '.bin'
+            tmp = self.path(name + '.%d.tmp' % pid)
+            save(tmp, kind, data, factors, ind and Range(*ind))
+            try: row = _add(self.path(), 0, self.__depth, 0,
+                            (q, count, tmp, ind), types)
+            finally:
+                if exists(tmp): remove(tmp)
+
+            if len(row) > FAN:
+                row = [_gather(self.path(), 0, self.__depth, row[i:i + KEEP],
+                               types) for i in range(0, len(row), KEEP)]
+                self.__depth += 1
+
+            self.__record(max(q + count, self.span.stop or 0), row)
+        finally: self.unlock(write=True)
+    del FlagOctet, intbase
+
+    def __record(self, top, row, Range=Interval):
+        """Re-write self's __init__.py to record the cache's extent and counts.
+
+        Required arguments are the end of the cache's data, in units of
+        self.octet.modulus, and the entries of self's directory, as returned
+        by _entries(); see _save_index.\n"""
+        _save_index(self.path(), self.__depth, row, 0,
+                    octet=self.octet.primes, top=top)
+        self.span = Range(0, top)
+        if self.lru is not None: self.lru.drop(self._cache_file)
+        self._ontidy_()
+
+    def compact(self, size, steps=None):
+        """Merge small adjacent files of this cache.
+
+        Required argument, size, is the size in bytes above which merged files
+        are not wanted; optional steps is None (default) or the maximum number
+        of merges to do.  See study.maths.prime.cache.compact, which this calls,
+        with self as guard; and Compactor, for doing this in the background.
+        Returns the number of merges done.\n"""
+        try: return compact(self.path(), size, steps, self)
+        finally: self._ontidy_()
+
 
-del Node, CacheSubNode, WriteNode, Interval, whole
+del Node, CacheSubNode, WriteNode, whole
 from study.snake.sequence import Ordered
-import os
+import re
+
+def convert(path, remove=True, decode=_decode, walk=os.walk,
+            join=os.path.join, unlink=os.remove, Range=Interval,
+            match=re.compile(r'^(N|P|)[0-9a-z]+([A-Z]+)[0-9a-z]+\.py$').match):
+    """Convert a cache's data files from python format to binary.
+
+    Required argument, path, is the cache's root directory.  Every data file in
+    python format, beneath this root, is rewritten in the binary format of
+    study.maths.prime.mapped, under the same name but with '.bin' in place of
+    '.py' as suffix; directories' __init__.py files are left as they are.
+    Optional argument, remove, is true (the default) to delete each python
+    format file once its binary replacement has been written.  No locking is
+    done: nothing else should use the cache while it is being converted.
+    Returns the number of files converted.\n"""
+
+    from octet import OctetType
+    from mapped import save
+
+    bok = {}
+    execfile(join(path, '__init__.py'), {}, bok)
+    kind, count = OctetType(bok['octet']), 0
+
+    for top, dirs, files in walk(path):
+        for name in files:
+            got = match(name)
+            if got is None: continue
+            types, old, bok = got.group(2), join(top, name), {}
+            execfile(old, {}, bok)
+            decode(bok)
+            if 'F' in types or 'G' in types: key = 'factors'
+            else: key = 'primes'
+            ind = bok.get('indices')
+            if ind is not None: ind = Range(*ind)
+            save(old[:-3] + '.bin', kind, bok[key], key == 'factors', ind)
+            if remove: unlink(old)
+            count += 1
+
+    return count
+
+from study.crypt.base import intbase
+
+def compact(path, size, steps=None, guard=None, walk=os.walk,
+            join=os.path.join, weigh=os.path.getsize, unlink=os.remove,
+            rename=os.rename, poke=os.kill, pid=os.getpid(),
+            enc=intbase(36).encode, Range=Interval,
+            match=re.compile(r'^([0-9a-z]+)([A-Z]+)([0-9a-z]+)\.bin$').match,
+            temp=re.compile(r'\.(\d+)\.tmp$').search, NOPROC=ESRCH):
+    """Merge small adjacent binary data files beneath a cache directory.
+
+    Required arguments:
+      path -- the cache's root directory
+      size -- the size, in bytes, above which merged files are not wanted
+
+    Optional arguments:
+      steps -- None (default) or the maximum number of merges to perform
+      guard -- None (default) or an object whose .lock(write=True) must
+               succeed before each merge; its .unlock(write=True) is called
+               after.  Typically the cache's WriteRoot; its .lru, if any,
+               forgets the files a merge removes (see _block).
+
+    Within each directory, any two binary files of the same types, with
+    abutting ranges, whose sizes sum to no more than size, are merged into
+    one, whose data is that of both.  Each merge writes the new file, under a
+    temporary name that listings ignore, renames it into place and only then
+    removes the old files; readers with the old files mapped into memory can
+    carry on using them.  Readers holding the cache's read lock, which
+    guard's write lock excludes, never see a merge half-done; any that find an
+    old file gone look again (see CacheRoot.count()).  A merge interrupted
+    part-way leaves files whose ranges are subsumed by another's; these are
+    removed, with guard's write lock held, before looking for merges.  So are
+    temporary files left behind by processes that no longer exist.  Files in
+    python format are ignored; see convert().
+
+    Each merge is recorded in the directory's __init__.py, if it has one, so
+    that the counts of the merged file replace those of the two (see
+    _merged).  Returns the number of merges performed (stopping early if
+    guard's lock fails).\n"""
+
+    from mapped import read, save
+    done, lru = 0, getattr(guard, 'lru', None)
+    for top, dirs, files in walk(path):
+        row = {}
+        for name in files:
+            got = temp(name)
+            if got:
+                who = int(got.group(1))
+                if who != pid:
+                    try: poke(who, 0)
+                    except OSError, what:
+                        # EPERM means it's alive, just not ours to signal:
+                        if what.errno == NOPROC:
+                            unlink(join(top, name)) # dead writer's
+                continue
+
+            got = match(name)
+            if got is not None:
+                text, types = got.group(1), got.group(2)
+                start, span = int(text, 36), int(got.group(3), 36)
+                row.setdefault(types, []).append((start, -span, text, name))
+
+        for types, seq in row.items():
+            seq.sort() # by start; widest first among those with equal start
+            keep, gone = [], {}
+            for start, span, text, name in seq:
+                span, end = -span, keep and keep[-1][0] + keep[-1][1]
+                if not keep or start >= end:
+                    keep.append((start, span, text, name))
+                elif start + span <= end:
+                    # Subsumed, hence left over from an interrupted merge:
+                    gone.setdefault(keep[-1][3], []).append(name)
+                # else: overlap we don't understand; leave well alone.
+
+            if gone:
+                if guard is not None and not guard.lock(write=True):
+                    return done
+                try:
+                    for name, parts in gone.items():
+                        for it in parts:
+                            unlink(join(top, it))
+                            if lru is not None: lru.drop(('block', join(top, it)))
+                        _merged(top, parts, name)
+                finally:
+                    if guard is not None: guard.unlock(write=True)
+
+            a = keep[0]
+            for b in keep[1:]:
+                if (steps is not None and done >= steps or
+                    a[0] + a[1] != b[0] or
+                    weigh(join(top, a[3])) + weigh(join(top, b[3])) > size):
+                    a = b
+                    continue
+
+                if guard is not None and not guard.lock(write=True):
+                    return done
+                try:
+                    kind, factors, one, ind, ignore = read(join(top, a[3]))
+                    kind, factors, two, dex, ignore = read(join(top, b[3]))
+                    if factors: data = list(one) + list(two)
+                    else: data = str(one) + str(two)
+                    if ind is None or dex is None or sum(ind) != dex[0]:
+                        ind = None
+                    else: ind = Range(ind[0], ind[1] + dex[1])
+
+                    span = a[1] + b[1]
+                    name = a[2] + types + enc(span) + '.bin'
+                    tmp = join(top, name + '.%d.tmp' % pid)
+                    save(tmp, kind, data, factors, ind)
+                    rename(tmp, join(top, name))
+                    unlink(join(top, a[3]))
+                    unlink(join(top, b[3]))
+                    _merged(top, (a[3], b[3]), name)
+                    if lru is not None:
+                        lru.drop(('block', join(top, a[3])))
+                        lru.drop(('block', join(top, b[3])))
+                finally:
+                    if guard is not None: guard.unlock(write=True)
+
+                done += 1
+                a = (a[0], span, a[2], name)
+
+    return done
+
+del intbase
+
+from threading import Thread
+class Compactor (Thread):
+    """Background thread compacting a cache, one merge at a time.
+
+    Repeatedly calls its cache's .compact(), asking for one merge at a time,
+    so that readers only ever wait for one merge; when there is nothing to
+    merge it waits a while (new data may arrive, e.g. from a sieve) and tries
+    again, until told to .stop().  Its .merged counts the merges done.\n"""
+
+    __upinit = Thread.__init__
+    def __init__(self, root, size, pause=1.):
+        """Set up, but don't start, a background compaction thread.
+
+        Required arguments:
+          root -- the WriteRoot of the cache to compact
+          size -- the size, in bytes, above which merged files are not wanted
+
+        Optional argument, pause, is the number of seconds (default: 1) to wait
+        before looking again, when there is nothing to merge.\n"""
+        from threading import Event
+        self.__upinit(name='Compactor')
+        self.setDaemon(True)
+        self.__root, self.__size, self.__pause = root, size, pause
+        self.__halt, self.merged = Event(), 0
+
+    def run(self):
+        while not self.__halt.isSet():
+            n = self.__root.compact(self.__size, 1)
+            self.merged += n
+            if not n: self.__halt.wait(self.__pause)
+
+    def stop(self):
+        """Ask the thread to stop and wait until it has."""
+        self.__halt.set()
+        self.join()
+
+def _index(path, listdir=os.listdir, join=os.path.join, exists=os.path.exists,
+           match=re.compile(
+        r'^([0-9a-z]+)([A-Z]+)([0-9a-z]+)(\.py|\.bin|)$').match):
+    """The contents of a cache directory, as recorded and as listed.
+
+    Single argument, path, is the directory.  Returns a twople (bok, row): bok
+    is the namespace of its __init__.py (empty if it has none); row is a
+    sorted list of (start, span, types, name) for its entries whose names have
+    the forms of cache files, with start relative to the directory's own;
+    those names with no suffix are directories.\n"""
+    bok, row, init = {}, [], join(path, '__init__.py')
+    if exists(init): execfile(init, {}, bok)
+    for name in listdir(path):
+        got = match(name)
+        if got is not None:
+            row.append((int(got.group(1), 36), int(got.group(3), 36),
+                        got.group(2), name))
+    row.sort()
+    return bok, row
+
+def _stamp(path, stat=os.stat, join=os.path.join, OSError=os.error):
+    """Identifies the present version of a cache directory's __init__.py.
+
+    Single argument, path, is the directory.  Returns None if it has no
+    __init__.py; else a tuple that changes whenever the file is replaced, as
+    it is whenever the directory's entries change.\n"""
+    try: st = stat(join(path, '__init__.py'))
+    except OSError: return None
+    return st.st_ino, st.st_mtime, st.st_size
+
+def _entries(path, start, ind, types, lru=None,
+             load=_index, stamp=_stamp, join=os.path.join):
+    """The entries of one type in a cache directory.
+
+    Required arguments:
+      path -- the directory
+      start -- the start of its span
+      ind -- None or the start of its range of prime indices
+      types -- the type letter wanted
+
+    Returns a list, in order, of (start, span, name, indices) for those of its
+    entries whose types include the one wanted, with start absolute; indices
+    is None or the (start, length) of the entry's range of prime indices,
+    taken from the directory's counts or, failing that, a binary file's
+    header.  Optional argument, lru, is None (default) or an LRU (see
+    study.cache.lru) in which to retain the answer, keyed by path and types,
+    for re-use as long as the directory's __init__.py is unchanged (see
+    _stamp), so that repeat look-ups need no listdir() or parsing.\n"""
+    when = stamp(path)
+    if lru is not None and when is not None:
+        key = ('entries', path, types)
+        try: was = lru.get(key)
+        except KeyError: pass
+        else:
+            if was[:3] == (when, start, ind): return was[3]
+
+    bok, row = load(path)
+    counts, ans = bok.get('counts', {}), []
+    for lo, span, kind, name in row:
+        if types not in kind: continue
+        if ind is not None and name in counts:
+            got = counts[name]
+            got = (ind + got[0], got[1])
+        elif name.endswith('.bin'):
+            from mapped import read
+            got = read(join(path, name))[3]
+        else: got = None
+        ans.append((start + lo, span, name, got))
+
+    if lru is not None and when is not None:
+        lru.pin(key, (when, start, ind, ans))
+    return ans
+
+def _find(path, q, types='P', lru=None, join=os.path.join):
+    """The data file, beneath a cache's root directory, containing a block.
+
+    Required arguments are the root directory, path, and q, the number of the
+    block (i.e. a natural divided by the cache's modulus, rounded down);
+    optional types (default: 'P') is the type letter of the data wanted and
+    lru is as for _entries().  Descends through the directories whose spans
+    include q, guided by their names.  Returns (start, span, name, indices)
+    as for _entries() but with name the file's full path, or None if no data
+    file includes q.\n"""
+    start, ind = 0, 0
+    while True:
+        row = _entries(path, start, ind, types, lru)
+        i = len(row)
+        while i and row[i - 1][0] > q: i -= 1
+        if not i: return None
+        lo, span, name, got = row[i - 1]
+        if lo + span <= q: return None
+        path = join(path, name)
+        if '.' in name: return lo, span, path, got
+        start, ind = lo, got and got[0]
+
+def _select(path, index, lru=None, join=os.path.join):
+    """The prime data file, beneath a cache's root, holding primes[index].
+
+    Required arguments are the root directory, path, and a natural, index;
+    optional lru is as for _entries().  Descends through the directories
+    whose ranges of prime indices, recorded in their parents' counts,
+    include index.  Returns as for _find().\n"""
+    start, ind = 0, 0
+    while True:
+        for lo, span, name, got in _entries(path, start, ind, 'P', lru):
+            if got is not None and got[0] <= index < got[0] + got[1]: break
+        else: return None
+        path = join(path, name)
+        if '.' in name: return lo, span, path, got
+        start, ind = lo, got[0]
+
+def _walk(path, q=0, types='P', lru=None, start=0, ind=0,
+          join=os.path.join):
+    """List of the data files beneath a cache directory, from some block on.
+
+    Required argument, path, is the directory; optional arguments are: q, the
+    number of a block (default: 0), before which files are left out; types
+    and lru, as for _find(); and start and ind, the start of path's span and
+    of its range of prime indices (default: 0, as for a cache's root).
+    Returns a list, in order, of entries as returned by _find().\n"""
+    ans = []
+    for lo, span, name, got in _entries(path, start, ind, types, lru):
+        if lo + span <= q: continue
+        here = join(path, name)
+        if '.' in name: ans.append((lo, span, here, got))
+        else: ans += _walk(here, q, types, lru, lo, got and got[0])
+    return ans
+
+def _merged(path, parts, name, exists=os.path.exists, join=os.path.join):
+    """Record, in a cache directory's __init__.py, a merge of entries.
+
+    Required arguments are the directory, path, the names of the entries
+    merged, in order, and the name of the entry that replaces them.  Nothing
+    is done if the directory has no __init__.py; otherwise, its counts are
+    revised, as is the file itself, so that cached entries (see _entries) are
+    refreshed.  If counts already has an entry for name, it is kept.\n"""
+    init = join(path, '__init__.py')
+    if not exists(init): return
+    bok = {}
+    execfile(init, {}, bok)
+    counts = bok.pop('counts', {})
+    got = [counts.pop(it, None) for it in parts]
+    if name not in counts and None not in got:
+        ind, span = got[0]
+        for lo, n in got[1:]:
+            if lo != ind + span: break
+            span += n
+        else: counts[name] = (ind, span)
+    _save_index(path, bok.pop('depth', 1), None, None, counts=counts, **bok)
+
+def _reach(row):
+    """Span and range of prime indices of a directory's entries.
+
+    Single argument, row, is a non-empty list of entries, as returned by
+    _entries().  Returns (start, span, indices) with indices None or the
+    (start, length) of the range of prime indices of those entries, from the
+    first, as far as they are known and contiguous.\n"""
+    lo, hi = row[0][0], max([e[0] + e[1] for e in row])
+    ind = row[0][3]
+    if ind is not None:
+        end = ind[0] + ind[1]
+        for e in row[1:]:
+            if e[3] is None or e[3][0] != end: break
+            end += e[3][1]
+        ind = (ind[0], end - ind[0])
+    return lo, hi - lo, ind
+
+def _save_index(path, depth, row, ind, pid=os.getpid(), sync=os.fsync,
+                rename=os.rename, join=os.path.join, **what):
+    """Re-write a cache directory's __init__.py to describe its entries.
+
+    Required arguments:
+      path -- the directory
+      depth -- its depth: 1 if it holds files, else one more than its
+               sub-directories'
+      row -- its entries, as returned by _entries(), or None
+      ind -- None or the start of the directory's range of prime indices
+
+    Records, as counts, the range of prime indices of each entry in row for
+    which this is known, relative to ind; if row is None, counts must instead
+    be passed as a keyword argument.  Any further keyword arguments are also
+    recorded (the root uses this for its octet and extent).  Written via a
+    temporary file, renamed into place, so readers see either the old
+    version or the new (and those remembering the old can tell, see
+    _stamp).\n"""
+    if row is not None:
+        counts = what['counts'] = {}
+        if ind is not None:
+            for start, span, name, got in row:
+                if got is not None: counts[name] = (got[0] - ind, got[1])
+
+    init = join(path, '__init__.py')
+    tmp = init + '.%d.tmp' % pid
+    fd = open(tmp, 'w')
+    try:
+        fd.write('depth = %d\n' % depth)
+        for k in sorted(what.keys()): fd.write('%s = %r\n' % (k, what[k]))
+        fd.flush()
+        sync(fd.fileno())
+    finally: fd.close()
+    rename(tmp, init)
+
+from study.crypt.base import intbase
+def _rebase(name, start, enc=intbase(36).encode, match=re.compile(
+        r'^([0-9a-z]+)([A-Z]+[0-9a-z]+(\.py|\.bin|))$').match):
+    """Name, for a new start, of a cache file or directory."""
+    return (enc(start) or '0') + match(name).group(2)
+
+def _gather(path, start, depth, row, types, home=None, mkdir=os.mkdir,
+            rename=os.rename, join=os.path.join, enc=intbase(36).encode,
+            rebase=_rebase):
+    """Move some entries of a cache directory into a new sub-directory of it.
+
+    Required arguments:
+      path -- the directory
+      start -- the start of its span
+      depth -- the depth of the new sub-directory
+      row -- the entries to move, as returned by _entries(); the same
+             entries, with their new names, are what the new sub-directory
+             then holds
+      types -- the type letter of its entries
+
+    Optional argument, home, is the directory the entries are in, if not
+    path (default: None, meaning path).  Returns the new sub-directory's
+    entry, as for _entries().\n"""
+    if home is None: home = path
+    lo, span, ind = _reach(row)
+    name = (enc(lo - start) or '0') + types + enc(span)
+    top = join(path, name)
+    mkdir(top)
+    for i, (at, size, was, got) in enumerate(row):
+        row[i] = (at, size, rebase(was, at - lo), got)
+        rename(join(home, was), join(top, row[i][2]))
+    _save_index(top, depth, row, ind and ind[0])
+    return lo, span, name, ind
+
+def _settle(path, start, depth, kid, row, types, rename=os.rename,
+            join=os.path.join, enc=intbase(36).encode, FAN=20, KEEP=12):
+    """Bring a cache sub-directory's name and __init__.py up to date.
+
+    Required arguments:
+      path -- the parent directory
+      start -- the start of its span
+      depth -- the sub-directory's depth
+      kid -- the sub-directory's name
+      row -- the sub-directory's entries, as returned by _entries()
+      types -- the type letter of its entries
+
+    If the sub-directory has more than twenty entries, all but its first
+    twelve are moved to a new sibling (see _gather).  Returns a list of the
+    entries (as for _entries) the parent now has in place of the old one.\n"""
+    ans = []
+    if len(row) > FAN:
+        ans.append(_gather(path, start, depth, row[KEEP:], types,
+                           join(path, kid)))
+        del row[KEEP:]
+
+    lo, span, ind = _reach(row)
+    name = (enc(lo - start) or '0') + types + enc(span)
+    _save_index(join(path, kid), depth, row, ind and ind[0])
+    if name != kid: rename(join(path, kid), join(path, name))
+    ans.insert(0, (lo, span, name, ind))
+    return ans
+
+def _add(path, start, depth, ind, new, types, mkdir=os.mkdir,
+         rename=os.rename, join=os.path.join, enc=intbase(36).encode):
+    """Add a new data file to a cache directory, or a sub-directory of it.
+
+    Required arguments:
+      path -- the directory
+      start -- the start of its span
+      depth -- its depth: the new file goes in a sub-directory of depth one
+      ind -- None or the start of its range of prime indices
+      new -- (start, span, tmp, indices) for the new file: its data have been
+             written to a temporary file named tmp, to be renamed into place;
+             indices is as for _entries()
+      types -- the type letter of the new file
+
+    The sub-directory (of each depth) to which the new file is added is the
+    last whose span starts before the new file's; or a new one, if there is no
+    such sub-directory.  Sub-directories whose spans change are renamed to
+    match and any, with more than twenty entries, is split (see _settle).
+    Raises ValueError if the new file would overlap an existing one.  Returns
+    the directory's revised list of entries, as for _entries(); the caller
+    is responsible for its name and __init__.py.\n"""
+    q, count, tmp, got = new
+    row = _entries(path, start, ind, types)
+    i = len(row)
+    while i and row[i - 1][0] > q: i -= 1
+    if i < len(row) and row[i][0] < q + count or (
+        depth == 1 and i and row[i - 1][0] + row[i - 1][1] > q):
+        raise ValueError('Overlaps existing file', q, path)
+
+    if depth == 1:
+        name = (enc(q - start) or '0') + types + enc(count) + '.bin'
+        rename(tmp, join(path, name))
+        row.insert(i, (q, count, name, got))
+    elif i:
+        lo, span, kid, was = row[i - 1]
+        sub = _add(join(path, kid), lo, depth - 1, was and was[0], new, types)
+        row[i - 1:i] = _settle(path, start, depth - 1, kid, sub, types)
+    else: # no sub-directory starts before the new file: start a new one
+        kid = (enc(q - start) or '0') + types + enc(count)
+        mkdir(join(path, kid))
+        sub = _add(join(path, kid), q, depth - 1, got and got[0], new, types)
+        row[:0] = _settle(path, start, depth - 1, kid, sub, types)
+    return row
+
+del intbase
+
+from octet import FlagOctet
+def _block(name, start, span, kind, lru=None,
+           decode=_decode, Flags=FlagOctet, stat=os.stat):
+    """Load a prime data file as a FlagOctet.
+
+    Required arguments are the file's name, its start and span (in units of
+    kind.modulus, as yielded by _walk) and the cache's OctetType, kind.
+    Binary files are mapped into memory; python ones are parsed.  Optional
+    argument, lru, is None (default) or an LRU (see study.cache.lru) in which
+    to retain the answer, keyed by name, weighed by the file's size; it is
+    only re-used while the file's inode, size and modification time, and the
+    start asked for, are unchanged.  Returns a twople (octet, indices), with
+    indices None or the (start, length) of the range of prime indices the
+    file records.\n"""
+    if lru is not None:
+        st = stat(name)
+        when, key = (st.st_ino, st.st_mtime, st.st_size, start), ('block', name)
+        try: was = lru.get(key)
+        except KeyError: pass
+        else:
+            if was[0] == when: return was[1]
+
+    if name.endswith('.bin'):
+        from mapped import load
+        block, ind = load(name, start * kind.modulus)
+        if block.kind.primes != kind.primes: # cheaper than comparing kinds
+            raise ValueError('Binary cache file has wrong octet type',
+                             name, block.kind.primes)
+    else:
+        bok = {}
+        execfile(name, bok)
+        decode(bok)
+        block = Flags(kind, start * kind.modulus, bok['primes'], span)
+        ind = bok.get('indices')
+
+    if lru is not None: lru.pin(key, (when, (block, ind)), st.st_size)
+    return block, ind
+
+def blocks(path, kind, lo=0, hi=None, chunk=16, guard=None, files=_walk,
+           load=_block, tries=3, Flags=FlagOctet,
+           BLOCKED=EWOULDBLOCK, GONE=ENOENT):
+    """Iterate FlagOctets covering a range of the naturals, in order.
+
+    Required arguments:
+      path -- the cache's root directory
+      kind -- the cache's OctetType
+
+    Optional arguments:
+      lo -- start of the range to cover (default: 0)
+      hi -- end of the range to cover, or None (default) to carry on forever
+      chunk -- maximum number of blocks, each of kind.modulus naturals, to
+               sieve in one go, where the cache has no data (default: 16)
+      guard -- None (default) or an object, typically the cache's CacheRoot,
+               whose .lock(read=True) must succeed (else IOError is raised)
+               before the cache's files are listed and before each is loaded;
+               its .unlock(read=True) is called after, before yielding.  Its
+               .lru, if any, is used as for _walk() and _block().
+      tries -- number of times (default: 3) to list the cache's files afresh,
+               in a row, when the next file to load has gone away
+
+    Walks the cache's prime data files in order of their ranges, loading each
+    (binary files by mapping them into memory); any gap between files is
+    sieved, chunk blocks at a time.  The first octet yielded contains lo, the
+    last reaches hi and each begins no later than the one before ends.  Files
+    in any sub-directories are included; where files overlap, the first is
+    used as far as it goes, then the next, although it begins before that
+    point (callers should skip what they have seen, as stream() does).  The
+    files are listed once, up front; if one has gone by the time it is to be
+    loaded, e.g. merged into another by compact(), the files from the current
+    position on are listed again.\n"""
+
+    from sieve import wheel, pack, rootprimes
+    from study.maths.natural import sqrt
+
+    def hold():
+        if guard is not None and not guard.lock(read=True):
+            raise IOError(BLOCKED, 'Cache temporarily unreadable', path)
+
+    def listing(q):
+        hold()
+        try: return files(path, q, 'P', lru)
+        finally:
+            if guard is not None: guard.unlock(read=True)
+
+    m, i, lru, left = kind.modulus, 0, getattr(guard, 'lru', None), tries
+    q = lo // m
+    seq = listing(q)
+    if hi is None: stop = None
+    else: stop = (hi + m - 1) // m
+    sift, reach = (), 0
+    while stop is None or q < stop:
+        while i < len(seq) and seq[i][0] + seq[i][1] <= q: i += 1
+        if i < len(seq) and seq[i][0] <= q:
+            start, span, name, ind = seq[i]
+            hold()
+            try: block = load(name, start, span, kind, lru)[0]
+            except EnvironmentError, what:
+                left -= 1
+                if what.errno != GONE or left < 1: raise
+                seq, i = listing(q), 0
+                continue
+            finally:
+                if guard is not None: guard.unlock(read=True)
+            q, left = start + span, tries
+        else:
+            end = q + chunk
+            if i < len(seq): end = min(end, seq[i][0])
+            if stop is not None: end = min(end, stop)
+            if end > reach: # need more primes to sieve with
+                reach = 2 * end
+                sift = rootprimes(sqrt(reach * m - 1) + 1)
+            block = Flags(kind, q * m, pack(wheel(kind, q * m, end - q, sift)),
+                          end - q)
+            q = end
+        yield block
+del FlagOctet
+
+from Queue import Queue, Full
+from threading import Thread, Event
+def stream(path, kind, lo=0, hi=None, ahead=1, chunk=16, guard=None,
+           Pipe=Queue, Full=Full, Task=Thread, Flag=Event):
+    """Iterate the primes p with lo <= p < hi, in increasing order.
+
+    Required arguments, path and kind, and optional arguments lo, hi, chunk and
+    guard are as for blocks(), which this uses to walk the cache; each block is
+    decoded in one pass, by FlagOctet.primes(), rather than a prime at a time.
+    Optional argument ahead (default: 1) is the number of blocks to load and
+    decode in a background thread, ahead of the consumer, so that reading the
+    next file from disk overlaps with the consumer's use of the primes of the
+    present one; if ahead is 0, no thread is used.  Abandoning the iterator
+    stops the thread (at latest, once it has finished with its current
+    block); errors in the thread are raised by the iterator.\n"""
+
+    from sys import exc_info
+    def feed(at=lo):
+        for block in blocks(path, kind, lo, hi, chunk, guard):
+            yield block.primes(at, hi)
+            at = block.span.stop # skip any overlap with the next
+
+    if not ahead:
+        for row in feed():
+            for p in row: yield p
+        return
+
+    pipe, halt = Pipe(ahead), Flag()
+    def put(item):
+        while not halt.isSet():
+            try: pipe.put(item, True, .1)
+            except Full: pass
+            else: return True
+        return False
+
+    def fetch():
+        try:
+            for row in feed():
+                if not put((row, None)): return
+        except: put((None, exc_info()))
+        else: put((None, None))
+
+    task = Task(target=fetch, name='prime prefetch')
+    task.setDaemon(True)
+    task.start()
+    try:
+        while True:
+            row, err = pipe.get()
+            if row is None: break
+            for p in row: yield p
+        if err: raise err[0], err[1], err[2]
+    finally: halt.set()
+
+del Thread, Queue, Full, Event, re
 
 class oldCache (object):
     """Iterator over an old-style cache.
@@ -496,4 +1496,4 @@ class oldCache (object):
 
         raise StopIteration
 
-del os, Ordered
+del os, Ordered, Interval, _decode, EWOULDBLOCK
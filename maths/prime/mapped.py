@@ -0,0 +1,185 @@
+"""Binary, memory-mapped storage of octet blocks.
+
+The python-module format used by study.cache.whole obliges every load to parse
+the data as python source, which is a lot of work just to learn which naturals
+are prime.  This module provides an alternative: a file holding a small header
+followed by the raw data of a FlagOctet or FactorOctet, which load() maps into
+memory, so that the octet it returns reads its data straight out of the page
+cache, without copying.
+
+File layout (all integers little-endian):
+  header -- magic 'SPOB', format version, type ('P' for flags, 'F' for
+            factors), width in bytes of each factor entry (0 for flags), count
+            of primes in the octet type, number of blocks; then the start and
+            length of the range of prime indices the data span, each -1 if
+            unknown.
+  primes -- the primes defining the octet type, four bytes each.
+  ranks -- only for flags (and only since version 2): padded to start at a
+           multiple of eight bytes, one more eight-byte count than there are
+           blocks, the number of primes flagged before each block boundary
+           (see study.maths.prime.octet.ranks), so that FlagOctet.rank() and
+           .select() need only look at one block's bytes.
+  data -- padded to start at a multiple of eight bytes; flags are stored as
+          FlagOctet holds them, factors as unsigned integers of the given
+          width, with 0 in place of None (for a prime).
+
+The version is checked on load; any future change to the layout must bump it.
+Version 1 files, lacking ranks, can still be read.
+See also study.maths.prime.cache, which uses this format for files whose names
+end in '.bin', and its convert() for turning a cache's python-format files into
+this format.
+
+See study.LICENSE for copyright and license information.
+"""
+
+import struct, os
+MAGIC, VERSION = 'SPOB', 2
+_header = struct.Struct('<4sBcBxIQqq')
+
+class Words (object):
+    """Read-only sequence view of an array of integers in a mapped file.
+
+    Each entry is decoded from the underlying buffer when asked for, so that
+    nothing is copied up front.  Entries that are 0 read as blank, which is
+    None by default, as for factor entries of primes.\n"""
+
+    def __init__(self, buf, offset, count, width, blank=None,
+                 Item=struct.Struct):
+        self.__buf, self.__off, self.__len = buf, offset, count
+        self.__item = Item({ 4: '<I', 8: '<Q' }[width])
+        self.__blank = blank
+
+    def __len__(self): return self.__len
+    def __getitem__(self, ind):
+        if isinstance(ind, slice):
+            return map(self.__getitem__, range(*ind.indices(self.__len)))
+        if ind < 0: ind += self.__len
+        if not 0 <= ind < self.__len:
+            raise IndexError('Factor index out of range', ind, self.__len)
+
+        f = self.__item.unpack_from(self.__buf,
+                                    self.__off + ind * self.__item.size)[0]
+        if f: return f
+        return self.__blank
+
+    def __iter__(self):
+        for i in xrange(self.__len): yield self[i]
+
+def _aligned(n): return (n + 7) & ~7
+
+def save(path, kind, data, factors=False, indices=None,
+         head=_header, pack=struct.pack, sync=os.fsync):
+    """Write octet data to a file.
+
+    Required arguments:
+      path -- name of the file to write
+      kind -- the OctetType describing data's layout
+      data -- a string of flags, as FlagOctet holds them; or, if factors is
+              true, a sequence of least proper factors (None for primes), as
+              FactorOctet holds them.
+
+    Optional arguments:
+      factors -- true if data is factor data (default: False)
+      indices -- None (default) or an Interval giving the range of prime
+                 indices data span.
+
+    The file is flushed to disk before returning; returns the number of bytes
+    written.\n"""
+    from octet import ranks
+
+    if factors:
+        size, code = len(kind), 'F'
+        top = max([0] + filter(None, data))
+        if top >> 32: width, fmt = 8, 'Q'
+        else: width, fmt = 4, 'I'
+    else: size, code, width = kind.size, 'P', 0
+    count, r = divmod(len(data), size)
+    assert r == 0, 'Data must fill a whole number of blocks'
+
+    if indices is None: lo = hi = -1
+    else: lo, hi = indices.start, len(indices)
+
+    ps = kind.primes
+    text = (head.pack(MAGIC, VERSION, code, width, len(ps), count, lo, hi) +
+            pack('<%dI' % len(ps), *ps))
+    text += '\0' * (_aligned(len(text)) - len(text))
+    if not factors:
+        text += pack('<%dQ' % (count + 1), *ranks(data, size))
+
+    fd = open(path, 'wb')
+    try:
+        fd.write(text)
+        if factors:
+            fd.write(pack('<%d%s' % (len(data), fmt),
+                          *[f or 0 for f in data]))
+        else: fd.write(data)
+        fd.flush()
+        sync(fd.fileno())
+        return fd.tell()
+    finally: fd.close()
+
+def read(path, head=_header, unpack=struct.unpack_from):
+    """Map a file, written by save(), into memory.
+
+    Single argument, path, is the name of the file to read.  Returns a tuple
+    (kind, factors, data, indices, ranks) in which: kind is the OctetType of
+    the data; factors is true if data is factor data; data is a buffer (for
+    flags) or a Words view (for factors) reading directly from the mapped
+    file; indices is None or a (start, length) twople, the range of prime
+    indices spanned; and ranks is None (for factors, or for a version 1 file)
+    or a Words view of the cumulative prime counts at block boundaries.
+    Raises ValueError if the file is not in this format or is of a version
+    this code does not know how to read.\n"""
+
+    import mmap
+    from octet import OctetType
+
+    fd = open(path, 'rb')
+    try: buf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    finally: fd.close() # the map remains valid
+
+    if len(buf) < head.size:
+        raise ValueError('Too short to be a binary octet file', path)
+    magic, version, code, width, n, count, lo, hi = head.unpack_from(buf)
+    if magic != MAGIC: raise ValueError('Not a binary octet file', path)
+    if not 0 < version <= VERSION:
+        raise ValueError('Unsupported binary octet file version', path, version)
+
+    kind = OctetType(unpack('<%dI' % n, buf, head.size))
+    off, ranks = _aligned(head.size + 4 * n), None
+    if code == 'F':
+        size = count * len(kind)
+        if off + size * width > len(buf):
+            raise ValueError('Truncated binary octet file', path)
+        data = Words(buf, off, size, width)
+    elif code == 'P':
+        if version > 1:
+            ranks = Words(buf, off, count + 1, 8, 0)
+            off += 8 * (count + 1)
+        size = count * kind.size
+        if off + size > len(buf):
+            raise ValueError('Truncated binary octet file', path)
+        data = buffer(buf, off, size)
+    else: raise ValueError('Unknown binary octet file type', path, code)
+
+    if lo < 0: return kind, code == 'F', data, None, ranks
+    return kind, code == 'F', data, (lo, hi), ranks
+
+def load(path, base):
+    """Load a file, written by save(), as an octet.
+
+    Required arguments:
+      path -- name of the file to read
+      base -- the natural at which its data start
+
+    Returns a twople (octet, indices) in which octet is a FlagOctet or
+    FactorOctet whose data are read directly from the mapped file and indices
+    is as for read(), q.v.\n"""
+
+    from octet import FlagOctet, FactorOctet
+    kind, factors, data, indices, ranks = read(path)
+    if factors:
+        return FactorOctet(kind, base, data, len(data) // len(kind)), indices
+    return FlagOctet(kind, base, data, len(data) // kind.size, ranks), indices
+
+del _header, struct, os
@@ -11,13 +11,22 @@ class Master (object):
     def realabs(name, real=os.path.realpath, abspath=os.path.abspath):
         return real(abspath(name))
 
-    def writedir(name,
+    def octype(memsize, primes=(2, 3, 5, 7, 11, 13, 17, 19, 23), word=32):
+        # Primes of the largest OctetType whose tuple of candidates (of about
+        # word bytes per entry) fits in memsize; the primes to 17 for 16 MB.
+        n, size = 3, 8 # 2, 3 and 5 leave eight candidates
+        while n < len(primes) and size * (primes[n] - 1) * word <= memsize:
+            size *= primes[n] - 1
+            n += 1
+        return primes[:n]
+
+    def writedir(name, primes,
                  exist=os.path.exists, makedirs=os.makedirs,
                  real=realabs, WriteRoot=cache.WriteRoot):
         name = real(name)
         if not exist(name): makedirs(name) # may raise OSError
 
-        root = WriteRoot(name)
+        root = WriteRoot(name, primes) # primes only used if cache is new
         if root.lock(write=True):
             try: 
                 if not root.lock(read=True):
@@ -48,18 +57,19 @@ class Master (object):
             if name in seen: continue
             elif name == write: write = None
             seen.append(name)
-            try: out.append(readroot(name))
+            try: out.append(readroot(name, kind))
             except (IOError, OSError, AttributeError,): pass
 
         if write is not None:
             # default position for non-writable write-root is as first read-root:
-            try: out.insert(0, readroot(write))
+            try: out.insert(0, readroot(write, kind))
             except (IOError, OSError, AttributeError,): pass
 
         return tuple(out)
 
     del readroot, realabs
     from study.snake.sequence import Ordered
+    from study.cache.lru import LRU
     def __init__(self,
                  pwrite=None,
                  fwrite=None,
@@ -71,10 +81,11 @@ class Master (object):
                  env=os.environ,
                  study=None,
                  home=os.curdir,
+                 keep=0x4000000, # 64 MB
                  # Tunnels:
                  join=os.path.join, OSError=os.error,
-                 writedir=writedir, readpath=readpath,
-                 List=Ordered):
+                 octype=octype, writedir=writedir, readpath=readpath,
+                 List=Ordered, LRU=LRU):
         """Initialize master object.
 
         All arguments are optional:
@@ -103,6 +114,10 @@ class Master (object):
                  used in defaults for pwrite and fwrite.
           home: parent directory in which to look for study if env['HOME'] is
                 unset (default: os.curdir, at the time this module was loaded).
+          keep: budget, in bytes, for the data (loaded file contents and
+                directory listings) that all this object's cache directories,
+                between them, retain in memory once used (default: 64 MB); see
+                .lru.
 
         Notes:
 
@@ -112,7 +127,7 @@ class Master (object):
           * Use of key-word calling is encouraged (if only so as to ensure that
             you notice any change to the API, by provoking an error until you
             change your calls); in any case, passing more positional arguments
-            than the ten described above may lead to surprises and brokenness.
+            than the eleven described above may lead to surprises and brokenness.
           * memsize only affects decisions made by this master prime object (and
             its servants): objects needed in order to interact with existing
             caches shall be created even if they violate the memsize constraint
@@ -154,20 +169,37 @@ class Master (object):
 
         if pwrite is None: pwrite = env.get('STUDY_PRIME_DIR', None)
         if not pwrite: pwrite = join(study, 'prime')
-        try: self.__prime_root = writedir(pwrite)
+        primes = octype(memsize) # octet type for new caches
+        try: self.__prime_root = writedir(pwrite, primes)
         except (OSError, IOError): pass
         else: seen.append(pwrite)
 
         if fwrite is None: fwrite = env.get('STUDY_FACTOR_DIR', None)
         if not fwrite: fwrite = join(study, 'factor')
-        try: self.__factor_root = writedir(fwrite)
+        try: self.__factor_root = writedir(fwrite, primes)
         except (OSError, IOError): pass
         else: seen.append(fwrite)
 
-        self.__prime_path = readpath(pread + fread, pwrite, seen, 'prime')
-        self.__factor_path = readpath(fread + pread, fwrite, seen, 'factor')
+        self.__prime_path = readpath(pread + fread, pwrite, seen, 'primes')
+        self.__factor_path = readpath(fread + pread, fwrite, seen, 'factors')
+
+        self.__lru = LRU(keep)
+        roots = self.__prime_path + self.__factor_path
+        try: roots += (self.__prime_root,)
+        except AttributeError: pass
+        try: roots += (self.__factor_root,)
+        except AttributeError: pass
+        for root in roots: root.lru = self.__lru
 
-    del writedir, readpath, Ordered
+    del octype, writedir, readpath, Ordered, LRU
+
+    @property
+    def lru(self):
+        """The study.cache.lru.LRU shared by all this object's cache roots.
+
+        Its budget can be adjusted and its .stats() reports its hits, misses
+        and evictions.\n"""
+        return self.__lru
 
     def __del__(self):
         try: self.__prime_root.unlock(read=True)
@@ -175,6 +207,149 @@ class Master (object):
         try: self.__factor_root.unlock(read=True)
         except AttributeError: pass
 
-    # TODO: write methods that put all those directory tree objects to use
+    def __primes(self):
+        try: yield self.__prime_root
+        except AttributeError: pass
+        for root in self.__prime_path: yield root
+
+    def count(self, value):
+        """Number of primes less than value.
+
+        Asks each prime cache in turn, the writable one first, and returns the
+        first answer (see study.maths.prime.cache.CacheRoot.count); raises
+        LookupError if none has the data needed.  Each cache's loaded files
+        are retained in .lru, so repeat look-ups near one another are cheap.\n"""
+        for root in self.__primes():
+            try: return root.count(value)
+            except (LookupError, IOError): pass
+        raise LookupError('No prime data cached for', value)
+
+    def prime(self, index):
+        """The prime with a given index, i.e. primes[index].
+
+        Asks each prime cache in turn, as for .count(); raises LookupError if
+        none has the data needed.\n"""
+        for root in self.__primes():
+            try: return root.prime(index)
+            except (LookupError, IOError): pass
+        raise LookupError('No prime data cached for index', index)
+
+    # TODO: write more methods that put all those directory tree objects to use
+
+    from study.maths.prime.sieve import parallel
+    def sieve(self, stop, start=None, factors=False, count=1, processes=None,
+              fill=parallel):
+        """Extend a writable cache by sieving in parallel.
+
+        Required argument, stop, is the natural up to which to sieve; it is
+        rounded up to a multiple of the cache's octet modulus.  Optional
+        arguments:
+          start -- natural at which to start (rounded down likewise); default,
+                   None, means the end of the data already in the cache
+          factors -- true to fill the factor cache, false (default) for the
+                     prime cache
+          count -- number of octet blocks per cache file (default: 1)
+          processes -- number of worker processes; default, None, lets
+                       multiprocessing chose (one per CPU).
+
+        Disjoint segments are sieved by a pool of worker processes (see
+        study.maths.prime.sieve.parallel) and saved, in order, as they arrive,
+        each in a new file (see study.maths.prime.cache.WriteRoot.store).
+        Raises AttributeError if this Master has no writable cache of the
+        requested kind.  For example, starting from an empty cache:
+
+        >>> import os
+        >>> from tempfile import mkdtemp
+        >>> from study.maths.prime.cache import CacheRoot
+        >>> top = mkdtemp()
+        >>> m = Master(pwrite=top + '/p', fwrite=top + '/f', memsize=1 << 20)
+        >>> m.sieve(10000, count=2, processes=1)
+        >>> p = CacheRoot(top + '/p')
+        >>> list(p.stream(0, 30))
+        [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+        >>> p.count(10000), p.prime(1228), p.prime(0), p.count(7)
+        (1229, 9973, 2, 3)
+        >>> m.sieve(80000, processes=1) # carries on where that left off
+        >>> sorted(n for n in os.listdir(top + '/p') if n[0] != '.')
+        ['0P1.bin', '1P1.bin', '2P1.bin', '__init__.py']
+        >>> len(p.primes), p.primes[1].name, p.primes[1].span
+        (3, '1P1.bin', Interval(1, 1))
+        >>> list(p.stream(79950, 80000))
+        [79967, 79973, 79979, 79987, 79997, 79999]
+        >>> p.count(50000), p.prime(7836)
+        (5133, 79999)
+        >>> m.count(50000), m.prime(5133), m.prime(5134)
+        (5133, 50021, 50023)
+        >>> m.lru.stats()['hits'] > 0
+        True
+        >>> m.sieve(30030 * 40, processes=1) # too many files for one directory
+        >>> sorted(n for n in os.listdir(top + '/p') if n[0] != '.')
+        ['0Pc', '__init__.py', 'cPc', 'oPg']
+        >>> p.count(30030 * 39), p.prime(93000), p.count(30030 * 40)
+        (90852, 1200959, 93021)
+        >>> from shutil import rmtree
+        >>> rmtree(top)
+        \n"""
+
+        if factors: root = self.__factor_root
+        else: root = self.__prime_root
+        mod = root.octet.modulus
+        if start is None: start = root.span.stop or 0
+        else: start //= mod
+        top, r = divmod(stop, mod)
+        if r: top += 1
+
+        for base, data in fill(root.octet, start, top, None, count,
+                               factors, processes):
+            root.store(base, data, factors)
+
+    del parallel
+
+    def compact(self, factors=False, background=False, pause=1.,
+                Compactor=cache.Compactor):
+        """Merge small adjacent files of a writable cache.
+
+        Merges abutting files while the result is no bigger than this object's
+        disksize (see study.maths.prime.cache.compact).  Optional arguments:
+          factors -- true to compact the factor cache, false (default) for the
+                     prime cache
+          background -- false (default) to do all available merges now and
+                        return how many were done; true to start, and return,
+                        a Compactor thread doing them one at a time, while
+                        readers carry on, until its .stop() is called
+          pause -- seconds a background Compactor waits, when it finds nothing
+                   to merge, before looking again (default: 1).
+
+        Raises AttributeError if this Master has no writable cache of the
+        requested kind.\n"""
+        if factors: root = self.__factor_root
+        else: root = self.__prime_root
+        if not background: return root.compact(self.__disk)
+
+        work = Compactor(root, self.__disk, pause)
+        work.start()
+        return work
 
+def readers(env=os.environ, pathsep=os.pathsep, home=os.curdir,
+            join=os.path.join, exists=os.path.exists,
+            CacheRoot=cache.CacheRoot):
+    """The prime caches a Master would read, without setting one up.
+
+    Optional arguments env, pathsep and home are as for Master (q.v.); the
+    caches are those named by $STUDY_PRIME_DIR (else the 'prime' sub-directory
+    of '.study' in $HOME) and by $STUDY_PRIME_PATH, that exist (i.e. have an
+    __init__.py).  Returns a tuple of CacheRoot objects, in that order.
+    Unlike a Master, this neither creates nor locks any directory, so is
+    suitable for modules that merely want to consult any cache there may be;
+    see study.maths.primes.\n"""
+    names = [env.get('STUDY_PRIME_DIR') or
+             join(env.get('HOME', home), '.study', 'prime')]
+    names += env.get('STUDY_PRIME_PATH', '').split(pathsep)
+    seen, ans = [], []
+    for name in names:
+        if name and name not in seen and exists(join(name, '__init__.py')):
+            seen.append(name)
+            ans.append(CacheRoot(name))
+    return tuple(ans)
+
 del os, cache
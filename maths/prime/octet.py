@@ -271,6 +271,35 @@ def OctetType(ps, cache={}, cls=OctetType):
     return ans
 
 from study.snake import regular
+from bisect import bisect_left, bisect_right
+from string import maketrans
+# Maps each byte to the byte whose value is the number of bits set in it:
+popcount = maketrans(''.join(map(chr, range(256))),
+                     ''.join([chr(sum([i >> b & 1 for b in range(8)]))
+                              for i in range(256)]))
+# Maps each byte to eight bytes, '\1' for each bit set in it, low bit first:
+unpacked = dict([(chr(i), ''.join([chr(i >> b & 1) for b in range(8)]))
+                 for i in range(256)])
+del maketrans
+try: from itertools import compress
+except ImportError: # python < 2.7
+    def compress(data, selectors):
+        return [d for d, s in zip(data, selectors) if s]
+
+def ranks(data, size, pop=popcount):
+    """Cumulative counts of primes at block boundaries of flag data.
+
+    Required arguments:
+      data -- a string of flags, as FlagOctet holds them
+      size -- the number of bytes per block, i.e. the .size of their OctetType
+
+    Returns a list, one longer than the number of blocks, whose [i] entry is
+    the number of bits set in data[:i*size].\n"""
+    counts, ans, tot = bytearray(str(data).translate(pop)), [0], 0
+    for i in xrange(0, len(counts), size):
+        tot += sum(counts[i:i+size])
+        ans.append(tot)
+    return ans
 
 class Octet (object):
     """Base class for octet-structured mappings from a range of naturals.
@@ -362,27 +391,126 @@ class FlagOctet (Octet):
     """A mapping from a range of naturals to True if prime, else False.
     """
     __upinit = Octet.__init__
-    def __init__(self, kind, base, data='', count=None):
+    def __init__(self, kind, base, data='', count=None, ranks=None):
         """Set up a multi-byte flag octet.
 
         For arguments, see Octet.__init__, with the optional data being here a
         string encoding (an initial portion of) the data for the blocks
         described (default: empty); it'll be padded to the required length with
-        '\0' bytes.  Caller (typically a derived class) is responsible for
+        '\xff' bytes.  Caller (typically a derived class) is responsible for
         keeping track which parts of the result are padding and which are real
-        data.\n"""
+        data.  When no padding is needed, data is used as given, so may be any
+        read-only sequence of bytes, e.g. a buffer on a memory-mapped file.
+
+        Further optional argument, ranks, is None (default) or a sequence as
+        returned by ranks(data, kind.size), typically read from disk with data;
+        if None, it is computed when first needed by rank() or select().\n"""
 
-        self.__upinit(kind, base, count, len(data) * 8)
-        self.__flags = data + '\xff' * (self._count * kind.size - len(data))
+        self.__upinit(kind, base, len(data) * 8, count)
+        pad = self._count * kind.size - len(data)
+        if pad: data += '\xff' * pad
+        self.__flags, self.__ranks = data, ranks
 
     def prime(self, i): return self[i]
     def __getitem__(self, key):
         try:
             byte, bit = self.__find(key)
             if ord(self.__flags[byte]) >> bit & 1: return True
-        except ValueError: pass
+        except ValueError:
+            if self.span.start == 0 and key in self.kind.primes: return True
         return False
 
+    def __cumulate(self, count=ranks):
+        if self.__ranks is None:
+            self.__ranks = count(self.__flags, self.kind.size)
+        return self.__ranks
+
+    def rank(self, stop, pop=popcount):
+        """Number of primes in self less than stop.
+
+        Single argument, stop, is a natural; the primes of self.kind count when
+        self.span starts at 0.  Only needs to look at the bytes of one block,
+        using the cumulative counts at block boundaries for the rest.\n"""
+        z, t = self.span.start, self.kind
+        if stop > self.span.stop: stop = self.span.stop
+        if stop <= z: return 0
+
+        if z: n = 0
+        else: n = len([p for p in t.primes if p < stop])
+        q, r = divmod(stop - z, t.modulus)
+        n += self.__cumulate()[q]
+        if r:
+            try: i = t.index(r)
+            except ValueError, what: i = what.args[0]
+            byte, bit = divmod(i, 8)
+            f, off = self.__flags, q * t.size
+            if byte: n += sum(bytearray(str(f[off:off+byte]).translate(pop)))
+            if bit: n += ord(pop[ord(f[off+byte]) & ((1 << bit) - 1)])
+        return n
+
+    def select(self, n, pop=popcount, cut=bisect_right):
+        """The prime in self preceded, in self, by exactly n primes.
+
+        Single argument, n, is a natural; raises IndexError if self has no more
+        than n primes.  The inverse of rank(), in so far as self.rank(p) is n
+        when p is self.select(n).\n"""
+        t, z = self.kind, self.span.start
+        if not z:
+            if n < len(t.primes): return t.primes[n]
+            n -= len(t.primes)
+
+        rs = self.__cumulate()
+        if not 0 <= n < rs[-1]:
+            raise IndexError('Not that many primes in octet', n, rs[-1])
+        q = cut(rs, n) - 1
+        n -= rs[q]
+        f, off = self.__flags, q * t.size
+        for byte in xrange(t.size):
+            b = ord(f[off + byte])
+            c = ord(pop[b])
+            if n < c: break
+            n -= c
+        else: assert False, 'Cumulative prime counts inconsistent with data'
+
+        bit = 0
+        while n or not b & 1:
+            n -= b & 1
+            b, bit = b >> 1, bit + 1
+        return z + q * t.modulus + t[8 * byte + bit]
+
+    def primes(self, lo=None, hi=None, bits=unpacked, pick=compress,
+               cut=bisect_left):
+        """List, in increasing order, of the primes in self.
+
+        Optional arguments, lo and hi, are None (default) or naturals; the
+        result is then limited to primes p with lo <= p < hi.  The primes of
+        self.kind are included when self.span starts at 0.  The flags of all
+        the blocks needed are expanded to one byte per candidate in a single
+        pass, after which each block's primes are picked out of kind's
+        candidates by itertools.compress, so that no python code runs per
+        candidate; this is much faster than iterating self.\n"""
+        z, t = self.span.start, self.kind
+        if lo is None or lo < z: lo = z
+        if hi is None or hi > self.span.stop: hi = self.span.stop
+        if lo >= hi: return []
+
+        m, n = t.modulus, len(t)
+        q, end = (lo - z) // m, (hi - z + m - 1) // m
+        flags = bytearray(''.join(map(bits.__getitem__,
+                                      str(self.__flags[q * t.size:
+                                                       end * t.size]))))
+        if z: ans = []
+        else: ans = list(t.primes)
+        row, off = tuple(t), 0
+        for base in xrange(z + q * m, z + end * m, m):
+            ans.extend(map(base.__add__, pick(row, flags[off:off+n])))
+            off += n
+
+        # Only the first and last blocks may stray outside [lo, hi):
+        del ans[cut(ans, hi):]
+        del ans[:cut(ans, lo)]
+        return ans
+
     # Only really of any use for importing data from some alien source
     def __setitem__(self, key, flag):
         try: byte, bit = self.__find(key)
@@ -460,10 +588,15 @@ class FactorOctet (Octet):
         sequence containing (an initial portion of) the data for the blocks
         described (default: empty); it'll be padded with None to the required
         length.  Caller (typically a derived class) is responsible for keeping
-        track of which parts are padding and which are real data.\n"""
+        track of which parts are padding and which are real data.  When no
+        padding is needed, a data sequence other than a tuple is used as given,
+        so may be a read-only view, e.g. of a memory-mapped file.\n"""
 
-        self.__upinit(kind, base, count, len(data))
-        self.__factors = list(data) + [ None ] * (self._count * kind.size * 8 - len(data))
+        self.__upinit(kind, base, len(data), count)
+        pad = self._count * kind.size * 8 - len(data)
+        if pad or isinstance(data, tuple):
+            data = list(data) + [ None ] * pad
+        self.__factors = data
 
     def prime(self, i): return self[i] is None
     def __getitem__(self, key):
@@ -471,7 +604,7 @@ class FactorOctet (Octet):
         # don't bother to catch KeyError or TypeError
         except ValueError: # from self.kind.index
             if self.span.start == 0:
-                if key in self.kind.octet.primes: return None
+                if key in self.kind.primes: return None
             return self.kind.factor(key % self.kind.modulus)
         return self.__factors[ind]
 
@@ -508,7 +641,7 @@ class FactorOctet (Octet):
             raise KeyError("Out of range", key, self.span)
 
         q, r = divmod(key - self.span.start, self.kind.modulus)
-        return q * self.kind.size + self.kind.index(r)
+        return q * len(self.kind) + self.kind.index(r)
 
     def flag(self, seq=regular.Slice):
         """Re-express self's data in a FlagOctet.
@@ -553,7 +686,7 @@ class FactorSieve (FactorOctet, Sieve):
         if self.valid(ind) or val is not None: return val
         raise LookupError('Too early to be sure', ind)
 
-del regular
+del regular, bisect_left, bisect_right, compress
 
 class Chunker (object):
     """Iterator converting prime iterator into block iterator.
@@ -24,6 +24,17 @@ the case of 1, since it has no other factor than itself, so it's probably
 simpler just to arbitrarily declare 0 and 1 special, rather than redefining
 'proper factor' !
 
+The sieve() below records one python object per natural, which is fine for
+modest ranges but hopeless for the millions of naturals in each cache file.  So
+this module also provides a segmented sieve, segments(), that works on the
+compressed representation of study.maths.prime.octet: it sieves each segment in
+a bytearray holding one byte per natural coprime to 30 (the primitive octet
+type), marking multiples of each prime by slice-assignment (so the marking loop
+runs in C, not in python) and then reduces the result to the candidates of the
+caller's OctetType.  The results are exactly the data FlagOctet and FactorOctet
+expect, so each segment's memory use is bounded by its size, independent of how
+far out along the naturals it lies.
+
 See study.LICENSE for copyright and license information.
 """
 
@@ -105,3 +116,223 @@ def nondices(seq, base=0):
     ans = filter(lambda i, s=seq: s[i] is None, range(len(seq)))
     if b: ans = map(lambda i, b=base: i+b, ans)
     return tuple(ans)
+
+from study.maths.prime.octet import coprimes
+from array import array
+
+def rootprimes(stop):
+    """All the primes less than stop, as a tuple.
+
+    Uses a plain bytearray Sieve of Eratosthenes over range(stop); this is
+    intended for obtaining the (comparatively few) primes up to the square root
+    of the end of a range to be sieved by segments(), when no better source of
+    them is to hand.\n"""
+    if stop < 3: return ()
+    flag = bytearray('\1') * stop
+    flag[:2] = '\0\0'
+    n = 2
+    while n * n < stop:
+        if flag[n]: flag[n*n::n] = '\0' * (1 + (stop - 1 - n*n) // n)
+        n += 1
+    return tuple(i for i, f in enumerate(flag) if f)
+
+def wheel(kind, base, count, primes, factors=False,
+          row=coprimes((2, 3, 5))[1], Array=array):
+    """Sieve a range of the naturals in the compressed form of an octet type.
+
+    Required arguments:
+      kind -- an OctetType (see study.maths.prime.octet)
+      base -- a multiple of kind.modulus, the start of the range to sieve
+      count -- the number of blocks, each of kind.modulus naturals, to sieve
+      primes -- an iterable yielding, in increasing order, every prime whose
+                square is less than base + count * kind.modulus; it may go on to
+                yield more (they shall be ignored) and may include the primes
+                of kind.primes (likewise ignored).
+
+    Optional argument:
+      factors -- false (the default) to find which candidates are primes; true
+                 to find their least proper factors.
+
+    Returns a sequence with count * len(kind) entries; its [i] entry describes
+    the natural base + (i // len(kind)) * kind.modulus + kind[i % len(kind)].
+    When factors is false, the sequence is a string whose entries are '\\1' for
+    primes and '\\0' for non-primes; pack() turns this into the data for a
+    FlagOctet.  Otherwise, it is a list whose entries are None for primes and
+    the least proper factor for non-primes, as FactorOctet expects; as ever, 1
+    is treated as its own least proper factor.
+
+    The actual sieving is done with one byte (or, for factors, one array entry)
+    per natural coprime to 30, regardless of kind; each prime p marks its
+    multiples by eight slice-assignments, one per residue modulo 30, with stride
+    8 * p.  Multiples of kind's primes beyond 5 are marked specially and dropped
+    at the end, leaving just kind's candidates.  For factors, primes are marked
+    in decreasing order, so that the last (hence surviving) mark on each entry
+    is its least proper factor.\n"""
+
+    assert base % kind.modulus == 0
+    stop = base + count * kind.modulus
+    size, inv = (stop - base) // 30 * 8, 8 - 1 # phi(30) == 8
+    skip = kind.primes[3:]
+    sift = []
+    for p in primes:
+        if p * p >= stop: break
+        if p > 5 and p not in skip: sift.append(p)
+
+    # Each entry in marks is (p, lo, v): mark multiples of p, from lo, with v.
+    if factors:
+        slab = Array('L', [0]) * size
+        marks = [ (p, p * p, Array('L', [p])) for p in sift ]
+        marks += [ (p, p, Array('L', [p])) for p in skip ]
+        marks.sort(reverse=True)
+    else:
+        slab = bytearray('\1') * size
+        marks = [ (p, p * p, '\0') for p in sift ]
+        marks += [ (p, p, '\2') for p in skip ]
+    if base == 0: slab[0] = factors and 1 or 0 # 1 isn't prime
+
+    step = 8
+    for p, lo, v in marks:
+        q, r = divmod(max(lo, base), p)
+        if r: q += 1
+        step, c = 8 * p, pow(p, inv, 30)
+        for j, n in enumerate(row):
+            n = p * (q + (n * c - q) % 30) # least multiple >= lo, == n mod 30
+            i = (n - base) // 30 * 8 + j
+            if i < size: slab[i::step] = v * (1 + (size - 1 - i) // step)
+
+    if factors:
+        return [ f or None for f in slab if f not in skip ]
+    return str(slab).translate(None, '\2')
+
+del coprimes, array
+
+from string import maketrans
+from binascii import unhexlify
+
+def pack(flags, table=maketrans('\0\1', '01'), unhex=unhexlify):
+    """Pack primeness flags into the bytes of a FlagOctet.
+
+    Required argument, flags, is a string (or bytearray), as returned by wheel()
+    when computing flags, whose length is a multiple of 8.  Returns a string with
+    one byte for each eight entries in flags; bit b of byte k in this is set
+    precisely if flags[8 * k + b] is '\\1'.  The bit-twiddling is done by
+    reading the flags as the binary digits of a long integer, so that none of it
+    happens one bit at a time in python.\n"""
+
+    n = len(flags)
+    assert n % 8 == 0
+    if not n: return ''
+    # Bit 0 of each byte is least significant, so reverse each eight:
+    rev = bytearray(n)
+    for k in range(8): rev[k::8] = flags[7-k::8]
+    return unhex(('%x' % int(str(rev).translate(table), 2)).zfill(n // 4))
+
+del maketrans, unhexlify
+
+def segments(kind, start, stop, primes=None, count=1, factors=False):
+    """Iterate the segmented sieve over a range of the naturals.
+
+    Required arguments:
+      kind -- an OctetType
+      start -- start of the range to sieve, in units of kind.modulus
+      stop -- end of the range to sieve, in units of kind.modulus
+
+    Optional arguments:
+      primes -- a sequence of all the primes whose squares are less than stop *
+                kind.modulus, in increasing order; or None (default) to compute
+                these using rootprimes().
+      count -- number of blocks of kind.modulus naturals per segment (default:
+               1); memory use is proportional to this.
+      factors -- false (default) for prime data, else true for factor data;
+                 see wheel().
+
+    Yields (base, data) twoples, as octet.Chunker does, with base a natural and
+    data describing count (or, for the last segment, possibly fewer) blocks of
+    kind.modulus naturals, starting at base: FlagOctet(kind, base, data) or
+    FactorOctet(kind, base, data) can then turn each into a mapping.\n"""
+
+    if primes is None: primes = _sifters(kind, stop)
+    work = Segmenter(primes, kind, factors)
+    while start < stop:
+        n = min(count, stop - start)
+        yield work((start, n))
+        start += n
+
+def _sifters(kind, stop):
+    """The primes needed to sieve up to stop blocks of kind."""
+    from study.maths.natural import sqrt
+    return rootprimes(sqrt(stop * kind.modulus - 1) + 1)
+
+class Segmenter (object):
+    """Sieve one segment of the naturals per call.
+
+    This packages the parameters of segments(), so that an instance can be
+    handed to a pool of worker processes (see parallel()); all that each call
+    then needs to be told is which blocks to sieve.  Only the primes defining
+    the octet type are remembered, rather than the OctetType itself, so that
+    pickling an instance is cheap; each call gets the OctetType from
+    study.maths.prime.octet.OctetType(), which builds it the first time a
+    process asks for it and returns that same object thereafter.\n"""
+
+    def __init__(self, primes, kind, factors=False):
+        """Set up to sieve blocks of a given octet type.
+
+        Required arguments:
+          primes -- a sequence of the primes whose squares are less than the
+                    end of any range to be sieved, in increasing order
+          kind -- an OctetType
+
+        Optional argument, factors, is as for wheel().\n"""
+        self.__primes, self.__octet = tuple(primes), kind.primes
+        self.__factors = factors
+
+    def __call__(self, (start, count)):
+        """Sieve some blocks.
+
+        Single argument is a twople (start, count) asking for count blocks to
+        be sieved, starting with block start (i.e. at start * kind.modulus);
+        this packaging suits Pool.imap and its kin, which only pass one
+        argument.  Returns a (base, data) twople, as each yield of segments()
+        (q.v.).\n"""
+        from study.maths.prime.octet import OctetType
+        kind = OctetType(self.__octet)
+        base = start * kind.modulus
+        data = wheel(kind, base, count, self.__primes, self.__factors)
+        if self.__factors: return base, data
+        return base, pack(data)
+
+def parallel(kind, start, stop, primes=None, count=1, factors=False,
+             processes=None, ahead=None):
+    """Sieve disjoint segments of a range in a pool of worker processes.
+
+    Arguments are as for segments() (q.v.) save for two more optional
+    arguments: processes, the number of worker processes to use, defaults to
+    None, which lets multiprocessing.Pool use as many as the machine has CPUs;
+    ahead, the most segments to have in hand (being sieved, or sieved but not
+    yet yielded) at any time, defaults to None, meaning twice the number of
+    worker processes.  Yields the same sequence of (base, data) twoples as
+    segments(), in the same (ascending) order, regardless of the order in
+    which workers finish.
+
+    Each worker is given a disjoint run of count blocks of kind.modulus
+    naturals, with kind aligning them to its modulus, so results need no
+    merging beyond being delivered in order; the caller can thus pass each in
+    turn to FlagOctet or FactorOctet, or save it to a cache, as it arrives.
+    Workers only run ahead of the consumer by ahead segments, so a slow
+    consumer doesn't see results pile up in memory.\n"""
+
+    from multiprocessing import Pool, cpu_count
+    from collections import deque
+    if primes is None: primes = _sifters(kind, stop)
+    if ahead is None: ahead = 2 * (processes or cpu_count())
+    work = Segmenter(primes, kind, factors)
+    pool, busy = Pool(processes), deque()
+    try:
+        for s in xrange(start, stop, count):
+            busy.append(pool.apply_async(work, ((s, min(count, stop - s)),)))
+            if len(busy) >= ahead: yield busy.popleft().get()
+        while busy: yield busy.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
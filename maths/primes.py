@@ -15,6 +15,10 @@ multiplying back together again:
   factorise(numb) -- returns a Prodict, whose int() is numb: its keys are
   irreducible (so generally primes, but -1, at least, may also appear).
 
+  rho(n), ecm(n) -- find a proper factor of a non-prime, by Pollard's rho
+  method or the elliptic curve method; factorise() resorts to these, rather
+  than sieving, once it has exhausted the primes it knows.
+
 See also generic integer manipulators in natural.py (notably eachprime(), a
 cheap and cheerful iterator), combinatorial tools in permute.py and
 polynomials in polynomial.py: some day, it'd be fun to do some stuff with
@@ -176,6 +180,132 @@ class risingSet (list):
             # so insert val after bot, before top - ie, at position top
             self.__upins(top, val)
 
+from fractions import gcd
+from study.maths.natural import Euclid
+
+def rho(n, c=1, limit=1<<16, hcf=gcd):
+    """Pollard's rho method, with Brent's improvements, for finding a factor.
+
+    Required argument, n, is a natural to be factorised; it should not be
+    prime.  Optional arguments:
+      c -- constant in the pseudo-random map x -> x*x + c (default: 1)
+      limit -- bound on the number of iterations (default: 65536)
+
+    Returns a proper factor of n or None if none was found within limit
+    iterations.  The number of iterations needed is of order the square root of
+    n's least prime factor, so this is good for factors up to about ten digits;
+    beyond that, see ecm().  Calling again with a different c may succeed where
+    one c fails.\n"""
+
+    if not n & 1: return 2
+    y, r, q, g, m = 2, 1, 1, 1, 128
+    while g == 1:
+        x = y
+        for i in xrange(r): y = (y * y + c) % n
+        k = 0
+        while k < r and g == 1:
+            ys = y
+            for i in xrange(min(m, r - k)):
+                y = (y * y + c) % n
+                q = q * (x - y) % n
+            g, k = hcf(q, n), k + m
+        r <<= 1
+        if r > limit: return None
+
+    if g == n: # overshot: back-track one step at a time
+        g = 1
+        while g == 1:
+            ys = (ys * ys + c) % n
+            g = hcf(x - ys, n)
+    if g == n: return None
+    return abs(g)
+
+def ecm(n, B1=2000, curves=25, B2=None, seed=None, hcf=gcd, inverse=Euclid):
+    """Lenstra's elliptic curve method, for finding a factor.
+
+    Required argument, n, is a natural to be factorised; it should not be
+    prime, nor have any small prime factors.  Optional arguments:
+      B1 -- stage one bound (default: 2000)
+      curves -- number of curves to try (default: 25)
+      B2 -- stage two bound or (default) None to use 100 * B1
+      seed -- seed for the random choice of curves (default: None)
+
+    Returns a proper factor of n or None if none was found.  Uses Montgomery's
+    curves, with Suyama's parameterisation, in projective (X:Z) form so that
+    no modular inverses are needed.  Stage one multiplies a point by every
+    prime power up to B1; stage two looks for a single further prime factor,
+    up to B2, of the order of the point modulo a factor of n, using a
+    baby-step, giant-step pairing.  The defaults are apt for finding factors of
+    up to about fifteen digits; for larger factors, increase B1 (by a factor
+    of about five per extra five digits) and curves (about three-fold).\n"""
+
+    from random import Random
+    from study.maths.prime.sieve import rootprimes
+    if B2 is None: B2 = 100 * B1
+    rand, small, D = Random(seed), rootprimes(B1 + 1), 210
+
+    # Which q in range(B1, B2) are prime ?  Index by q - B1:
+    big = bytearray('\1') * (B2 - B1)
+    for p in rootprimes(int(B2 ** .5) + 1):
+        q = max(p * p, (B1 + p - 1) // p * p)
+        if q < B2: big[q - B1::p] = '\0' * (1 + (B2 - 1 - q) // p)
+
+    def double((X, Z), a24):
+        s, d = (X + Z) ** 2 % n, (X - Z) ** 2 % n
+        t = s - d
+        return s * d % n, t * (d + a24 * t) % n
+
+    def add((X, Z), (U, W), (x, z)): # needs difference (x:z)
+        u, v = (X - Z) * (U + W) % n, (X + Z) * (U - W) % n
+        return z * (u + v) ** 2 % n, x * (u - v) ** 2 % n
+
+    def times(k, P, a24):
+        R, S = P, double(P, a24)
+        for bit in bin(k)[3:]:
+            if bit == '1': R, S = add(S, R, P), double(S, a24)
+            else: R, S = double(R, a24), add(R, S, P)
+        return R
+
+    for i in xrange(curves):
+        sigma = rand.randrange(6, n - 1)
+        u, v = (sigma * sigma - 5) % n, 4 * sigma % n
+        P = u ** 3 % n, v ** 3 % n
+        num, den = (v - u) ** 3 * (3 * u + v) % n, 16 * u ** 3 * v % n
+        g = hcf(den, n)
+        if g == n: continue
+        if g > 1: return g
+        a24 = num * inverse(den, n)[0] % n
+
+        # Stage one:
+        for p in small:
+            q = p
+            while q * p <= B1: q *= p
+            P = times(q, P, a24)
+        g = hcf(P[1], n)
+        if 1 < g < n: return g
+        if g == n: continue
+
+        # Stage two: each prime q = k * D +/- j, with j < D / 2 odd, has q * P
+        # zero modulo a factor of n precisely if k * D * P and j * P have the
+        # same X / Z there; so accumulate the product of X * z - x * Z.
+        two = double(P, a24)
+        odd = [ P, add(P, two, P) ] # odd[i] is (2 * i + 1) * P
+        while len(odd) <= D // 4: odd.append(add(odd[-1], two, odd[-2]))
+        G = times(D, P, a24)
+        k = max(B1 // D, 2)
+        Gk, Gl, acc = times(k, G, a24), times(k - 1, G, a24), 1
+        while k * D - D // 2 < B2:
+            X, Z = Gk
+            for j in xrange(1, D // 2 + 1, 2):
+                if any(B1 <= q < B2 and big[q - B1] for q in (k * D - j, k * D + j)):
+                    x, z = odd[j // 2]
+                    acc = acc * (X * z - x * Z) % n
+            Gk, Gl, k = add(Gk, G, Gl), Gk, k + 1
+        g = hcf(acc, n)
+        if 1 < g < n: return g
+
+    return None
+
 class _Prime(lazyTuple):
     """List of all primes, generated as needed.
 
@@ -221,31 +351,21 @@ class _Prime(lazyTuple):
         """Returns a number about which self would like to be asked. """
         return self._ask
 
-    def __contains__(self, num):
-        # could sensibly check pow(i, num-1, num) == 1 for a few i in range(2, num)
-        seen = 0
-        while True:
-            if num in self._item_carrier[seen:] or num in self._sparse: return num
-            if num < self._ask: return None
-
-            for p in self._item_carrier[seen:]:
-                if num % p == 0: return None
-                # and p < _ask <= num
-                seen = len(self._item_carrier)
-
-            p = self._item_carrier[-1]
-            if long(p) * p > num: return self._know(num)
-
-            for p in self._sparse:
-                if num % p == 0: return None
-                if p > num: break
-
-            if not self.get_cache(): break
+    from study.maths.natural import isprime
+    def __contains__(self, num, test=isprime):
+        if num in self._sparse: return num
+        if num < self._ask:
+            if num in self._item_carrier: return num
+            return None
 
-        while True:
-            p = self.grow()
-            if num % p == 0: return None
-            if long(p) * p > num: return self._know(num)
+        # Rather than growing (and thus caching) our list all the way up to
+        # sqrt(num), use a strong probable-prime test; this is exact for num <
+        # test.sure, so we can remember such primes in _sparse; beyond that, we
+        # give the (very probably right) answer without recording it.
+        if not test(num): return None
+        if num < test.sure: return self._know(num)
+        return num
+    del isprime
 
     def grow(self):
         if self._ask < self[-1]:
@@ -388,28 +508,65 @@ class _Prime(lazyTuple):
                     if self.get_cache(): continue
                 break
 
-            # Conjecture: hunting outwards from approximately sqrt(num), rather
-            # than up from _ask, might be quicker.  Try hunting down from first
-            # power of 2 whose square exceeds num.
-
-            # Now go hunting for primes until the job is done:
-            while num > 1:
-                p = self.grow()
-                count, num = self.__reduce(num, p)
-                if count: result[p] = count
-                if num == 1: pass
-                elif long(p) * p > num:
-                    # num's a prime !
-                    self._know(num)
-                    result[num] = 1
-                    # job done ;^)
-                    num = 1
-                else:
-                    assert p > 1
+            # Whatever's left has no factors among the primes we know; rather
+            # than sieve up to its square root, split it by the methods of
+            # self.__split() (q.v.):
+            if num > 1: self.__split(num, result)
 
         # else: nothing to do
         return result
 
+    report = None # instrumentation hook; see __split().
+    from study.maths.natural import isprime
+    from time import time
+    def __split(self, num, result, test=isprime, clock=time,
+                effort=((2000, 25), (11000, 90), (50000, 300), (250000, 700))):
+        """Factorise a number with no known prime factors.
+
+        Required arguments, num and result, are a natural, none of whose
+        prime factors are in self.known(), and the mapping in which factorise()
+        (q.v.) is accumulating its answer.  Each factor found is first tested
+        for primality (see study.maths.natural.isprime); if it isn't prime, we
+        try to split it with rho(), then with ecm() at successively more
+        demanding effort levels; as a last resort, we grow our list of primes
+        until it yields a factor.
+
+        If self.report (None by default) is set, it is called after each stage
+        as self.report(stage, n, factor, seconds), naming the stage ('prime',
+        'rho', 'ecm' or 'sieve'), the number it worked on, the factor it found
+        (None if it didn't) and the time it took; this lets callers see where
+        factorise() spends its time.\n"""
+
+        def note(stage, n, f, start, hook=self.report):
+            if hook is not None: hook(stage, n, f, clock() - start)
+
+        todo = [ num ]
+        while todo:
+            n, start = todo.pop(), clock()
+            if test(n):
+                note('prime', n, n, start)
+                if n < test.sure: self._know(n)
+                result[n] = 1 + result.get(n, 0)
+                continue
+
+            f = rho(n)
+            note('rho', n, f, start)
+            for B1, curves in effort:
+                if f is not None: break
+                start = clock()
+                f = ecm(n, B1, curves)
+                note('ecm', n, f, start)
+
+            if f is None: # Heigh ho: fall back on brute force.
+                start = clock()
+                while n % self.grow(): pass
+                f = self[-1]
+                note('sieve', n, f, start)
+
+            todo += [ f, n // f ]
+
+    del isprime, time
+
     def __reduce(self, n, p):
         """Returns c, m with pow(p,c) * m == n and m coprime with p."""
         c = 0   # p's multiplicity as a factor of n
@@ -609,6 +766,64 @@ class cachePrimes(_Prime, Lazy):
     def _lazy_get__ask_(self, ig):
         return 1 + self._item_carrier[-1]
 
+    def _lazy_get__roots_(self, ig):
+        from study.maths.prime.master import readers
+        return readers()
+
+    __upget = _Prime.__getitem__
+    def __getitem__(self, key):
+        """self[key], consulting the prime caches if need be.
+
+        When key is past the primes self holds, each prime cache a Master
+        would read (see study.maths.prime.master.readers) is asked for
+        primes[key], which it finds by loading only the one file holding it
+        (see study.maths.prime.cache.CacheRoot.prime); only if none of them
+        has it does self grow to reach it.\n"""
+        if isinstance(key, (int, long)) and key >= len(self._item_carrier):
+            for root in self._roots:
+                try: return root.prime(key)
+                except (LookupError, IOError): pass
+        return self.__upget(key)
+    __call__ = __getitem__
+
+    def __iter__(self):
+        """Iterate the primes, in increasing order.
+
+        Runs through the primes self holds; then, if there is a prime cache
+        (see __getitem__), streams the rest from it, a file at a time, sieving
+        past its end (see study.maths.prime.cache.CacheRoot.stream), without
+        growing self.  Otherwise, self grows as needed.\n"""
+        i = lo = 0
+        for p in self._item_carrier: # may grow while we're at it
+            yield p
+            i, lo = i + 1, p + 1
+
+        if self._roots:
+            for p in self._roots[0].stream(lo): yield p
+        else:
+            while True:
+                yield self[i]
+                i += 1
+
+    from itertools import islice
+    from sys import maxint
+    __upslice = _Prime.__getslice__
+    def __getslice__(self, i, j, cut=islice, end=maxint):
+        """self[i:j], consulting the prime caches if need be.
+
+        When j is past the primes self holds, self[len(self)] is found as for
+        __getitem__ and the rest of the slice streamed from the first prime
+        cache, as for __iter__.  As for lazyTuple, self[i:] only gives the
+        primes self already holds.\n"""
+        if j == end or j <= len(self._item_carrier) or not self._roots:
+            return self.__upslice(i, j)
+        if i < 0 or j < 0: raise IndexError
+
+        row = self._item_carrier[i:j]
+        at = max(i, len(self._item_carrier))
+        return row + list(cut(self._roots[0].stream(self[at], ahead=0), j - at))
+    del islice, maxint
+
     def _next_high(self):
         cut = min(self.__high_water >> 3, 1<<22)
         while self.__step < cut: self.__step *= 2
@@ -9,8 +9,12 @@ See the documentation of each for more.
 
 See study.LICENSE for copyright and license information.
 """
-from study.cache.property import lazyprop
+from study.cache.property import lazyprop, lazyattr
 from study.snake.sequence import Tuple
+
+# NumPy is optional; without it, Vector.array is always None.
+try: import numpy
+except ImportError: numpy = None
 
 class Vector (Tuple):
     """Tuple type supporting entry-by-entry arithmetic.
@@ -43,11 +47,13 @@ class Vector (Tuple):
 
     Pseudo-constructors:
       fromSeq(seq [, dim]) -- recursively traverse into seq's entries
+      fromArray(arr) -- from a numpy array, which the result remembers
       diagonal(seq) -- specify the diagonal entries of a square
 
     Lazy properties:
       rank -- depth of nesting of Vector; see above.
       dimension -- tuple of ranges of successive viable indices
+      array -- self's entries as a numpy array, or None; see below.
 
     Methods:
       symmetrise([ranks]) -- average over permutations of given ranks (or all)
@@ -61,7 +67,14 @@ class Vector (Tuple):
     Arithmetic operations allow the other operand to be vectors - for addition
     and subtraction, they should have the same .dimension - or sequences that
     are acceptable to the constructor.  Its indexing accepts a tuple, applying
-    each entry successively.\n"""
+    each entry successively.
+
+    When numpy is available and a tensor's entries are floats or complex (not,
+    for example, Rational or Quantity), its .array holds them all in one numpy
+    array; transpose(), tau(), permutrace(), dot() and rdot() then do their
+    work with numpy (via swapaxes, einsum and tensordot) and return a tensor
+    that remembers the array they computed, so that a chain of such operations
+    stays in numpy.  Other tensors are handled entry by entry, as ever.\n"""
 
     @classmethod
     def _vector_(cls, seq):
@@ -232,6 +245,29 @@ class Vector (Tuple):
 
         return cls._vector_(seq)
 
+    @classmethod
+    def fromArray(cls, arr):
+        """Construct a Vector (or Tensor) from a numpy array.
+
+        Single argument, arr, is a numpy array with at least one axis; the
+        result's .dimension is its shape and its entries are python numbers.
+        The result also remembers a read-only copy of arr as its .array (the
+        copy is skipped if arr is already read-only), so that operations on it
+        that use numpy needn't convert it back.  Use .array or numpy.array(vec)
+        to go the other way.\n"""
+        if arr.flags.writeable:
+            arr = arr.copy()
+            arr.setflags(write=False)
+        ans = cls.fromSeq(arr.tolist())
+        ans.array = arr
+        return ans
+
+    def __fromarray(self, arr):
+        """Wraps the result of a numpy operation; see fromArray()."""
+        if not arr.ndim: return arr.tolist() # a scalar
+        arr.setflags(write=False) # we made it; no need to copy it
+        return self.fromArray(arr)
+
     @staticmethod
     def __isnumeric(val):
         if isinstance(val, Vector): return False
@@ -471,6 +507,20 @@ class Vector (Tuple):
 
         return (len(self),)
 
+    @lazyattr
+    def array(self, np=numpy):
+        """Self's entries, as a read-only numpy array, or None.
+
+        This is None if numpy isn't available or some entries of self are
+        neither float nor complex (whole numbers are only accepted among
+        entries that are); see the class doc-string.\n"""
+        if np is None: return None
+        try: arr = np.array(self.__listify())
+        except (TypeError, ValueError): return None
+        if arr.dtype.kind not in 'fc' or arr.shape != self.dimension: return None
+        arr.setflags(write=False)
+        return arr
+
     @lazyprop
     def squaresum(self):
         """The sum of squares of self's components.
@@ -578,7 +628,7 @@ class Vector (Tuple):
         return self.__perm_average(self.dimension, ranks,
                                    lambda e, t=self.tau: t(e) * e.sign)
 
-    def transpose(self, n=1):
+    def transpose(self, n=1, swap=numpy and numpy.swapaxes):
         """Transpose a tensor; only applicable if self.rank > 1.
 
         Optional argument, n, defaults to 1; it must be a natural number less
@@ -588,10 +638,12 @@ class Vector (Tuple):
             raise ValueError("Should be a natural number", n)
         elif n >= self.rank:
             raise ValueError("Should be less than rank", n, self.rank)
+        elif n == 0: return self
+        elif self.array is not None:
+            return self.__fromarray(swap(self.array, 0, n))
         elif n == 1:
             return self._vector_(self[0].mapwith(
                     lambda *args: args, *self[1:]).map(self._vector_))
-        elif n == 0: return self
 
         return self._vector_(
             self.transpose().map(lambda v: v.transpose(n-1))).transpose()
@@ -700,9 +752,40 @@ class Vector (Tuple):
         other's first rank.
 
         Returns what's left of the product after all this tracing has been
-        applied.\n"""
+        applied; but, when other is a Vector, the product isn't actually
+        formed: when self and other both have an .array, numpy.tensordot()
+        does all of this in one step; otherwise, only the products that
+        contribute to the result are computed (see __plan()).\n"""
+        if isinstance(other, Vector): return self.__contract(other, out, n)
         return (self * other).permutrace((), *self.__derange(out, n, self.rank))
 
+    def __contract(self, other, out, n, dot=numpy and numpy.tensordot):
+        """Implements dot() and rdot() when other is a Vector."""
+        r, s = self.rank, other.rank
+        pairs = tuple(self.__derange(out, n, r))
+        if self.array is not None and other.array is not None:
+            return self.__fromarray(dot(self.array, other.array,
+                                        ([ j for j, i in pairs ],
+                                         [ i - r for j, i in pairs ])))
+
+        dims = self.dimension, other.dimension
+        if not all(0 <= j < r <= i < r + s and dims[0][j] == dims[1][i - r]
+                   for j, i in pairs): # let permutrace() complain:
+            return (self * other).permutrace((), *pairs)
+
+        used = set(reduce(lambda x, y: x + y, pairs, ()))
+        shape, bases, terms = self.__plan(
+            dims, tuple(k for k in range(r + s) if k not in used), pairs)
+        a, b, flat = self.__flatten(r), other.__flatten(s), []
+        for p, q in bases:
+            (u, v), rest = terms[0], terms[1:]
+            tot = a[p + u] * b[q + v]
+            for u, v in rest: tot += a[p + u] * b[q + v]
+            flat.append(tot)
+
+        if shape: return self.fromSeq(self.__nest(flat, shape))
+        return flat[0]
+
     @staticmethod
     def __derange(out, n, r):
         """Returns pairs of indices for contraction.
@@ -729,6 +812,12 @@ class Vector (Tuple):
         (or Tensor) for it to work; indeed, the implementation expects that it
         is not (so is mildly less efficient than other.dot(self) when other is
         a Vector or Tensor).\n"""
+        if isinstance(other, Vector): vec = other
+        else:
+            try: vec = self.fromSeq(other)
+            except (TypeError, ValueError): vec = None
+        if vec is not None: return vec.__contract(self, out, n)
+
         prod = other * self
         return prod.permutrace((), *self.__derange(out, n, prod.rank - self.rank))
 
@@ -859,54 +948,77 @@ class Vector (Tuple):
 
         return self.__trace_permute(shuffle, pairs)
 
-    # Implementation of __trace_permute:
+    # Implementation of __trace_permute and __contract:
     def __listify(self):
         if self.rank < 2: return list(self)
         return [ x.__listify() for x in self ]
 
-    @classmethod
-    def __ranger(cls, ms):
-        """Iterator over index tuples.
+    def __flatten(self, depth):
+        """List of self[s] for all index tuples s of length depth, in order."""
+        if depth < 1: return [ self ]
+        if depth < 2: return list(self)
+        return [ x for row in self for x in row.__flatten(depth - 1) ]
 
-        Single argument, ms, is an iterator over dimensions.  Yields every
-        tuple s, of the same length as ms, for which, for every 0 <= i <
-        len(ms), 0 <= s[i] < ms[i].\n"""
+    @staticmethod
+    def __nest(flat, shape):
+        """Inverse of __flatten, as nested lists, given dimensions."""
+        for d in reversed(shape[1:]):
+            flat = [ flat[i:i + d] for i in range(0, len(flat), d) ]
+        return flat
 
-        try: m = ms.next()
-        except StopIteration: yield ()
-        else:
-            for s in cls.__ranger(ms):
-                i = m
-                while i > 0:
-                    i -= 1
-                    yield (i,) + s
-
-    def __summands(self, tmpl, pairs):
-        try: i, j = pairs.next()
-        except StopIteration: yield tuple(tmpl)
-        else:
-            assert self.dimension[i] == self.dimension[j]
-            assert tmpl[i] is None is tmpl[j]
-            if i > j: i, j = j, i
-            for s in self.__summands(tmpl, pairs):
-                m = self.dimension[i]
-                while m > 0:
-                    m -= 1
-                    yield s[:i] + (m,) + s[i+1:j] + (m,) + s[j+1:]
-
-    def __total(self, tmpl, pairs):
-        es = self.__summands(tmpl, iter(pairs))
-        tot = self[es.next()]
-        for e in es: tot += self[e]
-        return tot
-
-    def setcell(grid, key, val): # tool function for __trace_permute
-        old = key.next()
-        for it in key: grid, old = grid[old], it
-        assert grid[old] is None
-        grid[old] = val
-
-    def __trace_permute(self, shuffle, pairs, store=setcell):
+    from study.cache.lru import LRU
+    @staticmethod
+    def __plan(dims, keep, pairs, plans=LRU(0x400000)): # 4 MB
+        """Plans a contraction of one or more tensors.
+
+        Required arguments:
+          dims -- tuple of the .dimension tuples of the tensors
+          keep -- tuple of ranks to keep, in the order the result has them
+          pairs -- tuple of pairs of ranks to trace out
+
+        Ranks are numbered as in the tensor product of the tensors, in the
+        given order.  Entries of each tensor are taken from its __flatten(),
+        to the depth given by its entry in dims, in which each rank has a
+        stride, so that an index tuple becomes an offset; the entry of the
+        result at each index is the sum, over all choices of the traced
+        indices, of the (product of the) entries at the resulting offsets.
+
+        Returns a triple (shape, bases, terms) in which shape is the result's
+        dimension, bases lists, in the result's order, a tuple of offsets,
+        one per tensor, for each entry of the result and terms lists tuples of
+        offsets, one per tensor, to add to these for each choice of traced
+        indices.  Recently used plans are remembered, within a budget on their
+        size (see study.cache.lru), so that repeatedly contracting tensors of
+        the same shapes in the same way only plans once.\n"""
+        key = dims, keep, pairs
+        try: return plans.get(key)
+        except KeyError: pass
+
+        rank = [] # (dimension, tensor, stride) for each rank of the product
+        for t, ds in enumerate(dims):
+            step, row = 1, []
+            for d in reversed(ds):
+                row.append((d, t, step))
+                step *= d
+            row.reverse()
+            rank += row
+
+        def offsets(groups, n=len(dims)):
+            # Each group of ranks is indexed by one index; earlier groups' indices
+            # vary slowest.
+            out = [ (0,) * n ]
+            for group in groups:
+                step = [ 0 ] * n
+                for g in group: step[rank[g][1]] += rank[g][2]
+                out = [ tuple(o + i * s for o, s in zip(off, step))
+                        for off in out for i in range(rank[group[0]][0]) ]
+            return out
+
+        return plans.pin(key, (tuple(rank[k][0] for k in keep),
+                               offsets([ (k,) for k in keep ]), offsets(pairs)))
+    del LRU
+
+    def __trace_permute(self, shuffle, pairs, einsum=numpy and numpy.einsum):
         """Implementation of tau and permutrace, q.v.
 
         Takes two arguments, a permutation optionally padded with None
@@ -937,22 +1049,24 @@ class Vector (Tuple):
                 rev[shuffle[i]] = i
         assert None not in rev, (rev, shuffle)
 
-        # Perform contraction:
-        slab, total = (None,) * len(shuffle), self.__total
-        if rev:
-            dim = tuple( self.dimension[r] for r in rev )
-            grid = self.xerox(dim, None).__listify()
+        if self.array is not None:
+            # Label each rank, giving each pair's ranks the same label:
+            tag = range(self.rank)
+            for i, j in pairs: tag[j] = tag[i]
+            keep = [ tag[r] for r in rev ] + tag[len(shuffle):]
+            return self.__fromarray(einsum(self.array, tag, keep))
 
-            for s in self.__ranger(iter(dim)):
-                tmpl = list(slab)
-                for i, a in enumerate(rev): tmpl[a] = s[i]
-                store(grid, iter(s), total(tmpl, pairs))
-
-            # Don't pass dim; may lack a few late entries:
-            return self.fromSeq(grid)
+        # Perform contraction:
+        shape, bases, terms = self.__plan((self.dimension[:len(shuffle)],),
+                                          tuple(rev), tuple(map(tuple, pairs)))
+        row, flat = self.__flatten(len(shuffle)), []
+        for (p,) in bases:
+            tot = row[p + terms[0][0]]
+            for (t,) in terms[1:]: tot += row[p + t]
+            flat.append(tot)
 
-        return total(slab, pairs)
-    del setcell
+        if shape: return self.fromSeq(self.__nest(flat, shape))
+        return flat[0]
 
     # Further implementation details
     from study.maths.ratio import Rational
@@ -1162,7 +1276,7 @@ class Vector (Tuple):
     del tail_twist
 
 Tensor = Vector # alias
-del lazyprop, Tuple
+del lazyprop, lazyattr, Tuple, numpy
 
 class Namely (Vector):
     """A vector with more emphasis on the names of its components.
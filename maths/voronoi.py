@@ -2,42 +2,373 @@
 
 Thanks to Paul Endresen for explaining the bisection tree algorithm for doing
 nearest-neighbour searches efficiently.  Any flaws in the implementation are my
-fault, but the clever idea behind it is one he told me.
+fault, but the clever idea behind it is one he told me.  The tree now used is a
+k-d tree, bulk-built by median splits, which is his idea with the cuts placed
+where the points are, rather than half-way across each box.
 
 See study.LICENSE for copyright and license information.
 """
 from study.maths.vector import Vector
-
+try: import numpy
+except ImportError: numpy = None
+
+class KDTree (object):
+    """Bulk-built k-d tree, for nearest-neighbour searches among fixed points.
+
+    Constructor takes a sequence of points, each a sequence of real
+    co-ordinates, all of the same length; see .__init__() for details.  The
+    tree is built, in O(n.log(n)) time, by repeatedly splitting the points at
+    the median of the co-ordinate in which they are most spread out.  Its nodes
+    are not objects: they are numbered as in a heap (node i's children are 2*i
+    +1 and 2*i +2) and their data are held in lists (or numpy arrays) indexed by
+    node number.  Each node covers a contiguous slice of a permutation of the
+    points and records the bounding box of these points.  Queries identify
+    points by their indices in the sequence originally given.  Methods:
+
+      .nearest(point [, count, skip]) -- the count points nearest to point
+      .within(point, radius) -- the points within radius of point
+      .nearest_many(points [, count]) -- .nearest() for each of many points
+
+    When numpy is available and the co-ordinates are floats (whole numbers are
+    only accepted among co-ordinates that are), it is used to build the tree and
+    by .nearest_many(), which then walks the tree a level at a time for all the
+    queries at once, rather than once per query; and .array is then a numpy
+    array of the points (else it is None).\n"""
+
+    def __init__(self, points, leaf=8, np=numpy):
+        """Build the tree.
+
+        Required first argument, points, is a non-empty sequence of points, each
+        a sequence of real numbers; all must have the same length.  Optional
+        second argument, leaf, is an upper bound on the number of points in each
+        leaf of the tree; it must be at least 1 and defaults to 8.\n"""
+        if leaf < 1: raise ValueError('Demanding unrealistic subdivision', leaf)
+        self.__points = pts = [ tuple(p) for p in points ]
+        if not pts: raise ValueError('No points to build a tree of', points)
+        dim = len(pts[0])
+        for p in pts:
+            if len(p) != dim: raise ValueError('Mismatched dimension', dim, p)
+        self.__dim = dim
+
+        data = None
+        if np is not None:
+            try: data = np.array(pts)
+            except (TypeError, ValueError): pass
+            else:
+                if data.dtype.kind != 'f': data = None
+        if data is None: order = range(len(pts))
+        else: order = np.arange(len(pts))
+
+        span, cut, lo, hi = [], [], [], []
+        live = [ ( 0, 0, len(pts) ) ]
+        while live:
+            node, a, b = live.pop()
+            while len(span) <= node:
+                span.append(None); cut.append(None)
+                lo.append(None); hi.append(None)
+
+            span[node] = a, b
+            if data is None:
+                cols = zip(*[ pts[i] for i in order[a:b] ])
+                lo[node], hi[node] = tuple(map(min, cols)), tuple(map(max, cols))
+            else:
+                block = data[order[a:b]]
+                lo[node] = tuple(block.min(0).tolist())
+                hi[node] = tuple(block.max(0).tolist())
+
+            if b - a <= leaf: continue
+            # Split on the widest co-ordinate (even if all points coincide):
+            wide, axis = max((h - l, i) for i, (l, h)
+                             in enumerate(zip(lo[node], hi[node])))
+            mid = (a + b) // 2
+            if data is None:
+                order[a:b] = sorted(order[a:b], key=lambda i, j=axis: pts[i][j])
+            else:
+                order[a:b] = order[a:b][np.argpartition(block[:, axis], mid - a)]
+            cut[node] = axis, pts[order[mid]][axis]
+            live += [ ( 2 * node + 2, mid, b ), ( 2 * node + 1, a, mid ) ]
+
+        self.__span, self.__cut, self.__lo, self.__hi = span, cut, lo, hi
+        if data is None: self.__order, self.__data = order, None
+        else:
+            data.setflags(write=False)
+            self.__order, self.__data = order.tolist(), data
+            self.__arrays(np)
+
+    def __arrays(self, np):
+        """Sets up the numpy arrays used by .nearest_many().
+
+        For each node: .__axis is the co-ordinate on which it is cut, or -1 for
+        a leaf or an unused node number; .__at is the value at the cut; .__boxlo
+        and .__boxhi are the bounds of its box; and .__slot is, for a leaf, its
+        index into .__leafpts and .__leafids, which hold the points of each
+        leaf and their indices (padded with inf and -1 to a common length).\n"""
+        span, cut, dim = self.__span, self.__cut, self.__dim
+        nodes, leaves = len(span), [ n for n, c in enumerate(cut)
+                                     if c is None and span[n] is not None ]
+        blank = (0.,) * dim # for unused node numbers
+        self.__boxlo = np.array([ x or blank for x in self.__lo ])
+        self.__boxhi = np.array([ x or blank for x in self.__hi ])
+        self.__axis, self.__at = np.empty(nodes, dtype=int), np.zeros(nodes)
+        self.__axis.fill(-1)
+        for node, c in enumerate(cut):
+            if c is not None: self.__axis[node], self.__at[node] = c
+
+        self.__slot = np.zeros(nodes, dtype=int)
+        self.__slot[leaves] = np.arange(len(leaves))
+        width = max(span[n][1] - span[n][0] for n in leaves)
+        ids = np.empty((len(leaves), width), dtype=int)
+        ids.fill(-1)
+        for s, n in enumerate(leaves):
+            a, b = span[n]
+            ids[s, :b - a] = self.__order[a:b]
+        pts = np.empty((len(leaves), width, dim))
+        pts.fill(np.inf)
+        pts[ids >= 0] = self.__data[ids[ids >= 0]]
+        self.__leafids, self.__leafpts = ids, pts
+
+    def __len__(self): return len(self.__points)
+
+    @property
+    def array(self):
+        """The points, as a read-only numpy array, or None.
+
+        This is None unless the tree was built using numpy (see the class
+        doc-string).  Row i of the array is the point with index i.\n"""
+        return self.__data
+
+    def __point(self, point):
+        point = tuple(point)
+        if len(point) != self.__dim:
+            raise ValueError('Mismatched dimension', self.__dim, point)
+        return point
+
+    def __gap(self, node, point):
+        """Square of the distance from point to node's bounding box."""
+        gap = 0
+        for x, l, h in zip(point, self.__lo[node], self.__hi[node]):
+            if x < l: gap += (l - x) ** 2
+            elif x > h: gap += (x - h) ** 2
+        return gap
+
+    import heapq
+    def nearest(self, point, count=1, skip=None,
+                push=heapq.heappush, swap=heapq.heapreplace):
+        """Find the points nearest to a given point.
+
+        Required first argument, point, is a sequence of co-ordinates, of the
+        same length as each of the points of the tree.  Optional arguments:
+          count -- how many points to find; defaults to 1.
+          skip -- None (the default) or a callable taking the index of a point
+                  and returning true if that point is to be ignored.
+
+        Returns a list of twoples (i, d), in increasing order of d, in which i
+        is the index of a point and d is its distance from point; there are
+        count entries unless fewer points are left after skipping.\n"""
+        point = self.__point(point)
+        pts, order, span, cut = self.__points, self.__order, self.__span, self.__cut
+        best, live = [], [ ( 0, 0 ) ] # best is a heap of (-square, index)
+        while live:
+            gap, node = live.pop()
+            if len(best) >= count and gap >= -best[0][0]: continue
+
+            if cut[node] is None:
+                a, b = span[node]
+                for i in order[a:b]:
+                    if skip is not None and skip(i): continue
+                    sq = sum((x - y) ** 2 for x, y in zip(point, pts[i]))
+                    if len(best) < count: push(best, (-sq, i))
+                    elif sq < -best[0][0]: swap(best, (-sq, i))
+            else:
+                axis, at = cut[node]
+                near, far = 2 * node + 1, 2 * node + 2
+                if point[axis] >= at: near, far = far, near
+                live.append((self.__gap(far, point), far))
+                live.append((self.__gap(near, point), near))
+
+        best.sort(reverse=True)
+        return [ (i, (-sq) ** .5) for sq, i in best ]
+    del heapq
+
+    def within(self, point, radius):
+        """Find the points within a given distance of a given point.
+
+        Required arguments are point, as for .nearest(), and radius, a
+        distance.  Returns a list of twoples (i, d), in increasing order of d,
+        in which i is the index of a point and d <= radius is its distance from
+        point.\n"""
+        point, limit = self.__point(point), radius * radius
+        pts, order, span, cut = self.__points, self.__order, self.__span, self.__cut
+        found, live = [], [ 0 ]
+        while live:
+            node = live.pop()
+            if self.__gap(node, point) > limit: continue
+            if cut[node] is None:
+                a, b = span[node]
+                for i in order[a:b]:
+                    sq = sum((x - y) ** 2 for x, y in zip(point, pts[i]))
+                    if sq <= limit: found.append((sq, i))
+            else: live += [ 2 * node + 2, 2 * node + 1 ]
+
+        found.sort()
+        return [ (i, sq ** .5) for sq, i in found ]
+
+    def nearest_many(self, points, count=1, chunk=0x10000, np=numpy):
+        """Find the nearest points to each of many points.
+
+        Required first argument, points, is a sequence of points, each as for
+        .nearest(), or a two-dimensional numpy array with a row per point.
+        Optional second argument, count, is the number of nearest points to find
+        for each; it defaults to 1 and is treated as len(self) if bigger.
+        Optional third argument, chunk, is the number of points to handle at a
+        time, limiting the memory used; it defaults to 65536.
+
+        Returns a twople (index, distance) of sequences, each with an entry per
+        entry in points.  When count is 1, each entry of index is the index of
+        the point of the tree nearest to the corresponding entry in points and
+        the matching entry in distance is its distance; otherwise, each entry is
+        a sequence of count such indices or distances, nearest first.  When the
+        tree was built using numpy, index and distance are numpy arrays (and
+        the work of walking the tree is shared among the points); otherwise,
+        they are lists.\n"""
+        single, count = count == 1, min(count, len(self))
+        if self.__data is None:
+            index, distance = [], []
+            for p in points:
+                found = self.nearest(p, count)
+                if single: (i, d), = found
+                else: i, d = [ x[0] for x in found ], [ x[1] for x in found ]
+                index.append(i)
+                distance.append(d)
+            return index, distance
+
+        where = np.array(points, dtype=float)
+        if where.ndim != 2 or where.shape[1] != self.__dim:
+            raise ValueError('Mismatched dimension', self.__dim, where.shape)
+        index = np.empty((len(where), count), dtype=int)
+        best = np.empty((len(where), count))
+        for at in xrange(0, len(where), chunk):
+            index[at:at + chunk], best[at:at + chunk] = self.__many(
+                where[at:at + chunk], count, np)
+
+        best = np.sqrt(best)
+        if single: return index[:, 0], best[:, 0]
+        return index, best
+
+    def __many(self, where, count, np):
+        """Implements .nearest_many() for a batch of points, using numpy.
+
+        Walks the tree a level at a time, for all points at once, as a list of
+        (point, node) pairs still worth examining.  Starts by finding the leaf
+        each point falls in, to get an upper bound on the distance to its
+        count-th nearest, with which to prune nodes from the start.  Returns
+        the indices and squared distances of the nearest points.\n"""
+        axis, at, slot = self.__axis, self.__at, self.__slot
+        lo, hi, ids, pts = self.__boxlo, self.__boxhi, self.__leafids, self.__leafpts
+        size = len(where)
+
+        node = np.zeros(size, dtype=int)
+        while True:
+            inner = (axis[node] >= 0).nonzero()[0]
+            if not len(inner): break
+            down = node[inner]
+            node[inner] = 2 * down + 1 + (where[inner, axis[down]] >= at[down])
+        bound = np.empty(size)
+        bound.fill(np.inf)
+        if count <= ids.shape[1]:
+            diff = where[:, None, :] - pts[slot[node]]
+            bound = np.partition((diff * diff).sum(2), count - 1, 1)[:, count - 1]
+
+        index = np.empty((size, count), dtype=int)
+        index.fill(-1)
+        best = np.empty((size, count))
+        best.fill(np.inf)
+        ask, node = np.arange(size), np.zeros(size, dtype=int)
+        while len(ask):
+            here = where[ask]
+            gap = np.maximum(lo[node] - here, 0) + np.maximum(here - hi[node], 0)
+            keep = (gap * gap).sum(1) <= np.minimum(bound[ask], best[ask, -1])
+            ask, node = ask[keep], node[keep]
+
+            leaf = axis[node] < 0
+            if leaf.any():
+                self.__merge(ask[leaf], where, slot[node[leaf]], index, best, np)
+                ask, node = ask[~leaf], node[~leaf]
+            ask = np.concatenate((ask, ask))
+            node = np.concatenate((2 * node + 1, 2 * node + 2))
+
+        return index, best
+
+    def __merge(self, ask, where, slots, index, best, np):
+        """Updates index and best, for points ask, with the leaves in slots."""
+        ids, count = self.__leafids[slots], best.shape[1]
+        diff = where[ask][:, None, :] - self.__leafpts[slots]
+        sq = (diff * diff).sum(2)
+        if count < ids.shape[1]: # Only each leaf's count nearest can matter:
+            rows = np.arange(len(ask))[:, None]
+            pick = sq.argpartition(count - 1, 1)[:, :count]
+            sq, ids = sq[rows, pick], ids[rows, pick]
+
+        # Candidates: what each point already has, plus the leaves' points:
+        who = np.unique(ask)
+        cand = np.concatenate((np.repeat(who, count), np.repeat(ask, ids.shape[1])))
+        dist = np.concatenate((best[who].ravel(), sq.ravel()))
+        what = np.concatenate((index[who].ravel(), ids.ravel()))
+        real = (what >= 0).nonzero()[0]
+        cand, dist, what = cand[real], dist[real], what[real]
+
+        order = dist.argsort()
+        order = order[cand[order].argsort(kind='mergesort')]
+        cand, dist, what = cand[order], dist[order], what[order]
+        step = np.arange(len(cand))
+        first = np.ones(len(cand), dtype=bool)
+        first[1:] = cand[1:] != cand[:-1]
+        rank = step - np.maximum.accumulate(np.where(first, step, 0))
+        take = (rank < count).nonzero()[0]
+        best[who], index[who] = np.inf, -1
+        best[cand[take], rank[take]] = dist[take]
+        index[cand[take], rank[take]] = what[take]
+
 class Catchment (set):
     """Subdivide space according to which of a set of points is nearest.
 
     This is Voronoi's decomposition of the space; see class Voronoi for the
     description of the regions into which the space is thus decomposed.  Records
     the result of ingesting its constructor's argument (see .__init__()) as
-    .centres; has one method, .nearest(vec [, elide]), that finds the nearest in
-    .centres (but not in elide, if passed) to the given vec.\n"""
+    .centres; has methods:
+
+      .nearest(vec [, elide]) -- the nearest in .centres (but not in elide, if
+                                 passed) to the given vec
+      .closest(vec, count [, elide]) -- the count nearest, likewise
+      .within(vec, radius) -- those no further than radius from vec
+      .nearest_many(vecs) -- .nearest() for each of many vecs
+      .raster(lo, hi, steps) -- the nearest to each cell of a grid
+
+    The searches use a KDTree of the centres, built in bulk when first needed
+    and again after each change to the set of centres; so a Catchment is most
+    efficient when all changes to it are made before any searches.\n"""
 
     __upnew = set.__new__
-    def __new__(cls, centres, count=1):
+    def __new__(cls, centres, count=8):
         if count < 1: raise ValueError('Demanding unrealistic subdivision', count)
-        return cls.__upnew(cls, map(cls.__vectorise, centres))
+        return cls.__upnew(cls)
 
     __upinit = set.__init__
-    def __init__(self, centres, count=1):
+    def __init__(self, centres, count=8):
         """Set up data for computation of catchment-regions.
 
         Required first argument, centres, should be an iterable, whose entries
-        are points in some vector space; if they are not Vector instances, they
-        should be sequences acceptable to Vector.fromSeq().  Optional second
-        argument, count, is an upper bound on the number of points to include in
-        each leaf of the bisection tree built internally; it must be at least 1
-        - its default (and recommended) value.
+        are points in some vector space, with real co-ordinates; if they are not
+        Vector instances, they should be sequences acceptable to
+        Vector.fromSeq().  Optional second argument, count, is an upper bound on
+        the number of points to include in each leaf of the KDTree built
+        internally; it must be at least 1 and defaults to 8.
 
         Stores, in self as a set, Vector (see study.maths.vector) instances
         (made using Vector.fromSeq where needed) representing the entries in
         centres.\n"""
 
-        self.__upinit(centres)
+        self.__upinit(map(self.__vectorise, centres))
 
         # Check all in the same space:
         each = iter(self)
@@ -48,294 +379,58 @@ class Catchment (set):
             d = it.dimension
             if len(d) != len(dims) or d != dims:
                 raise ValueError('Mismatched dimension', dims, d, it)
-        self.__dim = tuple(dims)
-        self.__root, self.__ineach = self.__btree(tuple(self), count), count
+        self.__dim, self.__ineach = tuple(dims), count
+        self.__tree = None
+        self.__kdtree()
 
     @staticmethod
     def __vectorise(val, V=Vector):
         return val if isinstance(val, V) else V.fromSeq(val)
-
-    # Support for .__btree()
-    class BTree (object):
-        """Bisection tree.
-
-        A coordinate-aligned cuboid box that knows how to be split in two.  Has,
-        as its .box attribute, a pair of vectors (low, high); the cuboid it
-        describes has .box[0][ind] <= vec[ind] <= .box[1][ind] for each vec in
-        the cuboid and each full-rank index, ind.  Supports 'vec in self'
-        testing based on this.
-
-        If it's been .split(), it has child notes .left and .rite and its .cut
-        records the coordinate at their boundary; otherwise these attributes are
-        unset.  The value of .cut (when set) is a twople whose first entry is
-        the index of the coordinate and whose sencond entry is the value of this
-        coordinate at the boundary between the two child nodes.
-
-        Has .parent set to the node whose .split() created it as .left or .rite,
-        if this is how it was created; otherwise, doesn't have .parent set (so
-        AttributeError is the easy way out of traversal up the .parent
-        hierarchy).  Methods:
-
-          .split() -- bisect self on a suitable coordinate plane.
-          .locate(vec) -- find which cell a given vec is in
-          .distance(vec) -- range of distance between vec and points in self.box
-
-        Our one client, Catchment, shall set .points to a list of points in the
-        box (but no method of this class pays any attention to .points).\n"""
-        def __init__(self, lo, hi, up=None):
-            self.box = lo, hi
-            if up is not None: self.parent = up
-        # TODO: make parent a weak attribute, so that garbage collection is happy.
-
-        # Tools for use by split():
-        def __child(self, lo, hi): return self.__class__(lo, hi, self)
-
-        @staticmethod
-        def __split(deep, lo, hi, only=Vector.delta):
-            """Finds the right index and mid-value on which to split a box.
-
-            Uses deep (from __depth(), below) to determine how recently each
-            index has been split on; amongst the least recently used, finds the
-            one for which hi-lo has the largest component, i.e. the box's width
-            is biggest.  Returns a twople of this index with the vector that's
-            half the box's width in this direction.\n"""
-            dex, was = (hi - lo).iteritems(), 0
-            while not was:
-                try: big, was = dex.next()
-                except StopIteration: # lo == hi
-                    raise ValueError('Empty box', lo, hi)
-                assert was >= 0
-            at = deep(big)
-
-            for ind, val in dex:
-                assert val >= 0
-                if val: # don't try to cut on a zero-width direction !
-                    dp = deep(ind)
-                    if at < dp or (dp == at and val < was):
-                        at, was, big = dp, val, ind
-
-            gap = hi[big] - lo[big]
-            assert gap > 0
-            q, r = divmod(gap, 2)
-            if r: q = gap * .5 # but prefer an int if we got one
-            return big, only(hi.dimension, big) * q
-
-        def __depth(self):
-            """Returns a function to compute depth below last split on an index.
-
-            The returned function returns one more than self's depth in the tree
-            when we haven't yet split on the index given.\n"""
-            up, prior = self, []
-            try:
-                while True:
-                    up = up.parent # AttributeError at root
-                    assert hasattr(up, 'cut')
-                    prior.append(up.cut[0])
-            except AttributeError: pass
-
-            def deep(ind, p=prior):
-                try: return p.index(ind)
-                except ValueError: return len(p)
-
-            return deep
-
-        def split(self):
-            """Split self in half in one coordinate direction.
-
-            The chosen coordinate direction is the least recently used, among
-            splits in the tree down to self, preferring those with bigger width
-            among those on which we haven't split previously.\n"""
-
-            lo, hi = self.box
-            ind, half = self.__split(self.__depth(), lo, hi)
-            assert len(hi) == len(half), (half, ind, hi, lo)
-            self.left, self.rite = self.__child(lo, hi - half), self.__child(lo + half, hi)
-            self.cut = ind, self.left.box[1][ind]
-            assert self.cut[1] == self.rite.box[0][ind]
-            return self.left, self.rite
-
-        def __contains__(self, vec):
-            lo, hi = self.box
-            return not vec.pointwise(lambda v, L, H: v < L or H < v, None, lo, hi)
-
-        def locate(self, vec):
-            """Returns the leaf node containing a given vector.
-
-            Identifies the leaf node, in the tree under self, in which vec
-            appears; or the one closest to vec, if vec is not in self.\n"""
-
-            here = self
-            while True:
-                try: ind, cut = here.cut
-                except AttributeError: break
-                here = here.rite if vec[ind] > cut else here.left
-                # For vec in self, this is equivalent to, but cheaper than:
-                # here = left if vec in left else rite
-
-            assert vec in here or not vec in self
-            return here
-
-        def distance(self, vec):
-            """Returns the range of distances, in self's box, from a given vector.
-
-            Required argument, vec, is the vector to measure from.  Returns a
-            twople of the distances from vec to its nearest and furthest points
-            in self.\n"""
-            lo, hi = self.box
-            off = vec.pointwise(lambda v, L, H: L - v if v <= L else H -v if v >= H else 0,
-                                 None, lo, hi)
-            far = vec.pointwise(lambda v, L, H: H - v if 2 * v < L + H else L - v,
-                                 None, lo, hi)
-            return off.squaresum ** .5, far.squaresum ** .5
-
-    @classmethod
-    def __btree(cls, ps, n=1, Tree=BTree):
-        """Builds a BTree with at most n of the ps in each leaf of the tree.
-
-        Saves, as each node's .points, the list of entries from ps that are in
-        the node.  Points on boundaries are placed in one of the adjacent nodes,
-        at each split; clients should make no assumption about which.\n"""
-        root = Tree(ps[0].pointwise(lambda *xs: min(xs), None, *ps[1:]),
-                    ps[0].pointwise(lambda *xs: max(xs), None, *ps[1:]))
-        cls.__split(root, ps, n)
-        return root
-    del BTree
 
     @staticmethod
-    def __split(root, ps, each):
-        live = [ ( root, ps ) ]
-        while live:
-            tree, ps = live.pop()
-            assert all(p in tree for p in ps)
-            tree.points = frozenset(ps)
-
-            if len(ps) > each: # else we can let tree be a leaf
-                left, rite = tree.split()
-                ind, cut = tree.cut
-                ls, rs = [], []
-                for p in ps: (rs if p[ind] > cut else ls).append(p)
-                live += [ (left, tuple(ls)), (rite, tuple(rs)) ]
-
-    # Critique: self.__root.points is a set with the same membership as self
-    # (just lacking the extra methods of Catchment).  This strongly hints that
-    # self and self.__root could be unified in some way, with each sub-tree as a
-    # subset.  It would change the semantics of __contains__(); rename the
-    # geometric one to encloses().
-
+    def __coords(vec):
+        return tuple(v for i, v in vec.iteritems())
+
+    def __kdtree(self, Tree=KDTree):
+        """Returns the KDTree of self's points, building it if needed.
+
+        The tree identifies each point by its index in self.__points, which is
+        set along with the tree.\n"""
+        if self.__tree is None:
+            self.__points = tuple(self)
+            self.__tree = Tree(map(self.__coords, self.__points), self.__ineach)
+        return self.__tree
+
+    @property
+    def centres(self):
+        """Tuple of self's points, in the order its KDTree numbers them.
+
+        This is the order to which the indices returned by .raster() refer;
+        it is only stable until self is next changed.\n"""
+        self.__kdtree()
+        return self.__points
+
     # API of set:
     __upadd = set.add
     def add(self, point):
         if point.dimension != iter(self).next().dimension:
             raise ValueError('Incompatible dimension', point.dimension)
-        self.__upadd(point)
-
-        if point in self.__root:
-            # We can insert it into the existing BTree:
-            tree = self.__root.locate(point)
-            self.__split(tree, tree.points.union((point,)), self.__ineach)
-
-            while True: # run up to root, adding point to .points of each node:
-                try: tree = tree.parent
-                except AttributeError: break
-                tree.points = tree.points.union((point,))
-
-        else: # Need a new BTree:
-            self.__root = self.__btree(tuple(self), self.__ineach)
+        if point not in self:
+            self.__upadd(point)
+            self.__tree = None
 
     __uprm = set.discard
     def discard(self, point):
         if point not in self: return
         self.__uprm(point)
-        self.__rm(point, self.__root)
-
-    @staticmethod
-    def __rm(point, root):
-        assert point in root.points # which is what we need to fix
-        tree, point = root.locate(point), set((point,))
-        while True:
-            tree.points -= point
-            # TODO: unsplit if one child is empty and the other a leaf.
-            try: tree = tree.parent
-            except AttributeError: break
+        self.__tree = None
 
     __uppop = set.pop
     def pop(self): # ... or suppress this method as a silly one to use ?
         ans = self.__uppop()
-        self.__rm(ans, self.__root)
+        self.__tree = None
         return ans
 
-    # Support for .nearest()
-    from itertools import chain
-    @staticmethod
-    def __nearleaves(where, tree, elide, byturns=chain):
-        """Find the leaf nodes in which the closest point to where could lie.
-
-        Arguments:
-          where -- the point;
-          tree -- the tree to traverse;
-          elide -- collection of points to ignore, in .points attributes.
-
-        Expands each split in tree so as to discard (without splitting) every
-        box whose nearest point to where is further than the furthest point of
-        some other box; repeatedly splits the box, whose furthest point from
-        where is nearer than that of any other, so as to be able to discard as
-        many futher boxes as soon as possible.  Each box retained, at the end,
-        is a leaf with at least some point in it closer to where than the
-        furthest point of every retained box.  The return is an iterator over
-        the points in the boxes retained; these are the points that might be
-        nearest to where.\n"""
-
-        near, best = tree.distance(where)
-        live, more = [ ( tree, near ) ], False
-        if elide: empty = lambda ps, ig=elide: not [ p for p in ps if p not in ig ]
-        else: empty = lambda ps: not ps
-        if empty(tree.points):
-            raise ValueError('Ignoring all points leaves none to be nearest', elide)
-
-        # Invariants: best is the max distance from where of any point in tree's
-        # box; tree is the live BTree node for which this is least, among those
-        # we've seen; more is true when we've split a node since last our
-        # scanning showed us tree.  We loop over the live BTree nodes, splitting
-        # those we can and eliminating those in which the nearest point can't
-        # be.  There are no empty() entries in live.
-        while True:
-            here, near = live.pop()
-            if near > best: continue # we can ignore this sub-tree
-
-            try: pair = here.left, here.rite
-            except AttributeError:
-                live.insert(0, (here, near)) # Move to the back of the queue
-                if here is tree: # Are we done yet ?
-                    if more: more = False
-                    else: break # no further refinement possible
-
-            else: # split node
-                more, shift = True, here is tree
-                for here in pair:
-                    # if it's a leaf with no points, ignore it:
-                    if empty(here.points): continue
-
-                    near, far = here.distance(where)
-                    if near < best: # else ignore here
-                        # When splitting tree itself (shift is true), one of its
-                        # children must be at least as good as it and we must
-                        # switch to using that as tree, so that the "Are we done
-                        # yet ?" does get triggered.  If splitting some other
-                        # node equals tree, but doesn't beat it, then we'll
-                        # still be done when we get back to tree in the loop, so
-                        # no need to change which node we think is best.
-                        if (far <= best if shift else far < best):
-                            # Improvement (or replacing tree with equal child):
-                            best, tree = far, here
-                            # Reprocess promptly, as splitting it is apt to improve best:
-                            live.append((here, near))
-                        else: live.insert(0, (here, near)) # Back of the queue.
-
-        assert live
-        # Remaining leaves overlap, need to check all points in them.
-        return byturns(*tuple(it[0].points for it in live))
-    del chain
-
     def nearest(self, where, elide=()):
         """Find a nearest entry in self to where.
 
@@ -347,18 +442,185 @@ class Catchment (set):
         (where-p).squaresum is minimal among relevant p (in self but not in
         elide) - although there is no guarantee this is unique.\n"""
 
-        ps = self.__nearleaves(self.__vectorise(where), self.__root, elide)
-        centre = ps.next()
-        sumsqr = (centre - where).squaresum
-        for p in ps:
-            if p in elide: continue
-            rr = (p - where).squaresum
-            if rr < sumsqr: centre, sumsqr = p, rr
+        found = self.closest(where, 1, elide)
+        if not found:
+            raise ValueError('Ignoring all points leaves none to be nearest', elide)
+        return found[0]
+
+    def closest(self, where, count, elide=()):
+        """Find the entries in self nearest to where.
+
+        Arguments are as for .nearest(), save that a second argument, count,
+        specifies how many entries to find (elide is now the optional third
+        argument).  Returns a list of twoples (p, d), each as .nearest()
+        returns, in increasing order of d; it has count entries unless there
+        are fewer relevant points in self.\n"""
+        tree, ps = self.__kdtree(), self.__points
+        if elide: skip = lambda i, e=elide, ps=ps: ps[i] in e
+        else: skip = None
+        return [ (ps[i], d) for i, d in
+                 tree.nearest(self.__coords(self.__vectorise(where)), count, skip) ]
+
+    def within(self, where, radius):
+        """Find the entries in self no further than radius from where.
+
+        Required arguments are where, as for .nearest(), and radius, a
+        distance.  Returns a list of twoples (p, d), in increasing order of d,
+        in which p is in self and d <= radius is its distance from where.\n"""
+        tree, ps = self.__kdtree(), self.__points
+        return [ (ps[i], d) for i, d in
+                 tree.within(self.__coords(self.__vectorise(where)), radius) ]
+
+    def nearest_many(self, wheres):
+        """Find a nearest entry in self to each of many points.
+
+        Single argument, wheres, is a sequence of vectors, each as for the where
+        argument of .nearest(); or a numpy array whose first index selects the
+        point, the rest being the indices within it.  Returns a list whose
+        entries are twoples (p, d), each as .nearest() would return for the
+        corresponding entry in wheres.  The queries share the work of walking
+        the tree, where possible, so this is quicker than calling .nearest()
+        for each.\n"""
+        tree, ps = self.__kdtree(), self.__points
+        try: shape = wheres.shape
+        except AttributeError:
+            wheres = [ self.__coords(self.__vectorise(w)) for w in wheres ]
+        else:
+            if tuple(shape[1:]) != self.__dim:
+                raise ValueError('Mismatched dimension', self.__dim, shape[1:])
+            wheres = wheres.reshape((shape[0], -1))
+
+        index, distance = tree.nearest_many(wheres)
+        try: index, distance = index.tolist(), distance.tolist()
+        except AttributeError: pass
+        return [ (ps[i], d) for i, d in zip(index, distance) ]
+
+    def raster(self, lo, hi, steps, distance=False, tile=64, processes=None,
+               np=numpy):
+        """Label each cell of a grid with the index of the nearest centre.
+
+        Required arguments:
+          lo, hi -- opposite corners of the box to cover, each a vector (or a
+                    sequence acceptable to Vector.fromSeq) like self's members
+          steps -- the number of cells into which to divide the box along each
+                   co-ordinate; either a single natural, used for all, or a
+                   sequence of naturals, one per co-ordinate
+
+        Optional arguments:
+          distance -- if true, also return the distances; default False
+          tile -- the number of cells along each co-ordinate of the tiles into
+                  which the grid is cut, to share out among workers; default 64
+          processes -- number of worker processes; default, None, lets
+                       multiprocessing.Pool use as many as the machine has
+                       CPUs; if 1 (or there is only one tile), the work is
+                       done in this process.
+
+        Each cell is labelled according to the centre nearest its middle.
+        Returns a numpy array, with one axis per co-ordinate, of length given
+        by steps, whose entries are indices into .centres; or, if distance is
+        true, a twople of this and a matching array of the distances from the
+        middles of the cells to their nearest centres.
+
+        For each tile, self's KDTree selects the centres that could be nearest
+        to some point of the tile: those within r + 2 * h of its middle, where
+        r is the distance from there to the nearest centre and h is half the
+        tile's diagonal.  Each worker just has to search among these for each
+        cell of its tile.  Requires numpy.\n"""
+        if np is None: raise ImportError('Grid labelling needs numpy')
+        lo, hi = [ np.array(self.__coords(self.__vectorise(x)), dtype=float)
+                   for x in (lo, hi) ]
+        if lo.shape != hi.shape: raise ValueError('Mismatched dimension', lo, hi)
+        try: steps = tuple(steps)
+        except TypeError: steps = (steps,) * len(lo)
+        if len(steps) != len(lo):
+            raise ValueError('Mismatched dimension', len(lo), steps)
+        if tile < 1 or min(steps) < 1:
+            raise ValueError('Demanding unrealistic subdivision', steps, tile)
+        if not (hi > lo).all(): raise ValueError('Empty box', lo, hi)
+
+        step = (hi - lo) / steps
+        work, jobs = Tiler(lo, step, distance), self.__tiles(lo, step, steps, tile)
+        near = np.empty(steps, dtype=int)
+        if distance: far = np.empty(steps)
+        if processes == 1 or all(n <= tile for n in steps):
+            for start, ids, ds in map(work, jobs):
+                cell = tuple(slice(s, s + n) for s, n in zip(start, ids.shape))
+                near[cell] = ids
+                if distance: far[cell] = ds
+        else:
+            from multiprocessing import Pool
+            pool = Pool(processes)
+            try:
+                for start, ids, ds in pool.imap_unordered(work, jobs):
+                    cell = tuple(slice(s, s + n) for s, n in zip(start, ids.shape))
+                    near[cell] = ids
+                    if distance: far[cell] = ds
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+
+        if distance: return near, far
+        return near
+
+    from itertools import product
+    def __tiles(self, lo, step, steps, tile, each=product, np=numpy):
+        """Yields the jobs for .raster()'s Tiler, one per tile.
+
+        Each is a tuple (start, shape, coords, ids) in which start and shape
+        give the grid indices of the tile's first cell and its number of cells
+        along each co-ordinate, coords is an array of the co-ordinates of the
+        centres that might be nearest to some cell in the tile and ids are the
+        indices of these centres in .centres.\n"""
+        tree, ps = self.__kdtree(), self.__points
+        for start in each(*[ xrange(0, n, tile) for n in steps ]):
+            shape = tuple(min(tile, n - s) for s, n in zip(start, steps))
+            mid = lo + (np.array(start) + np.array(shape) * .5) * step
+            half = np.sqrt(((np.array(shape) * step) ** 2).sum()) * .5
+            (i, r), = tree.nearest(mid.tolist())
+            ids = np.array([ i for i, d in tree.within(mid.tolist(), r + 2 * half) ])
+            if tree.array is None:
+                coords = np.array([ self.__coords(ps[i]) for i in ids ], dtype=float)
+            else: coords = tree.array[ids]
+            yield start, shape, coords, ids
+    del product
+
+class Tiler (object):
+    """Find the nearest centre to each cell of one tile of a grid.
+
+    This packages the grid's parameters for Catchment.raster(), so that an
+    instance can be handed to a pool of worker processes; all that each call
+    then needs to be told is which tile to label and which centres to consider
+    for it.\n"""
+
+    def __init__(self, lo, step, distance=False):
+        """Set up to label tiles of a grid.
+
+        Required arguments, lo and step, are arrays of the co-ordinates of the
+        grid's lowest corner and of the size of its cells.  Optional argument,
+        distance, should be true if the distances to the nearest centres are
+        wanted.\n"""
+        self.__lo, self.__step, self.__distance = lo, step, distance
+
+    def __call__(self, (start, shape, coords, ids), np=numpy, Tree=KDTree):
+        """Label the cells of a tile.
+
+        Single argument is a tuple (start, shape, coords, ids), as yielded by
+        Catchment's .__tiles(); this packaging suits Pool.imap, which only
+        passes one argument.  Returns a tuple (start, near, far) in which near
+        is an array, of the given shape, of the entries in ids of the centres
+        nearest the middles of the tile's cells and far is None or (if
+        distances were asked for) an array of the distances.\n"""
+        axes = [ lo + (np.arange(s, s + n) + .5) * step for lo, step, s, n
+                 in zip(self.__lo, self.__step, start, shape) ]
+        mids = np.array(np.meshgrid(*axes, indexing='ij')).reshape(len(axes), -1)
+        near, far = Tree(coords).nearest_many(mids.T)
+        near = ids[near].reshape(shape)
+        if self.__distance: return start, near, far.reshape(shape)
+        return start, near, None
 
-        return centre, sumsqr ** .5
-
 class Voronoi (object):
     # TODO: boundary-representation of the convex hulls, one per point.
     pass
-
-del Vector
+
+del Vector, numpy
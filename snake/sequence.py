@@ -550,7 +550,7 @@ class Tuple (ReadOnlySeq, tuple):
 
     @classmethod
     def _iterable_(cls, what): return cls._tuple_(what)
-    __hash__ = tuple.__hash__
+    __hash__, __len__ = tuple.__hash__, tuple.__len__ # not ReadSeq's iterating
 
     __upmul = tuple.__mul__
     def __mul__(self, other): return self._tuple_(self.__upmul(other))
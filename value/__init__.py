@@ -7,6 +7,7 @@ Fragments:
   quantity -- describes a value with units of measurement
   sample -- describes a number with uncertain value
   SI -- the base units of SI
+  snapshot -- records the tables' computed values, to speed up importing them
   units -- other vaguely sensible units
 
 See study.LICENSE for copyright and license information.
@@ -368,7 +368,64 @@ del prodict
 
 from object import Object
 
+class _Formula (tuple):
+    """Pending computation of the scale of a deferred Quantity.
+
+    A tuple whose first entry is a function and whose remaining entries are its
+    operands; each operand is either a Quantity, standing for its scale (which
+    may itself be pending), or a plain value.  See Quantity.deferred.\n"""
+
+class _Pending (object):
+    """Non-data descriptor standing in for a Quantity's scale.
+
+    Once a Quantity has its scale in its own namespace, that hides this
+    descriptor; until then, looking the scale up calls the function passed to
+    the constructor, which should compute it and store it there.\n"""
+    def __init__(self, get): self.__get = get
+    def __get__(self, obj, cls=None):
+        if obj is None: return self
+        return self.__get(obj)
+
+class _Deferral (object):
+    """Descriptor for Quantity.deferred, true while a thread imports a table.
+
+    Each thread has its own stack of the table modules (see
+    study.value.snapshot) it is importing: each calls .begin(name) before it
+    makes its Quantity()s and .end(name) once it is done.  So that a table
+    module whose import fails doesn't leave every later Quantity deferred,
+    names missing from sys.modules (whence python removes a module whose
+    import failed) are forgotten.\n"""
+    import sys, threading
+    def __init__(self, Local=threading.local): self.__local = Local()
+    def __stack(self, modules=sys.modules):
+        try: stack = self.__local.stack
+        except AttributeError: stack = self.__local.stack = []
+        while stack and stack[-1] not in modules: stack.pop()
+        return stack
+    del sys, threading
+
+    def __get__(self, obj, cls=None): return bool(self.__stack())
+    def begin(self, name): self.__stack().append(name)
+    def end(self, name):
+        was = self.__stack().pop()
+        assert was == name, ('Mismatched table modules', was, name)
+
+_deferral = _Deferral()
+
 class Quantity (Object):
+    # Deferred evaluation: while Quantity.deferred is true, arithmetic on
+    # Quantity()s, and construction from them, checks units at once but only
+    # records (as a _Formula) how to compute the resulting scale; nothing is
+    # computed until the scale is first needed (e.g. for .best, str() or
+    # float()).  Then the whole graph of pending formulae beneath it is
+    # evaluated in one pass, each node once, so shared sub-expressions aren't
+    # repeated.  This saves much work where many derived quantities are built
+    # (e.g. tables of constants) but few are ever examined.  It is true only
+    # in a thread importing one of the tables; see _Deferral.
+    deferred = _deferral
+    __pending = __users = None # see __defer() and __force()
+    _tables_ = None # see study.value.snapshot
+    __scale = _Pending(lambda self: self.__force())
 
     __obinit = Object.__init__
     def __init__(self, scale, units=Prodict(), doc=None, sample=None, *args, **what):
@@ -398,6 +455,8 @@ class Quantity (Object):
         self.__obinit(*args, **what)
 
         # Massage the arguments: first mix scale and units.
+        if self.deferred and not sample:
+            scale, units = self.__defer_scale_units(scale, units)
         scale, units = self.__clean_scale_units(scale, units)
         # then (check and) massage sample (if any):
         if sample:
@@ -418,13 +477,15 @@ class Quantity (Object):
         if doc is not None: doc = self.__cleandoc(doc)
 
         # Initialise self as a Quantity with the thus-massaged arguments:
-        self.__scale, self.__units, self.__doc__ = scale, units, doc
+        if isinstance(scale, _Formula): self.__defer(scale)
+        else: self.__scale = scale
+        self.__units, self.__doc__ = units, doc
         # Should __addcheck() what['best'], what['low'] ... if given.
 
     @staticmethod
     def __clean_scale_units(scale, units,
                             scalartypes=(int, long, float, complex),
-                            Bok=Prodict, Spread=Sample, Nice=qSample):
+                            Bok=Prodict, Nice=qSample):
         """Tidy up scale and units passed to constructor.
 
         Each is allowed to be a Quantity, scale may be a qSample, Sample or
@@ -435,6 +496,10 @@ class Quantity (Object):
         help make it possible to del qSample and Prodict from this module's
         name-space, some day; and it also makes __init__ easier to read.)\n"""
 
+        if isinstance(scale, _Formula): # deferred; see __defer_scale_units()
+            if not isinstance(units, Bok): units = Bok(units)
+            return scale, units
+
         # Using try allows Object()s that borrow() from Quantity()s work.
         try: s, u = units._scale_units_()
         except AttributeError: pass
@@ -447,15 +512,40 @@ class Quantity (Object):
             if not isinstance(units, Bok): units = Bok(units)
         else: units, scale = u * units, s
 
-        # Massaging scale as a sample (so we can trust its str() to work).
-        if not isinstance(scale, Spread):
-            scale = Nice(best=scale)
-        elif not isinstance(scale, Nice):
-            scale = Nice(scale)
-
+        scale = Quantity.__nice(scale)
         assert isinstance(scale, Nice) and isinstance(units, Bok)
         return scale, units
 
+    @staticmethod
+    def __nice(scale, Spread=Sample, Nice=qSample):
+        # Massaging scale as a sample (so we can trust its str() to work).
+        if not isinstance(scale, Spread): return Nice(best=scale)
+        if not isinstance(scale, Nice): return Nice(scale)
+        return scale
+
+    @staticmethod
+    def __defer_scale_units(scale, units, Bok=Prodict, Thing=Object,
+                            mul=lambda x, s: x * s, same=lambda x: x):
+        """Deferred counterpart of __clean_scale_units, q.v.
+
+        When either scale or units is a Quantity, returns a _Formula in place
+        of the scale, along with the combined units; otherwise, returns scale
+        and units unchanged.  So does it if either is some other Object, that
+        may be borrowing from a Quantity: __clean_scale_units copes with
+        that.\n"""
+        if isinstance(scale, Quantity): un = scale.__units
+        elif isinstance(scale, Thing): return scale, units
+        else: un = None
+
+        if isinstance(units, Quantity):
+            if un is None: un = units.__units
+            else: un = un * units.__units
+            return _Formula((mul, scale, units)), un
+
+        if un is None or isinstance(units, Thing): return scale, units
+        if not isinstance(units, Bok): units = Bok(units)
+        return _Formula((same, scale)), un * units
+
     @staticmethod
     def __cleandoc(text):
         if text:
@@ -514,6 +604,7 @@ class Quantity (Object):
         the quantity self represents, while what.__doc__ indicates how that
         value was obtained.\n"""
 
+        self.__settle() # before changing self.__scale
         self.__scale.update(self.__addcheck(what, 'observe'))
         if doc is not None: self.document(doc)
         # NB: don't use inherited what.__doc__, it may come from class, albeit not Quantity.
@@ -654,6 +745,12 @@ class Quantity (Object):
         raise TypeError(why + ' between scalar and dimensioned quantity',
                         other, self._unit_str)
 
+    def __addterm(self, other, why):
+        # As __addcheck, but leave a Quantity's scale pending when deferring:
+        if (self.deferred and isinstance(other, Quantity)
+            and other.__units == self.__units): return other
+        return self.__addcheck(other, why)
+
     import math
 
     def arcTan2(self, what, units=[], atan=math.atan2):
@@ -696,10 +793,18 @@ class Quantity (Object):
     # Addition, subtraction and their reverses.
     def __kin(self,    scale): return self._quantity_(scale, self.__units)
 
-    def __add__(self,  other): return self.__kin(self.__scale + self.__addcheck(other, '+'))
-    def __radd__(self, other): return self.__kin(self.__addcheck(other, '+') + self.__scale)
-    def __sub__(self,  other): return self.__kin(self.__scale - self.__addcheck(other, '-'))
-    def __rsub__(self, other): return self.__kin(self.__addcheck(other, '-') - self.__scale)
+    def __add__(self,  other, f=lambda x, w: x + w):
+        if self.deferred: return self.__derive(f, self.__units, self, self.__addterm(other, '+'))
+        return self.__kin(self.__scale + self.__addcheck(other, '+'))
+    def __radd__(self, other, f=lambda x, w: x + w):
+        if self.deferred: return self.__derive(f, self.__units, self.__addterm(other, '+'), self)
+        return self.__kin(self.__addcheck(other, '+') + self.__scale)
+    def __sub__(self,  other, f=lambda x, w: x - w):
+        if self.deferred: return self.__derive(f, self.__units, self, self.__addterm(other, '-'))
+        return self.__kin(self.__scale - self.__addcheck(other, '-'))
+    def __rsub__(self, other, f=lambda x, w: x - w):
+        if self.deferred: return self.__derive(f, self.__units, self.__addterm(other, '-'), self)
+        return self.__kin(self.__addcheck(other, '-') - self.__scale)
 
     # multiplicative stuff is easier than additive stuff !
     def unpack(other, one=Prodict()):
@@ -717,28 +822,97 @@ class Quantity (Object):
         and the Quantity from which its argument is borrowing.\n"""
         return self.__scale, self.__units
 
-    def __mul__(self, other, grab=unpack):
+    # Support for deferred evaluation (see deferred, at the top):
+    import weakref
+    def __defer(self, formula, ref=weakref.ref):
+        if self._tables_ is not None: # it may know the answer already:
+            formula = _Formula(self._tables_.defer(self, formula))
+        self.__pending = formula
+        # Let each operand know to __settle() self before it's changed:
+        me = ref(self)
+        for it in formula[1:]:
+            if isinstance(it, Quantity):
+                if it.__users is None: it.__users = [ me ]
+                else: it.__users.append(me)
+    del weakref
+
+    def __settle(self):
+        """Evaluate any pending Quantity()s that use self's scale.
+
+        Called before self's scale is modified, so that the pending
+        computations see the value they would have seen, had they not been
+        deferred.\n"""
+        row, self.__users = self.__users, None
+        for me in row or ():
+            it = me()
+            if it is not None and it.__pending is not None: it.__force()
+
+    def __force(self):
+        """Evaluate a deferred Quantity's scale.
+
+        Walks the graph of pending formulae on which self's scale depends,
+        depth first, evaluating each after those it uses; each node stores its
+        scale and forgets its formula, so is only evaluated once, however many
+        others share it.  Returns self's scale.\n"""
+        stack = [ self ]
+        while stack:
+            node = stack[-1]
+            form = node.__pending
+            if form is None: # already evaluated (as a shared operand)
+                stack.pop()
+                continue
+
+            todo = [ it for it in form[1:]
+                     if isinstance(it, Quantity) and it.__pending is not None ]
+            if todo:
+                stack.extend(todo)
+                continue
+
+            args = [ it.__scale if isinstance(it, Quantity) else it
+                     for it in form[1:] ]
+            node.__scale = self.__nice(form[0](*args))
+            del node.__pending
+            if node._tables_ is not None: node._tables_.forced(node, node.__scale)
+            stack.pop()
+
+        return self.__scale
+
+    def __term(self, other, grab):
+        # As grab(other), but leave a Quantity's scale pending when deferring:
+        if self.deferred and isinstance(other, Quantity):
+            return other, other.__units
+        return grab(other)
+
+    def __derive(self, func, units, *args):
+        # Deferred arithmetic: func's arguments are computed from args by __force()
+        return self._quantity_(_Formula((func,) + args), units)
+
+    def __mul__(self, other, grab=unpack, f=lambda x, w: x * w):
         if isinstance(other, tuple): # assume study.maths.vector.Vector
             return other * self
 
-        ot, her = grab(other)
+        ot, her = self.__term(other, grab)
+        if self.deferred: return self.__derive(f, self.__units * her, self, ot)
         return self._quantity_(self.__scale * ot, self.__units * her)
 
-    def __rmul__(self, other, grab=unpack):
-        ot, her = grab(other)
+    def __rmul__(self, other, grab=unpack, f=lambda x, w: x * w):
+        ot, her = self.__term(other, grab)
+        if self.deferred: return self.__derive(f, her * self.__units, ot, self)
         return self._quantity_(ot * self.__scale, her * self.__units)
 
-    def __div__(self, other, grab=unpack): 
-        ot, her = grab(other)
-        if not ot: raise ZeroDivisionError, other
+    def __div__(self, other, grab=unpack, f=lambda x, w: x / w):
+        ot, her = self.__term(other, grab)
+        if not (isinstance(ot, Quantity) or ot): raise ZeroDivisionError, other
+        if self.deferred: return self.__derive(f, self.__units / her, self, ot)
         return self._quantity_(self.__scale / ot, self.__units / her)
     __truediv__ = __div__
 
-    def __rdiv__(self, other, grab=unpack, one=Prodict()):
+    def __rdiv__(self, other, grab=unpack, one=Prodict(), f=lambda x, w: x / w):
         if isinstance(other, tuple): # assume study.maths.vector.Vector
             return other * self._quantity_(1. / self.__scale, one / self.__units)
 
-        ot, her = grab(other)
+        ot, her = self.__term(other, grab)
+        if self.deferred: return self.__derive(f, her / self.__units, ot, self)
         return self._quantity_(ot / self.__scale, her / self.__units)
     __rtruediv__ = __rdiv__
 
@@ -779,6 +953,7 @@ class Quantity (Object):
         wh, at = grab(what)
         if at: raise TypeError('raising to a dimensioned power', what)
 
+        if self.deferred: return self.__derive(pow, self.__units ** wh, self, wh)
         return self._quantity_(pow(self.__scale, wh), self.__units ** wh)
 
     def __rpow__(self, what, mod=None, grab=unpack):
@@ -1000,6 +1175,15 @@ class Quantity (Object):
         if best is not None:
             best = cls.__get_scale(best, un)
 
+        if cls.deferred and not what.get('sample') and (
+            isinstance(units, Quantity) or not isinstance(units, Object)):
+            # Build the Sample only when needed, just as below:
+            if isinstance(units, Quantity): bok = units.__units
+            else: bok = units
+            if isinstance(rescale, Quantity): bok = rescale.__units * bok
+            return cls(_Formula((cls.__flat, lo, hi, best, rescale, units)),
+                       bok, doc, *args, **what)
+
         scale = Sample.flat(lo, hi, best)
         if rescale:
             if isinstance(rescale, Quantity): scale = rescale * scale
@@ -1007,6 +1191,18 @@ class Quantity (Object):
 
         return cls(scale, units, doc, *args, **what)
 
+    @staticmethod
+    def __flat(lo, hi, best, rescale, units, flat=Sample.flat):
+        # Deferred flat()'s formula; rescale and units are scales if they were
+        # Quantity()s.  Combine them with the Sample as flat() and __init__()
+        # would have, so that the result is of the same type.
+        scale = flat(lo, hi, best)
+        if rescale:
+            if isinstance(rescale, Sample): scale = rescale * scale
+            else: scale *= rescale
+        if isinstance(units, Sample): scale = scale * units
+        return scale
+
     @classmethod
     def within(cls, best, tol, *args, **what):
         """Convenience constructor for mid-point and half-width.
@@ -23,7 +23,9 @@ any other.
 
 Various classes with Weighted in their names provide the underlying
 implementation for that; the class Sample packages this functionality up for
-external consumption.
+external consumption.  When the data come as a stream of observations too
+large to hold in memory, a Digest can summarise them, with bounded memory, and
+produce a Sample (or Weighted) from the summary.
 
 See study.LICENSE for copyright and license information.
 """
@@ -411,6 +413,89 @@ class repWeighted (curveWeighted):
 
 # Combining two (whence several) distributions; adding to a distribution:
 
+# NumPy is optional; without it, combine() just uses its interpolator's.
+try: import numpy
+except ImportError: numpy = None
+
+def _arrayjoin(func, me, yo, np=numpy):
+    """Array-backed combination of two interpolators, for joinWeighted.combine.
+
+    Arguments are func, as for combine(), and two PiecewiseConstant-style
+    interpolators.  Each pair of intervals, one from each interpolator,
+    contributes the product of their weights, spread over the range of func's
+    values at the corners of the pair's rectangle, as a trapezium whose kinks
+    are those values, or as a spike if they are all equal; this is what
+    PiecewiseConstant.combine does, but treating every pair at once, in
+    arrays.  The density of the sum of these trapezia is piecewise linear, so
+    its integral between kinks can be accumulated exactly.
+
+    Returns a (cuts, mass) twople, with the same cuts and (give or take
+    rounding) the same weights between them as me.combine(func, yo) would
+    give: every kink is a cut, each spike's position appears twice, with the
+    spike's weight between its two copies.  The caller simplifies this just
+    as it would that.  Returns None if NumPy is not available or func won't
+    work on arrays (or gives non-finite values, e.g. by dividing by zero), so
+    that the caller can fall back on the pure python path.\n"""
+    if np is None: return None
+    a, p = np.asarray(me.cuts, float), np.asarray(me.mass, float)
+    b, q = np.asarray(yo.cuts, float), np.asarray(yo.mass, float)
+    i, j = p > 0, q > 0 # skip empty intervals, as Interpolator.filter() does
+    los, his, p = a[:-1][i][:, None], a[1:][i][:, None], p[i]
+    lob, hib, q = b[:-1][j], b[1:][j], q[j]
+    if not len(p) or not len(q): return None
+
+    shape, old = (len(p), len(q)), np.seterr(all='ignore')
+    try:
+        kink = np.array([ np.zeros(shape) + func(x, y)
+                          for x in (los, his) for y in (lob, hib) ], float)
+    except (TypeError, ValueError, ArithmeticError, AttributeError):
+        return None
+    finally: np.seterr(**old)
+    kink = kink.reshape(4, -1)
+    if not np.isfinite(kink).all(): return None
+    kink.sort(axis=0)
+    k0, k1, k2, k3 = kink
+    w = np.outer(p, q).ravel()
+
+    # Describe the trapezia by events at their kinks: each event changes the
+    # density by a jump or the density's slope by a step.
+    spike = k0 == k3
+    h = 2 * w / np.where(spike, 1, k3 + k2 - k1 - k0) # height of plateau
+    rise, fall = (k1 > k0) & ~spike, (k3 > k2) & ~spike
+    up = np.where(rise, h / np.where(rise, k1 - k0, 1), 0)
+    dn = np.where(fall, h / np.where(fall, k3 - k2, 1), 0)
+    zero = np.zeros_like(w)
+    xs = np.concatenate((k0, k1, k2, k3))
+    jump = np.concatenate((np.where(rise | spike, 0, h), zero, zero,
+                           np.where(fall | spike, 0, -h)))
+    slope = np.concatenate((np.where(spike, 0, up), -up, -dn, dn))
+    order = xs.argsort(kind='mergesort')
+    xs, jump, slope = xs[order], jump[order], slope[order]
+
+    # Integrate: segment k runs from xs[k] to xs[k+1]
+    gap = np.diff(xs)
+    grad = slope.cumsum()[:-1]
+    base = (jump.cumsum()[:-1] +
+            np.concatenate(([0.], (grad * gap).cumsum()[:-1])))
+    seg = np.maximum(base * gap + .5 * grad * gap * gap, 0)
+    below = np.concatenate(([0.], seg.cumsum())) # weight below each xs[k]
+
+    # Every distinct kink is a cut; each spike's position is repeated:
+    xs, first = np.unique(xs, return_index=True)
+    below = below[first]
+    pin, back = np.unique(k0[spike], return_inverse=True)
+    heft = np.bincount(back, weights=w[spike], minlength=len(pin))
+    cuts = np.concatenate((xs, pin))
+    cuts.sort(kind='mergesort')
+    if len(cuts) < 2: return None
+    lo, hi = cuts[:-1], cuts[1:]
+    at = np.minimum(np.searchsorted(pin, lo), max(len(pin) - 1, 0))
+    mass = np.where(lo == hi, heft[at] if len(pin) else 0,
+                    np.maximum(below[np.searchsorted(xs, hi)] -
+                               below[np.searchsorted(xs, lo)], 0))
+    # Use .tolist() so that no NumPy scalars leak into the interpolator:
+    return cuts.tolist(), mass.tolist()
+
 class joinWeighted (curveWeighted):
     """Interface-class defining how to stick distributions together.
 
@@ -560,7 +645,17 @@ class joinWeighted (curveWeighted):
         return self._weighted_(None,
                                  smooth=self.Interpolator(cuts, mass[1:-1]))
 
-    def combine(self, other, func, count=None):
+    def __count(self, other, size):
+        """Sensible default level of detail for combining self with other.
+
+        Uses the greater of self's and (if it has one) other's level of detail,
+        raised to at least 12 if size, the number of intervals the combination
+        has to describe, is big enough to support that.\n"""
+        try: count = max(other.__detail, self.__detail)
+        except AttributeError: count = self.__detail
+        return max(count, min(12, size))
+
+    def combine(self, other, func, count=None, join=_arrayjoin):
         """Generate a combined distribution.
 
         Required arguments:
@@ -591,20 +686,37 @@ class joinWeighted (curveWeighted):
         to sum the various intervals' contributions, to obtain weights to
         place at the centre-points between cut-points.  Hopefully this is
         somewhat more robust than placing the product of two weights at the
-        centre of each rectangle.\n"""
+        centre of each rectangle.
+
+        When NumPy is available and the result is to be simplified, the same
+        is done for all pairs of intervals at once, in arrays; see _arrayjoin.
+        Otherwise, or if func doesn't work on arrays, self's interpolator does
+        the work.  Either way, the result is then simplified in the same
+        way, so the two agree:
+
+        >>> a = Weighted({1: .2, 2: .3, 3: .3, 5: .2})
+        >>> b = Weighted({10: .1, 12: .4, 13: .3, 17: .2})
+        >>> f = lambda x, y: x * y
+        >>> fast, slow = a.combine(b, f), a.combine(b, f, join=lambda *a: None)
+        >>> max(abs(x - y) for x, y in zip(fast.interpolator.cuts,
+        ...                                slow.interpolator.cuts)) < 1e-9
+        True
+        >>> abs(fast.median() - slow.median()) < 1e-9
+        True
+        \n"""
 
         if not isinstance(other, _baseWeighted):
             other = self._weighted_(other)
 
-        mix = self.interpolator.combine(func, other.interpolator)
-
-        if count is None:
-            # Pick a sensible default:
-            try: you = other.__detail
-            except AttributeError: count = self.__detail
-            else: count = max(you, self.__detail)
-            count = max(count, min(12, len(mix)))
-
+        me, yo = self.interpolator, other.interpolator
+        # When NumPy is available, a big combination is done in arrays:
+        size, want = len(me) * len(yo), count
+        if want is None: want = self.__count(other, size)
+        got = size > want and join(func, me, yo)
+        if got: mix = self.Interpolator(*got)
+        else: mix = me.combine(func, yo)
+
+        if count is None: count = self.__count(other, len(mix))
         if len(mix) > count: mix = mix.simplify(count)
 
         try: mix = mix.scale() # normalise
@@ -620,6 +732,8 @@ class joinWeighted (curveWeighted):
 
         return cmp(self.interpolator, other.interpolator)
 
+del _arrayjoin, numpy
+
 # Various statistical computations.
 
 class statWeighted (_baseWeighted):
@@ -635,8 +749,9 @@ class statWeighted (_baseWeighted):
         Choses one of the keys of the distribution, with the aim that at most
         half of the total weight of the distribution lies on either side of the
         given key's neighbourhood.  If two equally good keys present themselves
-        (two neighbourhoods abut at the `true' median), a choice is made between
-        them: this choice might legitimately be arbitrary.
+        (two neighbourhoods abut at the `true' median), the one nearer the cut
+        between them is chosen; weights equal but for rounding errors count
+        as equal.
 
         I should really work out how to generalise this to the n-iles
         (i.e. those points in the distribution which are to n as pentiles are to
@@ -653,16 +768,18 @@ class statWeighted (_baseWeighted):
         assert all(smooth.map(lambda l, h, w, m: l <= m <= h, row))
         i, j = 0, len(smooth) - 1
         lo, hi = smooth.mass[i], smooth.mass[j]
+        # Weights that differ only by rounding are a tie:
+        fuzz = 1e-9 * smooth.total
         while i + 1 < j:
-            up, dn = lo <= hi, hi <= lo
+            up, dn = lo <= hi + fuzz, hi <= lo + fuzz
             if up:
                 i += 1
                 lo += smooth.mass[i]
             if dn:
                 j -= 1
                 hi += smooth.mass[j]
-        if i == j or hi < lo: return row[i]
-        if lo < hi: return row[j]
+        if i == j or hi + fuzz < lo: return row[i]
+        if lo + fuzz < hi: return row[j]
         cut = smooth.cuts[j]
         assert row[i] <= cut <= row[j]
         if cut - row[i] < row[j] - cut: return row[i]
@@ -856,7 +973,9 @@ def _divide(this, what):
     """Division straightener """
     ratio = this / what # let that decide whether to raise ZeroDivisionError
     # integer division gotcha: we don't want no rounded answers ...
-    if -.9375 < ratio * what - this < .9375: return ratio
+    try:
+        if -.9375 < ratio * what - this < .9375: return ratio
+    except ValueError: return ratio # arrays of floats (see _arrayjoin)
     # Note that when integer division is exact, that's accepted it.
 
     # I made the interval wide (and don't test on type) in case some
@@ -1292,6 +1411,42 @@ class Sample (Object):
         if mid: return split([ 1 ] + [ 2 ] * n + [ 1 ])
         return split([ 0 ] + [ 1 ] * (1+n) + [ 0 ])
 
+    # Support for study.value.snapshot:
+    def _snapshot_(self, simple=(int, long, float)):
+        """Returns plain data from which _restore_() can rebuild self.
+
+        The data are tuples, a dictionary and a flag, all of whose entries are
+        plain numbers, suitable for marshal.dump().  Only those public
+        attributes of self that are plain numbers, and not merely cached
+        computations, are included.  The flag records whether self's
+        representation is borrowed from a Sample it was built from (as when
+        a derived class, with its own _lazy_get__repr_, wraps a Sample).\n"""
+        weigh = self.__weigh
+        smooth = weigh.interpolator
+        what = {}
+        for k, v in self.__dict__.items():
+            if k[:1] != '_' and isinstance(v, simple) \
+                    and not self._lazy_ephemeral_(k): what[k] = v
+        lent = self._repr != self._lazy_get__repr_('_repr')
+
+        return (tuple(self.__best), tuple(weigh.items()),
+                tuple(smooth.cuts), tuple(smooth.mass), what, lent)
+
+    @classmethod
+    def _restore_(cls, state, W=Weighted):
+        """Rebuilds a sample from the data returned by _snapshot_().
+
+        The result has the same distribution (including the interpolator that
+        describes it, which may have come from computations the weights alone
+        don't capture) and best estimate as the sample that was snapshot.\n"""
+        best, items, cuts, mass, what, lent = state
+        if lent: # borrow from a plain Sample, as self did
+            ans = cls(Sample._restore_(state[:-1] + (False,)), **what)
+        else: ans = cls({ 0: 1 }, **what)
+        ans.__best = list(best)
+        ans.__weigh = W(dict(items), smooth=W.Interpolator(cuts, mass))
+        return ans
+
     @staticmethod
     def flat(lo, hi, best=None, *args, **what):
 
@@ -1318,8 +1473,292 @@ class Sample (Object):
             weights = {(2*lo + hi)/3.: 1, (lo + 2 * hi)/3.: 1}
 
         return Sample(weights, *args, **what)
+
+try: from numpy import asarray as _asarray
+except ImportError: _asarray = None # lists and map() shall do
+
+class MonteCarlo (Sample):
+    """Sample whose arithmetic propagates random draws from distributions.
+
+    Where Sample combines the weight dictionaries of its operands, pairwise,
+    at each step of a computation, an instance of this class carries .draws,
+    a sequence of .size values drawn at random from its distribution; its
+    arithmetic simply combines these element-wise, so the cost of each step is
+    proportional to .size, however deep the expression.  Because each value
+    keeps its draws, a value used more than once in a computation is
+    correlated with itself: x - x is exactly zero and x * x is never negative,
+    which Sample's arithmetic cannot manage.  The distribution, which Sample's
+    other methods use, is only computed from the draws when it is needed.
+
+    The draws are stratified (each of size equal fractiles of the
+    distribution is used once) and shuffled, using .random; this is a
+    random.Random shared by the class, with a fixed seed so that results are
+    repeatable.  Call MonteCarlo.random.seed() to reseed it; .size (default:
+    1024) may be over-ridden by a derived class or by passing size=n to the
+    constructor.  Values combined with one another must have the same .size.
+    Operands that are Samples but not MonteCarlos get fresh draws each time
+    they are used, so are not correlated with themselves.  When NumPy is
+    available, the draws are held in arrays, so that the element-wise work
+    mostly happens in C.\n"""
+
+    size = 1024
+    from random import Random
+    random = Random(0x5eed)
+    del Random
+    # The distribution (Sample's private __weigh) is computed from draws:
+    _lazy_preserve_ = Sample._lazy_preserve_ + ('_Sample__weigh',)
+
+    __upinit = Sample.__init__
+    def __init__(self, weights=None, *args, **what):
+        """Set up a MonteCarlo sample.
+
+        Takes the same arguments as Sample, optionally with draws=seq giving
+        the draws to use; in that case, weights should be omitted and best
+        should normally be given (the result of applying a computation to best
+        estimates needn't be the median of its draws, which is used if best is
+        not given).  Otherwise, the draws are taken from the distribution when
+        first needed.\n"""
+        draws = what.get('draws')
+        if draws is not None and weights is None and 'best' not in what:
+            row = sorted(draws)
+            what['best'] = row[len(row) // 2]
+
+        self.__upinit(weights, *args, **what)
+        if draws is not None and weights is None:
+            del self._Sample__weigh # a place-holder; compute lazily
+
+    def _lazy_get_draws_(self, ignored, wrap=_asarray):
+        n, weigh = self.size, self._Sample__weigh
+        if len(weigh) < 2: row = [ self.best ] * n
+        else:
+            # Band-centres are the odd entries of the finer band-ends:
+            row = list(self.fractiles(2 * n)[1:2 * n:2])
+            self.random.shuffle(row)
+        if wrap is not None: row = wrap(row, float)
+        self.also(draws=row) # preserve, for correlation's sake
+        return row
+
+    def _lazy_get__Sample__weigh_(self, ignored):
+        """Distribution described by the draws.
+
+        Sorts the draws and cuts them into about sqrt(len(draws)) runs of
+        equal length; each run contributes its length as weight at its
+        mean.\n"""
+        row = sorted(self.draws)
+        n, bok = len(row), {}
+        count = max(1, int(n ** .5))
+        for i in range(count):
+            run = row[i * n // count:(i + 1) * n // count]
+            if run:
+                k = float(sum(run)) / len(run)
+                bok[k] = bok.get(k, 0) + len(run)
+        return self._weights_(bok, 1. / n)
+
+    __upupdate = Sample.update
+    def update(self, other):
+        self.__upupdate(other)
+        # The draws are now stale; draw afresh from the new distribution:
+        try: del self.draws
+        except AttributeError: pass
+
+    def copy(self, func=None, wrap=_asarray):
+        if func is None:
+            return self._sampler_(draws=self.draws, best=self.best)
+        row = map(func, self.draws)
+        if wrap is not None: row = wrap(row, float)
+        return self._sampler_(draws=row, best=func(self.best))
+
+    def join(self, func, what, wrap=_asarray):
+        """Combine with another value via a two-parameter function.
+
+        Arguments are as for Sample.join(), which see; but the result's draws
+        are func(x, y) for each corresponding pair of draws, x of self and y
+        of what (or what itself, if it is a plain number).\n"""
+        mine = self.draws
+        if isinstance(what, MonteCarlo): best, yours = what.best, what.draws
+        elif isinstance(what, Sample):
+            best = what.best
+            yours = self._sampler_(what, size=len(mine)).draws
+        else: best, yours = what, None
+
+        if yours is not None and len(yours) != len(mine):
+            raise ValueError('Combining MonteCarlo samples of different sizes',
+                             len(mine), len(yours))
+        row = None
+        if wrap is not None:
+            if yours is None: other = what
+            else: other = yours
+            try: row = wrap(func(mine, other), float)
+            except (TypeError, ValueError, ArithmeticError): pass
+            else:
+                if row.shape != mine.shape: row = None
+
+        if row is None:
+            if yours is None: yours = [ what ] * len(mine)
+            row = map(func, mine, yours)
+            if wrap is not None: row = wrap(row, float)
+
+        return self._sampler_(draws=row, best=func(self.best, best))
 
-del _power, _divide
+class Digest (object):
+    """Bounded-memory summary of a stream of observations.
+
+    Sample and Weighted need all their weights in memory before they can
+    condense them; an instance of this class instead consumes observations
+    one at a time (or from an iterator, via .extend()), keeping only a list of
+    centroids - each the mean and total weight of some run of adjacent
+    observations - with a buffer of recent observations not yet merged into
+    them.  This is the merging variant of Dunning's t-digest: when the buffer
+    fills, it and the centroids are merged in order, each new centroid taking
+    in as many neighbours as a scale function allows; this lets centroids
+    hold more weight in the middle of the distribution and less in its tails,
+    where precision matters more.  The number of centroids stays below about
+    .compression (default: 100), however many observations are fed in.
+
+    Digests of separate parts of a stream can be combined with .merge(),
+    e.g. after processing the parts in parallel.  Once done, .weighted() and
+    .sample() turn the digest into a Weighted or Sample with as many keys as
+    you ask for.  The exact .low and .high of the observations and their
+    total weight, .count, are also tracked.
+
+    Integer observations are merged with float arithmetic, so the centroids
+    preserve the mean exactly:
+
+    >>> d = Digest(xrange(100000))
+    >>> sum(m * w for m, w in d.centroids()) / d.count
+    49999.5
+    >>> abs(d.weighted().median() - 50000) < 100
+    True\n"""
+
+    def __init__(self, data=(), compression=100):
+        """Set up a digest.
+
+        Both arguments are optional:
+          data -- an iterable of observations to .extend() the digest with
+          compression -- controls the number of centroids kept, hence the
+                         precision of the summary (default: 100).\n"""
+        self.compression = compression
+        self.low = self.high = None
+        self.count = 0
+        self.__means, self.__weights, self.__buffer = [], [], []
+        self.extend(data)
+
+    def add(self, value, weight=1):
+        """Record one observation, optionally with a weight other than 1."""
+        if weight <= 0: return
+        if self.low is None or value < self.low: self.low = value
+        if self.high is None or value > self.high: self.high = value
+        self.count += weight
+        self.__buffer.append((value, weight))
+        if len(self.__buffer) >= 5 * self.compression: self.__flush()
+
+    from itertools import islice
+    def extend(self, values, weight=1, slice=islice):
+        """Record each observation from an iterable, each with the same weight.
+
+        Consumes values a buffer-full at a time, so it may be an iterator over
+        a stream far too large to hold in memory.\n"""
+        if weight <= 0: return
+        values = iter(values)
+        while True:
+            row = list(slice(values, 5 * self.compression - len(self.__buffer)))
+            if not row: break
+            lo, hi = min(row), max(row)
+            if self.low is None or lo < self.low: self.low = lo
+            if self.high is None or hi > self.high: self.high = hi
+            self.count += weight * len(row)
+            self.__buffer.extend((x, weight) for x in row)
+            self.__flush()
+    del islice
+
+    def merge(self, *others):
+        """Fold other digests into this one.
+
+        Each argument should be a Digest; its centroids are added to self as
+        if they were (weighted) observations.  Returns self.\n"""
+        for other in others:
+            if other.low is None: continue # it's empty
+            if self.low is None or other.low < self.low: self.low = other.low
+            if self.high is None or other.high > self.high: self.high = other.high
+            self.count += other.count
+            self.__buffer.extend(other.centroids())
+        self.__flush()
+        return self
+
+    def centroids(self):
+        """Returns a list of (mean, weight) twoples, sorted by mean."""
+        self.__flush()
+        return zip(self.__means, self.__weights)
+
+    def __len__(self): return len(self.centroids())
+
+    from math import asin, sin, pi
+    def __flush(self, asin=asin, sin=sin, pi=pi):
+        """Merge the buffer into the centroids.
+
+        Uses the scale function k(q) = d.asin(2.q -1)/2/pi, with d the
+        compression; a centroid whose leftmost weight is at q (as a fraction
+        of the total weight) may grow until it reaches the q at which k has
+        grown by one.\n"""
+        if not self.__buffer: return
+        row = zip(self.__means, self.__weights) + self.__buffer
+        row.sort()
+        self.__buffer = []
+
+        total, d = float(sum(w for m, w in row)), self.compression
+        def reach(q, d=d):
+            k = d * asin(2 * q - 1) / 2 / pi + 1
+            if k >= d / 4.: return 1.
+            return (1 + sin(2 * pi * k / d)) / 2
+
+        means, weights, done = [], [], 0
+        mean, weight = row[0]
+        limit = reach(0) * total
+        for x, w in row[1:]:
+            if done + weight + w <= limit:
+                weight += w
+                mean += (x - mean) * w * 1. / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                done += weight
+                limit = reach(min(1., done / total)) * total
+                mean, weight = x, w
+        means.append(mean)
+        weights.append(weight)
+        self.__means, self.__weights = means, weights
+    del asin, sin, pi
+
+    def interpolator(self, cls=Weighted.Interpolator):
+        """Returns an interpolator describing the observations.
+
+        Each centroid's weight is spread across a band from the mid-point
+        between its mean and the previous centroid's to the mid-point between
+        its mean and the next's; the first band starts at .low, the last ends
+        at .high.\n"""
+        pairs = self.centroids()
+        if not pairs: raise ValueError('Too little data', self)
+        cuts = [ self.low ] + [ .5 * (a + b) for (a, v), (b, w)
+                                in zip(pairs[:-1], pairs[1:]) ] + [ self.high ]
+        return cls(cuts, [ w for m, w in pairs ])
+
+    def weighted(self, count=None):
+        """Returns a Weighted describing the observations.
+
+        Optional argument, count, is the number of keys the result should
+        have; if omitted or None, there is one per centroid.\n"""
+        ans = Weighted(None, smooth=self.interpolator())
+        if count is None: return ans
+        return ans.condense(count)
+
+    def sample(self, count=None, *args, **what):
+        """Returns a Sample describing the observations.
+
+        First argument, count, is as for .weighted(); all other arguments are
+        passed on to Sample's constructor.\n"""
+        return Sample(dict(self.weighted(count).items()), *args, **what)
+
+del _power, _divide, _asarray
 _surprise = """\
 Note that one can do some surprising things with Sample()s; e.g.:
     >>> gr = (1 + Sample({5.**.5: 1, -(5.**.5): 1}))/2
@@ -0,0 +1,246 @@
+"""Snapshots of the constants built by the tables of units and physics.
+
+Importing study.value.units, study.chemy.physics, .particle and .element builds
+hundreds of Quantity()s, many of them via long chains of Sample arithmetic.
+These modules build them with Quantity.deferred set (by begin(), below), so
+that nothing is computed until it is needed; but some are needed during
+import, and the rest whenever a program uses them.  This module lets a build
+step record, once, the scale each such Quantity ends up with, in a compact
+file in the user's cache directory, $XDG_CACHE_HOME (by default, .cache in
+$HOME), or next to this one if that can't be written.  When the table modules are next imported, each
+Quantity they make is (as it is made) told to rebuild its scale from what was
+recorded, instead of from the arithmetic that originally computed it.
+
+Each table module calls begin(__name__) before it makes any Quantity()s and
+end(__name__) once it is done making them; begin() sets Quantity.deferred, in
+the importing thread, until the matching end().  In between, this module
+numbers the pending Quantity()s the table module makes, in the order it makes
+them; the record is keyed on module name and this number, along with a
+summary of the formula each was made from, which must match for the record to
+be used.  The file also records which of this package's modules were loaded
+when it was built, and a hash of their sources (and of the python version,
+since marshal's format depends on it); if this doesn't match the current
+sources, the file is ignored.  Run this module as a
+script (or call build()) in a fresh interpreter to (re)build the snapshot.
+
+Provides:
+  begin(name), end(name) -- called by each table module
+  build(path) -- rebuild the snapshot
+
+See study.LICENSE for copyright and license information.
+"""
+import os
+_here = os.path.dirname(os.path.abspath(__file__))
+_path = os.path.join(_here, 'tables.snapshot')
+_tables = ('study.value.units', 'study.chemy.physics',
+           'study.chemy.particle', 'study.chemy.element')
+
+def _places(env=os.environ, join=os.path.join, home=os.path.expanduser):
+    """Files the snapshot may be kept in, most preferred first.
+
+    The first is in the user's cache directory, with a name that depends on
+    where this package is, so that several copies of it can each have its
+    own; the second is next to this module.\n"""
+    import hashlib
+    top = env.get('XDG_CACHE_HOME') or join(home('~'), '.cache')
+    tag = hashlib.sha1(_here).hexdigest()[:12]
+    return join(top, 'study', 'tables-%s.snapshot' % tag), _path
+
+import sys
+def _closure(top=os.path.dirname(_here), modules=sys.modules,
+             rel=os.path.relpath):
+    """Source files of the modules of this package that have been loaded.
+
+    Returns a sorted tuple of their names, relative to the package's
+    directory; when called once the tables have been built, these are all the
+    modules whose code the tables' values can depend on.\n"""
+    ans = set()
+    for name, mod in modules.items():
+        if name.startswith('study.') and mod is not None:
+            path = getattr(mod, '__file__', None)
+            if not path: continue
+            if path.endswith(('.pyc', '.pyo')): path = path[:-1]
+            path = rel(os.path.abspath(path), top)
+            if not path.startswith(os.pardir): ans.add(path)
+    return tuple(sorted(ans))
+del sys
+
+def _signature(names, top=os.path.dirname(_here), join=os.path.join):
+    """Hash of the sources on which the tables' values depend.
+
+    Single argument, names, is as returned by _closure().  Returns None if any
+    of the files it names can't be read.\n"""
+    import sys, hashlib
+    sha = hashlib.sha1(sys.version)
+    for name in names:
+        try: text = open(join(top, name), 'rb').read()
+        except IOError: return None
+        sha.update(name + '\0' + text)
+    return sha.hexdigest()
+
+class _Tally (object):
+    """Numbers the pending Quantity()s each table module makes.
+
+    Installed as Quantity._tables_ while a table module is being imported;
+    Quantity calls its defer() whenever it makes a pending Quantity and its
+    forced() whenever it evaluates one.  The table modules import one another,
+    so this keeps a stack of the modules being imported, with a count for
+    each.\n"""
+    def __init__(self): self.__stack = []
+    def __len__(self): return len(self.__prune())
+    def push(self, name): self.__prune().append([name, 0])
+    def pop(self, name):
+        top = self.__prune().pop()
+        assert top[0] == name, ('Mismatched table modules', top[0], name)
+
+    import sys
+    def __prune(self, modules=sys.modules):
+        # Forget modules whose import failed before they called end():
+        stack = self.__stack
+        while stack and stack[-1][0] not in modules: stack.pop()
+        return stack
+    del sys
+
+    def count(self, formula, simple=(int, long, float, str)):
+        """Returns module name, serial number and summary of a new formula."""
+        top = self.__stack[-1]
+        top[1] += 1
+        return top[0], top[1], tuple(
+            [ getattr(formula[0], '__name__', '?') ] +
+            [ repr(x) if isinstance(x, simple) else type(x).__name__
+              for x in formula[1:] ])
+
+class _Restore (_Tally):
+    __upinit = _Tally.__init__
+    def __init__(self, data):
+        self.__upinit()
+        self.__data = data
+
+    from study.value.quantity import qSample
+    def defer(self, it, formula, restore=qSample._restore_):
+        name, n, mark = self.count(formula)
+        try: was, state = self.__data[name][n]
+        except KeyError: return formula
+        if was == mark: return restore, state
+        # Numbering has gone astray (see end()); don't trust the rest:
+        del self.__data[name]
+        return formula
+    del qSample
+
+    def forced(self, it, scale): pass
+
+class _Record (_Tally):
+    __upinit = _Tally.__init__
+    def __init__(self):
+        self.__upinit()
+        self.data, self.__seen = {}, {}
+
+    def defer(self, it, formula):
+        name, n, mark = self.count(formula)
+        # Hold onto it, so that its id() isn't reused for another:
+        self.__seen[id(it)] = it, name, n, mark
+        self.data.setdefault(name, {})
+        return formula
+
+    def forced(self, it, scale):
+        try: it, name, n, mark = self.__seen.pop(id(it))
+        except KeyError: pass
+        else: self.data[name][n] = mark, scale._snapshot_()
+
+    def flush(self, name):
+        # Evaluate all still pending from module name, so as to record them:
+        for it, nom, n, mark in self.__seen.values():
+            if nom == name: it._scale_units_()
+
+class _State (object):
+    tally = None # the _Tally to use, once we know which
+    loaded = False
+
+def begin(name, state=_State):
+    """Start numbering a table module's pending Quantity()s.
+
+    Single argument, name, is the module's __name__.  The first time this is
+    called, it loads the snapshot, if there is one and it is up to date (the
+    first such, from _places()); without one, this does nothing more than set
+    Quantity.deferred.\n"""
+    from study.value.quantity import _deferral
+    _deferral.begin(name)
+    if not state.loaded:
+        state.loaded = True
+        import marshal
+        for path in _places():
+            try: sign, names, data = marshal.load(open(path, 'rb'))
+            except (IOError, EOFError, ValueError, TypeError): continue
+            if sign == _signature(names):
+                state.tally = _Restore(data)
+                break
+
+    if state.tally is not None:
+        from study.value.quantity import Quantity
+        state.tally.push(name)
+        Quantity._tables_ = state.tally
+
+def end(name, state=_State):
+    """Stop numbering a table module's pending Quantity()s.
+
+    Single argument, name, is as was passed to begin().  Note that, as the
+    numbering depends on the order in which the table module makes its pending
+    Quantity()s, a table module should only make them at import time if it
+    shall make the same ones in the same order on every import (ignoring the
+    values of any Quantity()s it evaluates, as these are what the snapshot
+    records).\n"""
+    from study.value.quantity import _deferral
+    if state.tally is not None:
+        try: flush = state.tally.flush
+        except AttributeError: pass
+        else: flush(name)
+
+        state.tally.pop(name)
+        if not state.tally:
+            from study.value.quantity import Quantity
+            Quantity._tables_ = None
+    _deferral.end(name)
+
+def build(path=None, state=_State, rename=os.rename, unlink=os.remove,
+          makedirs=os.makedirs, isdir=os.path.isdir, dirname=os.path.dirname):
+    """Rebuild the snapshot of the tables' values.
+
+    Must be called before any of the table modules has been imported, as it
+    imports them itself, recording what they compute.  Optional argument,
+    path, is the file to write; by default, the first of the places begin()
+    reads that can be written.  Returns the number of values recorded.\n"""
+    import sys, marshal
+    done = [ m for m in _tables if m in sys.modules ]
+    if done: raise ValueError('Tables already imported; use a fresh interpreter',
+                              done)
+
+    state.loaded, state.tally = True, _Record()
+    try:
+        for name in _tables: __import__(name)
+        data = state.tally.data
+    finally: state.loaded, state.tally = False, None
+
+    names = _closure()
+    text = marshal.dumps((_signature(names), names, data))
+    if path is None: places = _places()
+    else: places = (path,)
+    for path in places:
+        tmp = path + '.%d.tmp' % os.getpid()
+        try:
+            if not isdir(dirname(path)): makedirs(dirname(path))
+            fd = open(tmp, 'wb')
+            try: fd.write(text)
+            finally: fd.close()
+            rename(tmp, path)
+        except (IOError, OSError):
+            try: unlink(tmp)
+            except OSError: pass
+            if path == places[-1]: raise
+        else: break
+
+    return sum(map(len, data.values()))
+
+if __name__ == '__main__':
+    # The table modules import study.value.snapshot, not __main__:
+    from study.value.snapshot import build
+    print 'Recorded %d values' % build()
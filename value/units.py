@@ -5,6 +5,10 @@ See SI.py for base units and archaea.py for more arcane units (and references).
 See study.LICENSE for copyright and license information.
 """
 from SI import *
+
+# Derived units are many, but few get used; only compute those that are:
+from study.value.snapshot import begin, end
+begin(__name__)
 
 # Logarithmic units:
 from math import log
@@ -604,3 +608,6 @@ This is the sound intensity conventionally used as base-value when describing
 sound intensities in decibels: divide a sound intensity by this and take its
 log to base ten and multiply by ten to get the dB (SIL) value for it.  A sound
 intensity of one Watt per square metre is thus 12 Bel or 120 dB.\n"""))
+
+end(__name__)
+del begin, end